@@ -4,33 +4,53 @@ import os
 # Add the project root to sys.path so imports work correctly
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
-import gradio as gr
-from scripts.rag_pipeline.pipeline import ComplaintRAGPipeline
-from Apps.ui_utils import format_sources, style_response  # Needed for source display
-
-# Initialize the RAG pipeline once at startup
-pipeline = ComplaintRAGPipeline()
-
-# Define product categories
-product_types = [
-    "All",  
-    "Credit card",
-    "Personal loan",
-    "Buy Now, Pay Later (BNPL)",
-    "Savings account",
-    "Money transfers"
-]
-
-def answer_question(user_question: str, product: str) -> str:
-    """Generate an answer for the user question using the RAG pipeline with optional product filter."""
+import time
+from scripts.rag_pipeline.startup import report as startup_report
+from scripts.rag_pipeline.telemetry import telemetry, start_metrics_server
+
+with startup_report.timed("gradio", kind="import"):
+    import gradio as gr
+with startup_report.timed("rag pipeline", kind="import"):
+    from scripts.rag_pipeline.pipeline import ComplaintRAGPipeline
+    from scripts.rag_pipeline.answer_cache import SemanticAnswerCache
+    from Apps.ui_utils import format_sources, style_response  # Needed for source display
+    from scripts.data_processing.metadata import PRODUCT_CATEGORIES
+
+# Create the RAG pipeline once at startup; the model, index and LLM client load lazily
+# (or in the background warm-up), and repeated questions are answered from the cache
+with startup_report.timed("ComplaintRAGPipeline()"):
+    pipeline = ComplaintRAGPipeline()
+    # Cached answers are dropped when the index the retriever serves (store, snapshot or shards) changes
+    pipeline.answer_cache = SemanticAnswerCache(index_dir=pipeline.retriever.index_dir)
+
+# Product categories match the normalized `product` metadata stored at ingestion
+product_types = ["All"] + list(PRODUCT_CATEGORIES)
+
+def record_request(handler, start, status):
+    # Handler time as the user sees it (streaming included), next to the per-stage metrics
+    telemetry.observe("rag_ui_request_seconds", time.perf_counter() - start, handler=handler)
+    telemetry.count("rag_ui_requests_total", handler=handler, status=status)
+
+async def answer_question_stream(user_question: str, product: str):
+    """Show the sources immediately, then update the answer as tokens arrive."""
     if not user_question.strip():
-        return "Please enter a question."
+        yield "Please enter a question."
+        return
+    start = time.perf_counter()
     try:
-        answer, sources = pipeline.ask_with_sources(user_question, product=product)
+        if not pipeline.ready.is_set():
+            yield "_Loading models, the first answer may take a moment..._"
+        sources, tokens = await pipeline.aask_streaming(user_question, product=product)
         formatted_sources = format_sources(sources)
-        return style_response(answer, formatted_sources)
+        answer = ""
+        yield style_response("_Generating answer..._", formatted_sources)
+        async for token in tokens:
+            answer += token
+            yield style_response(answer, formatted_sources)
+        record_request("answer_question_stream", start, "ok")
     except Exception as e:
-        return f"Error: {e}"
+        record_request("answer_question_stream", start, "error")
+        yield f"Error: {e}"
 
 # Build Gradio UI
 with gr.Blocks() as demo:
@@ -51,10 +71,30 @@ with gr.Blocks() as demo:
 
     output_text = gr.Textbox(label="Answer with Sources", lines=10)
     submit_btn = gr.Button("Ask")
-    submit_btn.click(fn=answer_question, inputs=[user_input, product_dropdown], outputs=output_text)
+    submit_btn.click(fn=answer_question_stream, inputs=[user_input, product_dropdown], outputs=output_text)
 
     clear_btn = gr.Button("Clear")
     clear_btn.click(fn=lambda: "", inputs=None, outputs=user_input)
 
+def warm_up_and_report():
+    pipeline.warm_up()
+    print(startup_report.format())
+
 if __name__ == "__main__":
+    import threading
+
+    # METRICS_PORT=9100 turns on telemetry and serves it at :9100/metrics
+    if os.getenv("METRICS_PORT"):
+        telemetry.enable()
+        start_metrics_server(int(os.getenv("METRICS_PORT")))
+
+    # API_PORT=8000 also serves the JSON API (Apps/server.py) from this process, with micro-batching
+    if os.getenv("API_PORT"):
+        from Apps.server import start_api_server
+        telemetry.enable()
+        pipeline.enable_micro_batching()
+        start_api_server(pipeline, int(os.getenv("API_PORT")))
+
+    # The UI binds right away; the pipeline warms up behind it
+    threading.Thread(target=warm_up_and_report, name="warm-up", daemon=True).start()
     demo.launch()
\ No newline at end of file
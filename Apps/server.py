@@ -0,0 +1,131 @@
+import sys
+import os
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add the project root to sys.path so imports work correctly
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from scripts.rag_pipeline.telemetry import telemetry
+
+# Requests are micro-batched together, so bad input is rejected before it can fail a whole batch
+MAX_TOP_K = int(os.getenv("API_MAX_TOP_K", "50"))
+
+
+def make_handler(pipeline):
+    """
+    Request handler for the JSON API:
+
+        POST /ask       {"question", "product"="All", "top_k"=5, "trace"=false} -> {"answer", "sources"[, "trace"]}
+        POST /retrieve  {"question", "product"="All", "top_k"=5} -> {"sources"}  (no LLM call)
+        GET  /healthz   -> {"ready", "batching"}
+        GET  /metrics   -> Prometheus text
+    """
+
+    class APIHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status, body, content_type="application/json"):
+            data = body.encode("utf-8") if isinstance(body, str) else json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            path = self.path.split("?")[0]
+            if path == "/metrics":
+                self._send(200, telemetry.render_prometheus(), "text/plain; version=0.0.4")
+            elif path == "/healthz":
+                self._send(200, {"ready": pipeline.ready.is_set(), "batching": pipeline.batching_stats()})
+            else:
+                self._send(404, {"error": "not found"})
+
+        def do_POST(self):
+            path = self.path.split("?")[0]
+            if path not in ("/ask", "/retrieve"):
+                self._send(404, {"error": "not found"})
+                return
+            start = time.perf_counter()
+            status = "ok"
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                if not isinstance(payload, dict):
+                    raise ValueError("request body must be a JSON object")
+                question = payload.get("question", "")
+                if not isinstance(question, str) or not question.strip():
+                    status = "bad_request"
+                    self._send(400, {"error": "question is required"})
+                    return
+                product = payload.get("product", "All")
+                if not isinstance(product, str):
+                    raise ValueError("product must be a string")
+                top_k = payload.get("top_k", 5)
+                if isinstance(top_k, bool) or not isinstance(top_k, int) or not 1 <= top_k <= MAX_TOP_K:
+                    raise ValueError(f"top_k must be an integer between 1 and {MAX_TOP_K}")
+                if path == "/retrieve":
+                    self._send(200, {"sources": pipeline.retrieve_sources(question, product=product, top_k=top_k)})
+                elif payload.get("trace"):
+                    answer, sources, trace = pipeline.ask_with_sources(question, product=product, top_k=top_k,
+                                                                       return_trace=True)
+                    self._send(200, {"answer": answer, "sources": sources, "trace": trace})
+                else:
+                    answer, sources = pipeline.ask_with_sources(question, product=product, top_k=top_k)
+                    self._send(200, {"answer": answer, "sources": sources})
+            except (ValueError, json.JSONDecodeError) as e:
+                status = "bad_request"
+                self._send(400, {"error": str(e)})
+            except Exception as e:
+                status = "error"
+                self._send(500, {"error": str(e)})
+            finally:
+                telemetry.observe("rag_api_request_seconds", time.perf_counter() - start, route=path)
+                telemetry.count("rag_api_requests_total", route=path, status=status)
+
+    return APIHandler
+
+
+def start_api_server(pipeline, port=8000, host="0.0.0.0"):
+    """Serve the JSON API for `pipeline` from a background thread. Returns the server."""
+    import threading
+
+    server = ThreadingHTTPServer((host, port), make_handler(pipeline))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="api", daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    import argparse
+    from scripts.rag_pipeline.pipeline import ComplaintRAGPipeline
+    from scripts.rag_pipeline.answer_cache import SemanticAnswerCache
+
+    parser = argparse.ArgumentParser(description="JSON API for the complaint RAG pipeline with micro-batching.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--max-batch-size", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0, help="How long a batch waits for more queries")
+    parser.add_argument("--no-batching", action="store_true", help="Serve every request on its own")
+    parser.add_argument("--no-answer-cache", action="store_true")
+    args = parser.parse_args()
+
+    pipeline = ComplaintRAGPipeline()
+    if not args.no_answer_cache:
+        # Cached answers are dropped when the index the retriever serves (store, snapshot or shards) changes
+        pipeline.answer_cache = SemanticAnswerCache(index_dir=pipeline.retriever.index_dir)
+    if not args.no_batching:
+        pipeline.enable_micro_batching(args.max_batch_size, args.max_wait_ms)
+    # The API process always exports metrics at /metrics
+    telemetry.enable()
+    pipeline.warm_up()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(pipeline))
+    server.daemon_threads = True
+    print(f"Serving the RAG API on http://{args.host}:{args.port} (batching {'off' if args.no_batching else 'on'})")
+    server.serve_forever()
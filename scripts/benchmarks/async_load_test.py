@@ -0,0 +1,93 @@
+import os
+import asyncio
+import time
+import statistics
+
+from scripts.benchmarks.mock_llm_server import start_mock_server
+
+
+class StaticRetriever:
+    """Stand-in retriever returning canned chunks after a small fixed delay."""
+
+    def __init__(self, delay=0.01):
+        self.delay = delay
+        self.calls = 0
+
+    def retrieve(self, query_text, top_k=5, filters=None):
+        self.calls += 1
+        time.sleep(self.delay)
+        return [f"complaint chunk {i} about {query_text}" for i in range(top_k)]
+
+    def retrieve_many(self, queries, top_k=5, filters=None):
+        return [self.retrieve(query_text, top_k, filters) for query_text in queries]
+
+
+def percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+async def run_async_load(pipeline, users, requests_per_user, distinct_questions):
+    latencies = []
+
+    async def user(user_id):
+        for i in range(requests_per_user):
+            question = f"Why are customers unhappy, case {(user_id + i) % distinct_questions}?"
+            start = time.perf_counter()
+            await pipeline.aask_with_sources(question, product="All")
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user(u) for u in range(users)))
+    return time.perf_counter() - start, latencies
+
+
+def run_sync_load(pipeline, n_requests):
+    latencies = []
+    start = time.perf_counter()
+    for i in range(n_requests):
+        t = time.perf_counter()
+        pipeline.ask_with_sources(f"Why are customers unhappy, case {i}?", product="All")
+        latencies.append(time.perf_counter() - t)
+    return time.perf_counter() - start, latencies
+
+
+def summarize(label, elapsed, latencies):
+    print(f"{label}: {len(latencies)} requests in {elapsed:.2f}s "
+          f"-> {len(latencies) / elapsed:.1f} req/s, "
+          f"p50 {statistics.median(latencies) * 1000:.0f} ms, p95 {percentile(latencies, 95) * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Concurrent-user throughput of aask_with_sources against a mock LLM.")
+    parser.add_argument("--users", type=int, default=32)
+    parser.add_argument("--requests-per-user", type=int, default=5)
+    parser.add_argument("--distinct-questions", type=int, default=1000,
+                        help="Lower values exercise in-flight request coalescing")
+    parser.add_argument("--latency", type=float, default=0.5, help="Mock LLM seconds per completion")
+    parser.add_argument("--max-concurrency", type=int, default=64)
+    parser.add_argument("--sync-requests", type=int, default=5)
+    args = parser.parse_args()
+
+    server, url = start_mock_server(latency=args.latency)
+    os.environ["LLM_BASE_URL"] = url
+    os.environ.setdefault("HUGGINGFACEHUB_API_TOKEN", "mock-token")
+    os.environ["LLM_MAX_CONCURRENCY"] = str(args.max_concurrency)
+
+    # Imported after the environment points the generator at the mock server
+    from scripts.rag_pipeline.pipeline import ComplaintRAGPipeline
+
+    retriever = StaticRetriever()
+    pipeline = ComplaintRAGPipeline(retriever=retriever)
+
+    summarize("sync ask_with_sources", *run_sync_load(pipeline, args.sync_requests))
+    elapsed, latencies = asyncio.run(
+        run_async_load(pipeline, args.users, args.requests_per_user, args.distinct_questions)
+    )
+    summarize(f"async aask_with_sources ({args.users} users)", elapsed, latencies)
+    print(f"LLM calls served by mock: {server.request_count}, retrievals: {retriever.calls}")
+    server.shutdown()
@@ -0,0 +1,84 @@
+import sys
+import time
+import logging
+
+from scripts.benchmarks.synthetic_data import iter_synthetic_complaints
+from scripts.embedding_pipeline.chunking import chunk_texts
+from scripts.embedding_pipeline.fast_chunking import chunk_offsets
+
+
+def synthetic_texts(n, seed=0, mean_sentences=12):
+    return [row["Consumer complaint narrative"]
+            for row in iter_synthetic_complaints(n, seed=seed, narrative_rate=1.0, mean_sentences=mean_sentences)]
+
+
+def check_parity(texts, settings=((500, 100), (200, 50), (50, 10))):
+    """
+    Compare fast_chunking with chunk_texts for each (chunk_size, chunk_overlap).
+
+    Returns:
+        List[dict]: One row per setting with the first mismatching chunk, if any.
+    """
+    rows = []
+    for chunk_size, chunk_overlap in settings:
+        expected = chunk_texts(texts, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        actual = chunk_offsets(texts, chunk_size=chunk_size, chunk_overlap=chunk_overlap).to_dicts()
+        mismatch = next((i for i, (a, b) in enumerate(zip(expected, actual)) if a != b), None)
+        if mismatch is None and len(expected) != len(actual):
+            mismatch = min(len(expected), len(actual))
+        rows.append({"chunk_size": chunk_size, "chunk_overlap": chunk_overlap, "chunks": len(expected),
+                     "match": mismatch is None, "first_mismatch": mismatch})
+    return rows
+
+
+def run(n=20_000, workers=(1, 2, 4), chunk_size=500, chunk_overlap=100):
+    """
+    Throughput of chunk_texts against the offset chunker at each worker count,
+    and memory held by the chunks (strings in dicts vs offset arrays).
+    """
+    texts = synthetic_texts(n)
+    total_chars = sum(len(t) for t in texts)
+    rows = []
+
+    start = time.perf_counter()
+    reference = chunk_texts(texts, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    seconds = time.perf_counter() - start
+    chunk_bytes = sum(sys.getsizeof(c) + sys.getsizeof(c["text"]) for c in reference)
+    rows.append({"engine": "chunk_texts (LangChain)", "seconds": round(seconds, 3),
+                 "docs_per_sec": round(n / seconds), "mb_per_sec": round(total_chars / seconds / 1e6, 2),
+                 "chunk_bytes": chunk_bytes})
+
+    for count in workers:
+        start = time.perf_counter()
+        batch = chunk_offsets(texts, chunk_size=chunk_size, chunk_overlap=chunk_overlap, workers=count)
+        seconds = time.perf_counter() - start
+        rows.append({"engine": f"fast_chunking x{count}", "seconds": round(seconds, 3),
+                     "docs_per_sec": round(n / seconds), "mb_per_sec": round(total_chars / seconds / 1e6, 2),
+                     "chunk_bytes": batch.source_index.nbytes + batch.start.nbytes + batch.end.nbytes})
+    return rows
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Offset-based parallel chunker: parity and throughput.")
+    parser.add_argument("--n", type=int, default=20_000, help="Synthetic narratives")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--parity-docs", type=int, default=3_000)
+    args = parser.parse_args()
+
+    # LangChain warns about every oversized chunk; the parity run is about output, not logs
+    logging.getLogger("langchain_text_splitters.base").setLevel(logging.ERROR)
+
+    parity = check_parity(synthetic_texts(args.parity_docs, seed=1))
+    for row in parity:
+        status = "ok" if row["match"] else f"MISMATCH at chunk {row['first_mismatch']}"
+        print(f"parity size={row['chunk_size']} overlap={row['chunk_overlap']}: {row['chunks']} chunks, {status}")
+
+    print(f"{'engine':<26} {'seconds':>8} {'docs/s':>9} {'MB/s':>7} {'chunk bytes':>12}")
+    for row in run(n=args.n, workers=args.workers):
+        print(f"{row['engine']:<26} {row['seconds']:>8.3f} {row['docs_per_sec']:>9} "
+              f"{row['mb_per_sec']:>7.2f} {row['chunk_bytes']:>12,}")
+
+    if not all(row["match"] for row in parity):
+        sys.exit(1)
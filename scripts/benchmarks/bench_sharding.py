@@ -0,0 +1,116 @@
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from scripts.benchmarks.bench_two_stage import synthetic_embeddings
+from scripts.benchmarks.run_benchmarks import latency_summary, quiet
+from scripts.embedding_pipeline.index_backends import NumpyIndex
+from scripts.rag_pipeline.sharding import ShardedIndex, build_shards
+
+PRODUCTS = ["Credit card", "Personal loan", "Buy Now, Pay Later (BNPL)", "Savings account", "Money transfers"]
+
+
+def build_source(vectors, directory):
+    """In-memory NumpyIndex over `vectors` with complaint-shaped ids and metadata."""
+    index = NumpyIndex(directory)
+    n = len(vectors)
+    index.upsert([f"{i // 3}:{i % 3}" for i in range(n)], vectors, [f"chunk {i}" for i in range(n)],
+                 [{"product": PRODUCTS[(i // 3) % len(PRODUCTS)], "complaint_id": str(i // 3)} for i in range(n)])
+    return index
+
+
+def throughput(index, queries, top_k, concurrency, filters=None):
+    """Queries/s and latency percentiles with `concurrency` threads sending one query each at a time."""
+    def one(query):
+        start = time.perf_counter()
+        result = index.query(query[None, :], top_k=top_k, filters=filters)
+        return time.perf_counter() - start, len(result.get("failed_shards", []))
+
+    index.query(queries[:1], top_k=top_k, filters=filters)  # connect and warm the page cache
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, queries))
+    seconds = time.perf_counter() - start
+    return {"qps": round(len(queries) / seconds, 1), "partial": sum(1 for _, failed in results if failed),
+            **latency_summary("latency", [duration for duration, _ in results])}
+
+
+def run(n=200_000, dim=384, shard_counts=(1, 2, 4), n_queries=400, concurrency=8, top_k=5, scheme="hash"):
+    """
+    Throughput, latency and memory per shard process at each shard count.
+
+    Results are checked against one unsharded index over the same vectors.
+
+    Returns:
+        List[dict]: One row per shard count.
+    """
+    vectors = synthetic_embeddings(n, dim)
+    rng = np.random.default_rng(1)
+    queries = vectors[rng.choice(n, size=n_queries, replace=False)]
+    queries = queries + 0.5 * rng.standard_normal(queries.shape).astype(np.float32) / np.sqrt(dim)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    workdir = tempfile.mkdtemp(prefix="sharding_")
+    rows = []
+    try:
+        source = build_source(vectors, os.path.join(workdir, "source"))
+        truth = source.query(queries, top_k=top_k)["ids"]
+        for n_shards in shard_counts:
+            shard_dir = os.path.join(workdir, f"shards_{n_shards}")
+            start = time.perf_counter()
+            with quiet():
+                build_shards(source, shard_dir, n_shards=n_shards, scheme=scheme)
+            build_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            index = ShardedIndex.launch(shard_dir, timeout=10.0)
+            launch_seconds = time.perf_counter() - start
+            try:
+                merged = index.query(queries, top_k=top_k)["ids"]
+                recall = np.mean([len(set(a) & set(b)) / len(b) for a, b in zip(merged, truth)])
+                stats = throughput(index, queries, top_k, concurrency)
+                filtered = throughput(index, queries, top_k, concurrency, filters={"product": "Credit card"})
+                shards = index.stats()
+            finally:
+                index.close()
+            rows.append({
+                "shards": n_shards,
+                "build_seconds": round(build_seconds, 2),
+                "launch_seconds": round(launch_seconds, 2),
+                f"recall@{top_k}": round(float(recall), 4),
+                **stats,
+                "filtered_qps": filtered["qps"],
+                "chunks_per_shard": max(s["count"] for s in shards),
+                "rss_mb_per_shard": max(s["rss_mb"] for s in shards),
+                "pss_mb_per_shard": max(s.get("pss_mb", s["rss_mb"]) for s in shards),
+            })
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return rows
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Sharded scatter-gather retrieval at several shard counts.")
+    parser.add_argument("--n", type=int, default=200_000, help="Synthetic vectors")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--queries", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--scheme", default="hash", choices=["hash", "product"])
+    args = parser.parse_args()
+
+    results = run(n=args.n, dim=args.dim, shard_counts=args.shards, n_queries=args.queries,
+                  concurrency=args.concurrency, scheme=args.scheme)
+    print(f"{os.cpu_count()} CPU(s), {args.n:,} vectors, {args.scheme} sharding, {args.concurrency} concurrent clients")
+    print(f"{'shards':>6} {'qps':>8} {'p50 ms':>8} {'p99 ms':>8} {'filtered qps':>13} {'chunks/shard':>13} "
+          f"{'RSS MB/shard':>13} {'PSS MB/shard':>13} {'recall':>7}")
+    for row in results:
+        recall = next(value for key, value in row.items() if key.startswith("recall@"))
+        print(f"{row['shards']:>6} {row['qps']:>8} {row['latency.p50_ms']:>8} {row['latency.p99_ms']:>8} "
+              f"{row['filtered_qps']:>13} {row['chunks_per_shard']:>13,} {row['rss_mb_per_shard']:>13} "
+              f"{row['pss_mb_per_shard']:>13} {recall:>7}")
@@ -0,0 +1,159 @@
+import os
+import shutil
+import sys
+import tempfile
+import time
+import numpy as np
+
+from scripts.embedding_pipeline.index_backends import NumpyIndex
+
+
+def synthetic_embeddings(n, dim=384, n_topics=200, decay=0.75, noise=0.3, seed=0):
+    """
+    Normalized vectors with the structure of sentence embeddings: clustered
+    around `n_topics` directions, with variance concentrated in a few
+    directions (per-dimension scale ~ i ** -decay in a random basis).
+    """
+    rng = np.random.default_rng(seed)
+    basis, _ = np.linalg.qr(rng.standard_normal((dim, dim)))
+    scale = (np.arange(1, dim + 1) ** -decay).astype(np.float32)
+    topics = rng.standard_normal((n_topics, dim)).astype(np.float32)
+    latent = topics[rng.integers(0, n_topics, size=n)] + noise * rng.standard_normal((n, dim)).astype(np.float32)
+    vectors = (latent * scale) @ basis.T.astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def build_index(directory, vectors, **kwargs):
+    index = NumpyIndex(directory, **kwargs)
+    ids = [f"c{i}" for i in range(len(vectors))]
+    index.upsert(ids, vectors, [""] * len(vectors), [{"product": "Credit card"}] * len(vectors))
+    index.save()
+    return index
+
+
+def timed_search(index, queries, k, two_stage):
+    """Mean ms per single-query search, and the top-k rows of each query."""
+    index.search(queries[:5], top_k=k, two_stage=two_stage)  # warm the page cache
+    results = []
+    start = time.perf_counter()
+    for query in queries:
+        results.append(index.search(query[None, :], top_k=k, two_stage=two_stage)[0][0])
+    return (time.perf_counter() - start) / len(queries) * 1000, results
+
+
+def recall(results, truth):
+    hits = sum(len(set(r.tolist()) & set(t.tolist())) for r, t in zip(results, truth))
+    return hits / sum(len(t) for t in truth)
+
+
+def check_persistence(n=200, dim=32, k=5, settings=({"n_lists": 16}, {"n_lists": 16, "coarse": "pca", "coarse_dim": 8},
+                                                      {"coarse": "binary"})):
+    """
+    Save, delete most rows, save again and search, for each index setting.
+
+    The second save leaves fewer rows than IVF lists, so the lists must be
+    dropped from disk rather than re-opened; results are compared with a
+    brute-force search over the surviving vectors.
+
+    Returns:
+        List[dict]: One row per setting with whether the top-k ids matched.
+    """
+    vectors = synthetic_embeddings(n, dim)
+    keep = np.arange(n - 8, n)
+    rows = []
+    for kwargs in settings:
+        workdir = tempfile.mkdtemp(prefix="persistence_")
+        try:
+            index = build_index(workdir, vectors, **kwargs)
+            index.delete([f"c{i}" for i in range(n - len(keep))])
+            index.save()
+            error = None
+            try:
+                ids = index.query(vectors[keep], top_k=k)["ids"]
+            except Exception as e:
+                ids, error = None, repr(e)
+            expected = np.argsort(-(vectors[keep] @ vectors[keep].T), axis=1)[:, :k]
+            match = ids is not None and all(set(row) == {f"c{keep[j]}" for j in top} for row, top in zip(ids, expected))
+            rows.append({"setting": kwargs, "match": match, "error": error})
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return rows
+
+
+def run(n=100_000, dim=384, n_queries=200, k=5, coarse_dims=(32, 64, 128), rerank_factors=(5, 10, 20, 50),
+        vectors=None, queries=None):
+    """
+    Latency and recall@k of two-stage search against exact float32 search.
+
+    Returns:
+        List[dict]: One row per configuration.
+    """
+    if vectors is None:
+        vectors = synthetic_embeddings(n, dim)
+    if queries is None:
+        rng = np.random.default_rng(1)
+        queries = vectors[rng.choice(len(vectors), size=n_queries, replace=False)]
+        queries = queries + 0.5 * rng.standard_normal(queries.shape).astype(np.float32) / np.sqrt(vectors.shape[1])
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    workdir = tempfile.mkdtemp(prefix="two_stage_")
+    rows = []
+    try:
+        exact = build_index(os.path.join(workdir, "exact"), vectors)
+        # Every index holds the same rows in the same order, so row numbers are comparable
+        exact_ms, truth = timed_search(exact, queries, k, two_stage=False)
+        rows.append({"config": "exact float32", "ms_per_query": round(exact_ms, 3), "speedup": 1.0,
+                     f"recall@{k}": 1.0})
+
+        configs = [("binary", None)] + [("pca", d) for d in coarse_dims]
+        for coarse, coarse_dim in configs:
+            index = build_index(os.path.join(workdir, f"{coarse}{coarse_dim or ''}"), vectors,
+                                coarse=coarse, coarse_dim=coarse_dim or 64)
+            for factor in rerank_factors:
+                index.rerank_factor = factor
+                ms, results = timed_search(index, queries, k, two_stage=True)
+                rows.append({"config": f"{coarse}{'-' + str(coarse_dim) if coarse_dim else ''} x{factor}",
+                             "ms_per_query": round(ms, 3), "speedup": round(exact_ms / ms, 2),
+                             f"recall@{k}": round(recall(results, truth), 4)})
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return rows
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Two-stage (coarse codes + exact re-rank) vs exact search.")
+    parser.add_argument("--n", type=int, default=100_000, help="Synthetic vectors")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--index-dir", default=None,
+                        help="Use the vectors of an existing NumpyIndex instead of synthetic ones")
+    parser.add_argument("--target-recall", type=float, default=0.95)
+    args = parser.parse_args()
+
+    persistence = check_persistence()
+    for row in persistence:
+        status = "ok" if row["match"] else f"MISMATCH {row['error'] or ''}".rstrip()
+        print(f"save/delete/save {row['setting']}: {status}")
+
+    vectors = None
+    if args.index_dir:
+        source = NumpyIndex(args.index_dir)
+        vectors = source.vectors(np.arange(source.count()))
+    results = run(n=args.n, dim=args.dim, n_queries=args.queries, k=args.k, vectors=vectors)
+
+    recall_key = f"recall@{args.k}"
+    print(f"{'config':<18} {'ms/query':>9} {'speedup':>8} {recall_key:>9}")
+    for row in results:
+        print(f"{row['config']:<18} {row['ms_per_query']:>9.3f} {row['speedup']:>7.2f}x {row[recall_key]:>9.4f}")
+    passing = [row for row in results[1:] if row[recall_key] >= args.target_recall]
+    if passing:
+        best = max(passing, key=lambda row: row["speedup"])
+        print(f"Fastest with {recall_key} >= {args.target_recall}: {best['config']} ({best['speedup']}x)")
+    else:
+        print(f"No two-stage setting reached {recall_key} >= {args.target_recall}")
+
+    if not all(row["match"] for row in persistence):
+        sys.exit(1)
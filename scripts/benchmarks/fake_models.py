@@ -0,0 +1,42 @@
+import re
+import zlib
+import numpy as np
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+class HashingEmbeddingModel:
+    """
+    Offline stand-in for a SentenceTransformer.
+
+    Each text becomes a normalized bag of hashed word unigrams and bigrams in
+    `dim` dimensions, so similar texts get similar vectors and benchmarks
+    exercise realistic index behaviour without downloading a model. It
+    implements the part of `SentenceTransformer.encode` the pipeline uses.
+    """
+
+    def __init__(self, dim=384):
+        self.dim = dim
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+    def _features(self, text):
+        tokens = TOKEN_RE.findall(text.lower())
+        grams = tokens + [a + " " + b for a, b in zip(tokens, tokens[1:])]
+        return [zlib.crc32(g.encode("utf-8")) for g in grams]
+
+    def encode(self, sentences, batch_size=32, show_progress_bar=False, convert_to_numpy=True,
+               normalize_embeddings=False, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            hashes = np.asarray(self._features(text), dtype=np.uint32)
+            if len(hashes):
+                # The top bit picks the sign so unrelated features cancel out on average
+                signs = np.where(hashes & 0x80000000, -1.0, 1.0).astype(np.float32)
+                np.add.at(vectors[i], hashes % self.dim, signs)
+        if normalize_embeddings:
+            vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        return vectors[0] if single else vectors
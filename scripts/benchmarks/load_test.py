@@ -0,0 +1,137 @@
+import os
+import json
+import time
+import shutil
+import tempfile
+import http.client
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+
+from scripts.benchmarks.run_benchmarks import latency_summary, synthetic_questions, quiet
+
+
+def post_json(connection, path, payload):
+    body = json.dumps(payload)
+    connection.request("POST", path, body=body, headers={"Content-Type": "application/json"})
+    response = connection.getresponse()
+    data = response.read()
+    if response.status != 200:
+        raise RuntimeError(f"{path}: HTTP {response.status} {data[:200]!r}")
+    return json.loads(data)
+
+
+def get_json(url, path):
+    parsed = urlparse(url)
+    connection = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=30)
+    try:
+        connection.request("GET", path)
+        return json.loads(connection.getresponse().read())
+    finally:
+        connection.close()
+
+
+def load_test(url, route="/retrieve", concurrency=32, n_requests=1000, product="All", top_k=5):
+    """
+    Fire `n_requests` questions at the API from `concurrency` clients, each
+    on its own keep-alive connection.
+
+    Returns:
+        dict: latency percentiles, requests/s, errors and the server's batching stats.
+    """
+    parsed = urlparse(url)
+    questions = synthetic_questions(n_requests, seed=2)
+    shares = [questions[i::concurrency] for i in range(concurrency)]
+
+    def client(share):
+        connection = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=60)
+        durations, errors = [], 0
+        try:
+            for question in share:
+                start = time.perf_counter()
+                try:
+                    post_json(connection, route, {"question": question, "product": product, "top_k": top_k})
+                    durations.append(time.perf_counter() - start)
+                except Exception:
+                    errors += 1
+                    connection.close()
+                    connection = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=60)
+        finally:
+            connection.close()
+        return durations, errors
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(client, shares))
+    wall = time.perf_counter() - start
+    durations = [d for ds, _ in results for d in ds]
+    metrics = latency_summary(route.strip("/"), durations) if durations else {}
+    metrics["requests_per_sec"] = round(len(durations) / wall, 1)
+    metrics["errors"] = sum(errors for _, errors in results)
+    metrics["batching"] = get_json(url, "/healthz").get("batching")
+    return metrics
+
+
+def offline_server(workdir, rows, batching, max_batch_size, max_wait_ms, llm_latency):
+    """An in-process API server over a synthetic NumpyIndex, the hashing model and the mock LLM."""
+    from scripts.benchmarks.synthetic_data import generate_complaints_csv
+    from scripts.benchmarks.fake_models import HashingEmbeddingModel
+    from scripts.benchmarks.mock_llm_server import start_mock_server
+    from scripts.benchmarks.run_benchmarks import bench_preprocess, bench_index_build
+    from scripts.rag_pipeline.retriever import ComplaintRetriever
+    from scripts.rag_pipeline.context import ContextBuilder
+    from scripts.rag_pipeline.pipeline import ComplaintRAGPipeline
+    from Apps.server import start_api_server
+
+    index_dir = os.path.join(workdir, "numpy_index")
+    model = HashingEmbeddingModel()
+    if not os.path.isdir(index_dir):
+        raw_csv = generate_complaints_csv(os.path.join(workdir, "complaints.csv"), rows)
+        processed_csv, _ = bench_preprocess(raw_csv, workdir)
+        bench_index_build(processed_csv, workdir, model)
+    from scripts.embedding_pipeline.index_backends import NumpyIndex
+
+    llm, llm_url = start_mock_server(latency=llm_latency)
+    os.environ["LLM_BASE_URL"] = llm_url
+    os.environ.setdefault("HUGGINGFACEHUB_API_TOKEN", "load-test-token")
+    retriever = ComplaintRetriever(backend=NumpyIndex(index_dir), embedding_model=model)
+    pipeline = ComplaintRAGPipeline(retriever=retriever, context_builder=ContextBuilder(tokenizer_name=None))
+    if batching:
+        pipeline.enable_micro_batching(max_batch_size, max_wait_ms)
+    server = start_api_server(pipeline, port=0, host="127.0.0.1")
+    return server, llm, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Load test the JSON API (Apps/server.py).")
+    parser.add_argument("--url", default=None, help="Running server; default: start offline servers in-process")
+    parser.add_argument("--route", default="/retrieve", choices=["/retrieve", "/ask"])
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--rows", type=int, default=20_000, help="Synthetic complaints for the offline index")
+    parser.add_argument("--max-batch-size", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Mock LLM seconds per completion")
+    args = parser.parse_args()
+
+    if args.url:
+        results = {"server": load_test(args.url, args.route, args.concurrency, args.requests)}
+    else:
+        # Same index and load with and without micro-batching
+        workdir = tempfile.mkdtemp(prefix="rag_load_")
+        results = {}
+        try:
+            for label, batching in (("unbatched", False), ("batched", True)):
+                with quiet():
+                    server, llm, url = offline_server(workdir, args.rows, batching, args.max_batch_size,
+                                                      args.max_wait_ms, args.llm_latency)
+                try:
+                    load_test(url, args.route, args.concurrency, min(50, args.requests))  # warm-up
+                    results[label] = load_test(url, args.route, args.concurrency, args.requests)
+                finally:
+                    server.shutdown()
+                    llm.shutdown()
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,135 @@
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class MockChatCompletionsHandler(BaseHTTPRequestHandler):
+    """
+    Minimal OpenAI-compatible `/chat/completions` endpoint.
+
+    Each request sleeps for `server.latency` seconds (plus up to
+    `server.jitter`) and answers with a canned completion, so the RAG
+    pipeline can be load-tested without the Hugging Face API. Streaming
+    requests get the first token after `server.ttft` seconds.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/health"):
+            self._send_json(200, {"status": "ok", "requests": self.server.request_count})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": "not found"})
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        with self.server.lock:
+            self.server.request_count += 1
+
+        if request.get("stream"):
+            self._stream_completion(request)
+            return
+
+        time.sleep(self.server.latency + random.uniform(0, self.server.jitter))
+        answer = self.server.answer
+        self._send_json(200, {
+            "id": f"mock-{self.server.request_count}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "mock"),
+            "system_fingerprint": "mock",
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": answer},
+                "finish_reason": "stop",
+                "logprobs": None,
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": len(answer.split()),
+                      "total_tokens": len(answer.split())},
+        })
+
+    def _stream_completion(self, request):
+        """Server-sent events: first token after `ttft`, the rest spread over the remaining latency."""
+        tokens = [t + " " for t in self.server.answer.split()]
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        time.sleep(self.server.ttft + random.uniform(0, self.server.jitter))
+        gap = max(self.server.latency - self.server.ttft, 0.0) / max(len(tokens), 1)
+        for i, token in enumerate(tokens):
+            if i:
+                time.sleep(gap)
+            chunk = {
+                "id": f"mock-{self.server.request_count}",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": request.get("model", "mock"),
+                "system_fingerprint": "mock",
+                "choices": [{"index": 0, "delta": {"role": "assistant", "content": token},
+                             "finish_reason": None, "logprobs": None}],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+def start_mock_server(host="127.0.0.1", port=0, latency=0.5, jitter=0.0, ttft=0.1,
+                      answer="Customers mostly complain about unexpected fees and slow dispute handling."):
+    """
+    Start the mock server in a background thread.
+
+    Returns:
+        Tuple[ThreadingHTTPServer, str]: The server and its OpenAI-style base URL
+        (pass it as LLM_BASE_URL); call `server.shutdown()` to stop it.
+    """
+    server = ThreadingHTTPServer((host, port), MockChatCompletionsHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.jitter = jitter
+    server.ttft = min(ttft, latency)
+    server.answer = answer
+    server.request_count = 0
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, name="mock-llm", daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}/v1"
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run a mock chat-completions server.")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds per completion")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--ttft", type=float, default=0.1, help="Seconds to first streamed token")
+    args = parser.parse_args()
+
+    server, url = start_mock_server(port=args.port, latency=args.latency, jitter=args.jitter, ttft=args.ttft)
+    print(f"Mock chat-completions server at {url} (set LLM_BASE_URL={url})")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
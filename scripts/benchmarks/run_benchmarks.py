@@ -0,0 +1,276 @@
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import tempfile
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from scripts.benchmarks.synthetic_data import generate_complaints_csv, ISSUES
+from scripts.benchmarks.fake_models import HashingEmbeddingModel
+from scripts.benchmarks.mock_llm_server import start_mock_server
+from scripts.data_processing.metadata import PRODUCT_CATEGORIES
+
+
+@contextlib.contextmanager
+def quiet():
+    """Swallow the progress prints of the code under test."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def latency_summary(prefix, seconds):
+    """p50/p95/p99 in ms of a list of durations (seconds)."""
+    values = np.asarray(seconds) * 1000
+    return {f"{prefix}.p50_ms": round(float(np.percentile(values, 50)), 3),
+            f"{prefix}.p95_ms": round(float(np.percentile(values, 95)), 3),
+            f"{prefix}.p99_ms": round(float(np.percentile(values, 99)), 3)}
+
+
+def directory_bytes(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, files in os.walk(path) for name in files)
+
+
+def synthetic_questions(n, seed=0):
+    rng = np.random.default_rng(seed)
+    issues = [issue for values in ISSUES.values() for issue in values]
+    templates = ["Why do customers complain about {}?", "What problems do people report with {}?",
+                 "How are complaints about {} usually resolved?"]
+    return [templates[i % len(templates)].format(issues[rng.integers(len(issues))].lower()) + f" case {i}"
+            for i in range(n)]
+
+
+# ----- stages -----
+
+def bench_preprocess(raw_csv, workdir):
+    from scripts.data_processing.preprocess import preprocess_dataset, preprocess_dataset_streaming
+
+    valid_products = list(PRODUCT_CATEGORIES)
+    with open(raw_csv, encoding="utf-8") as f:
+        rows = len(pd.read_csv(f, usecols=["Complaint ID"]))
+    processed_csv = os.path.join(workdir, "filtered_complaints.csv")
+    start = time.perf_counter()
+    with quiet():
+        preprocess_dataset(raw_csv, processed_csv, valid_products)
+    seconds = time.perf_counter() - start
+
+    with quiet():
+        streaming = preprocess_dataset_streaming(raw_csv, os.path.join(workdir, "filtered_complaints.parquet"),
+                                                 valid_products)
+    return processed_csv, {
+        "preprocess.rows": rows,
+        "preprocess.rows_per_sec": round(rows / seconds, 1),
+        "preprocess_streaming.rows_per_sec": streaming["rows_per_sec"],
+    }
+
+
+def bench_chunking(texts):
+    from scripts.embedding_pipeline.fast_chunking import chunk_texts
+
+    start = time.perf_counter()
+    chunks = chunk_texts(texts, chunk_size=500, chunk_overlap=100, workers=None)
+    seconds = time.perf_counter() - start
+    return chunks, {"chunking.chunks": len(chunks), "chunking.chunks_per_sec": round(len(chunks) / seconds, 1)}
+
+
+def bench_embedding(model, texts, batch_size=256):
+    from scripts.embedding_pipeline.embedding_cache import encode_with_cache
+
+    start = time.perf_counter()
+    encode_with_cache(model, texts, batch_size=batch_size, normalize_embeddings=True)
+    seconds = time.perf_counter() - start
+    return {"embedding.texts_per_sec": round(len(texts) / seconds, 1)}
+
+
+def bench_index_build(processed_csv, workdir, model):
+    from scripts.embedding_pipeline.index_backends import NumpyIndex
+    from scripts.embedding_pipeline.vector_store import VectorStoreChroma
+    from scripts.embedding_pipeline.indexer import sync_index
+
+    index_dir = os.path.join(workdir, "numpy_index")
+    store = VectorStoreChroma(persist_directory=index_dir, backend=NumpyIndex(index_dir))
+    start = time.perf_counter()
+    with quiet():
+        stats = sync_index(processed_csv, store, model, embed_batch_size=256)
+    seconds = time.perf_counter() - start
+    index = NumpyIndex(index_dir)
+    return index, {
+        "index_build.chunks": index.count(),
+        "index_build.seconds": round(seconds, 3),
+        "index_build.chunks_per_sec": round(stats["chunks_upserted"] / seconds, 1),
+        "index_build.bytes": directory_bytes(index_dir),
+    }
+
+
+def bench_retrieval(retriever, n_queries):
+    questions = synthetic_questions(n_queries)
+    metrics = {}
+    for label, filters in (("retrieve", None), ("retrieve_filtered", {"product": "Credit card"})):
+        retriever.query_cache.clear()
+        retriever.retrieve(questions[0], top_k=5, filters=filters)  # warm-up
+        durations = []
+        for question in questions:
+            start = time.perf_counter()
+            retriever.retrieve(question, top_k=5, filters=filters)
+            durations.append(time.perf_counter() - start)
+        metrics.update(latency_summary(label, durations))
+    return metrics
+
+
+def bench_end_to_end(retriever, concurrency, n_requests, llm_latency):
+    """ask_with_sources from `concurrency` threads against the mock LLM."""
+    server, url = start_mock_server(latency=llm_latency)
+    os.environ["LLM_BASE_URL"] = url
+    os.environ.setdefault("HUGGINGFACEHUB_API_TOKEN", "benchmark-token")
+    try:
+        from scripts.rag_pipeline.pipeline import ComplaintRAGPipeline
+        from scripts.rag_pipeline.context import ContextBuilder
+
+        pipeline = ComplaintRAGPipeline(retriever=retriever, context_builder=ContextBuilder(tokenizer_name=None))
+        questions = synthetic_questions(n_requests, seed=1)
+
+        def one(question):
+            start = time.perf_counter()
+            pipeline.ask_with_sources(question, product="All")
+            return time.perf_counter() - start
+
+        pipeline.ask_with_sources("warm up", product="All")
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            durations = list(pool.map(one, questions))
+        wall = time.perf_counter() - start
+    finally:
+        server.shutdown()
+    metrics = latency_summary("ask_with_sources", durations)
+    metrics["ask_with_sources.requests_per_sec"] = round(n_requests / wall, 2)
+    return metrics
+
+
+def run_benchmarks(rows=20_000, n_queries=300, concurrency=8, n_requests=64, llm_latency=0.2, workdir=None, seed=42):
+    """
+    Run every stage on a fresh synthetic corpus.
+
+    Returns:
+        dict: {"meta": run settings and environment, "metrics": {name: value}}.
+    """
+    from scripts.rag_pipeline.retriever import ComplaintRetriever
+
+    own_workdir = workdir is None
+    workdir = workdir or tempfile.mkdtemp(prefix="rag_bench_")
+    os.makedirs(workdir, exist_ok=True)
+    metrics = {}
+    timings = {}
+
+    def stage(name, fn, *args):
+        start = time.perf_counter()
+        result = fn(*args)
+        timings[name] = round(time.perf_counter() - start, 2)
+        print(f"  {name}: {timings[name]}s", file=sys.stderr)
+        return result
+
+    try:
+        raw_csv = stage("generate corpus", generate_complaints_csv, os.path.join(workdir, "complaints.csv"), rows, seed)
+        processed_csv, m = stage("preprocess", bench_preprocess, raw_csv, workdir)
+        metrics.update(m)
+
+        texts = pd.read_csv(processed_csv)["Cleaned Narrative"].dropna().tolist()
+        chunks, m = stage("chunking", bench_chunking, texts)
+        metrics.update(m)
+
+        model = HashingEmbeddingModel()
+        metrics.update(stage("embedding", bench_embedding, model, [c["text"] for c in chunks]))
+
+        index, m = stage("index build", bench_index_build, processed_csv, workdir, model)
+        metrics.update(m)
+
+        retriever = ComplaintRetriever(backend=index, embedding_model=model)
+        metrics.update(stage("retrieval", bench_retrieval, retriever, n_queries))
+        metrics.update(stage("end to end", bench_end_to_end, retriever, concurrency, n_requests, llm_latency))
+    finally:
+        if own_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    meta = {
+        "rows": rows, "queries": n_queries, "concurrency": concurrency, "requests": n_requests,
+        "llm_latency": llm_latency, "seed": seed, "stage_seconds": timings,
+        "python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+        "numpy": np.__version__, "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "embedding_model": "HashingEmbeddingModel (offline stand-in)",
+    }
+    return {"meta": meta, "metrics": metrics}
+
+
+def higher_is_better(name):
+    return name.endswith("_per_sec")
+
+
+def compare(current, baseline, tolerance=0.10):
+    """
+    Compare metrics to a baseline run.
+
+    Throughput metrics (`*_per_sec`) regress when they drop by more than
+    `tolerance`; latencies, durations and sizes regress when they grow by
+    more than `tolerance`. Counts (e.g. `chunking.chunks`) are reported but
+    never flagged.
+
+    Returns:
+        List[dict]: One row per metric present in both runs.
+    """
+    rows = []
+    for name, value in current["metrics"].items():
+        base = baseline["metrics"].get(name)
+        if base is None or not isinstance(value, (int, float)):
+            continue
+        change = (value - base) / base if base else 0.0
+        tracked = higher_is_better(name) or name.endswith(("_ms", ".seconds", ".bytes"))
+        regressed = tracked and (change < -tolerance if higher_is_better(name) else change > tolerance)
+        rows.append({"metric": name, "baseline": base, "current": value,
+                     "change_pct": round(change * 100, 1), "regression": regressed})
+    return rows
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Offline end-to-end performance benchmarks.")
+    parser.add_argument("--rows", type=int, default=20_000, help="Synthetic raw complaints")
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Mock LLM seconds per completion")
+    parser.add_argument("--workdir", default=None, help="Keep generated data and indexes here")
+    parser.add_argument("--output", default=None, help="Write results JSON to this file")
+    parser.add_argument("--baseline", default=None, help="Results JSON of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    args = parser.parse_args()
+
+    print("Running benchmarks...", file=sys.stderr)
+    results = run_benchmarks(rows=args.rows, n_queries=args.queries, concurrency=args.concurrency,
+                             n_requests=args.requests, llm_latency=args.llm_latency, workdir=args.workdir)
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            comparison = compare(results, json.load(f), args.tolerance)
+        results["comparison"] = comparison
+        regressions = [row for row in comparison if row["regression"]]
+        for row in comparison:
+            flag = "REGRESSION" if row["regression"] else ""
+            print(f"{row['metric']:<40} {row['baseline']:>12} -> {row['current']:>12} "
+                  f"({row['change_pct']:+.1f}%) {flag}", file=sys.stderr)
+        if regressions:
+            print(f"{len(regressions)} regression(s) beyond {args.tolerance:.0%}", file=sys.stderr)
+            exit_code = 1
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    print(output)
+    sys.exit(exit_code)
@@ -0,0 +1,174 @@
+import csv
+import os
+import random
+from datetime import date, timedelta
+
+from scripts.data_processing.metadata import PRODUCT_CATEGORIES
+
+# Columns of the public CFPB complaints export, in export order
+CFPB_COLUMNS = [
+    "Date received", "Product", "Sub-product", "Issue", "Sub-issue",
+    "Consumer complaint narrative", "Company public response", "Company",
+    "State", "ZIP code", "Tags", "Consumer consent provided?", "Submitted via",
+    "Date sent to company", "Company response to consumer", "Timely response?",
+    "Consumer disputed?", "Complaint ID",
+]
+
+# Products outside the app's categories, dropped by preprocessing
+OTHER_PRODUCTS = [
+    "Mortgage", "Debt collection", "Student loan", "Vehicle loan or lease",
+    "Credit reporting, credit repair services, or other personal consumer reports",
+]
+
+SUB_PRODUCTS = {
+    "Credit card": ["General-purpose credit card or charge card", "Store credit card"],
+    "Personal loan": ["Installment loan", "Payday loan", "Personal line of credit"],
+    "Buy Now, Pay Later (BNPL)": ["Pay in 4", "Point-of-sale installment plan"],
+    "Savings account": ["Savings account", "Checking account", "CD (Certificate of Deposit)"],
+    "Money transfers": ["Domestic (US) money transfer", "International money transfer", "Mobile or digital wallet"],
+}
+
+ISSUES = {
+    "Credit card": ["Problem with a purchase shown on your statement", "Fees or interest",
+                    "Trouble using your card", "Closing your account"],
+    "Personal loan": ["Charged fees or interest you didn't expect", "Struggling to pay your loan",
+                      "Getting the loan", "Problem with the payoff process"],
+    "Buy Now, Pay Later (BNPL)": ["Problem with a purchase or transfer", "Charged fees or interest you didn't expect",
+                                  "Problem with customer service", "Unauthorized transactions or other transaction problem"],
+    "Savings account": ["Managing an account", "Closing an account", "Problem caused by your funds being low",
+                        "Opening an account"],
+    "Money transfers": ["Fraud or scam", "Money was not available when promised",
+                        "Other transaction problem", "Problem with customer service"],
+}
+
+COMPANIES = [
+    "CAPITAL ONE FINANCIAL CORPORATION", "JPMORGAN CHASE & CO.", "CITIBANK, N.A.", "BANK OF AMERICA, NATIONAL ASSOCIATION",
+    "WELLS FARGO & COMPANY", "SYNCHRONY FINANCIAL", "PAYPAL HOLDINGS, INC.", "Block, Inc.", "Affirm Holdings, Inc",
+    "Klarna Inc", "DISCOVER BANK", "AMERICAN EXPRESS COMPANY", "U.S. BANCORP", "Afterpay US, Inc.", "Coinbase, Inc.",
+]
+
+STATES = ["CA", "TX", "FL", "NY", "GA", "IL", "PA", "OH", "NC", "MI", "NJ", "VA", "WA", "AZ", "MA"]
+
+OPENINGS = [
+    "I am writing to file a complaint about {company}.",
+    "This is a complaint regarding my {product_lower} with {company}.",
+    "I would like to report a problem with {company}.",
+    "On XX/XX/{year} I noticed a problem with my {product_lower}.",
+    "I have been a customer of {company} for {years} years.",
+]
+
+SENTENCES = [
+    "I was charged a fee of ${amount} that I never agreed to.",
+    "The payment of ${amount} was taken from my account twice.",
+    "I called customer service {times} times and each time I was told someone would call me back.",
+    "Nobody ever called me back and the issue is still not resolved.",
+    "I disputed the charge on XX/XX/{year} but the dispute was denied without explanation.",
+    "They said the transaction was authorized even though I did not make it.",
+    "My account was closed without any notice and my balance of ${amount} is being held.",
+    "The interest rate on my account went up without warning.",
+    "I made the payment on time but they reported it as late to the credit bureaus.",
+    "The representative was rude and hung up on me.",
+    "I sent all the documents they asked for, including my bank statements and a copy of my ID.",
+    "The money transfer of ${amount} never arrived and the recipient did not receive the funds.",
+    "I was told the refund would take 7 to 10 business days but it has been {times} weeks.",
+    "The merchant refunded the purchase but the installment payments are still being charged.",
+    "I set up autopay but the payment failed and I was charged a late fee of ${amount}.",
+    "Their website kept showing an error when I tried to make a payment.",
+    "They froze my account for a security review and I could not access my money for {times} weeks.",
+    "I was never informed about these terms when I opened the account.",
+    "My XXXX card was declined even though I had available credit.",
+    "This has caused me a lot of stress and financial hardship.",
+]
+
+CLOSINGS = [
+    "Please investigate this issue.",
+    "I want a full refund of ${amount}.",
+    "Thank you for your attention to this matter.",
+    "I want this removed from my credit report.",
+    "I am asking the CFPB to help me resolve this.",
+]
+
+
+def synthetic_narrative(rng, product, company, mean_sentences=8):
+    """One complaint narrative in the style of the CFPB export (redactions, amounts, boilerplate)."""
+    fields = {
+        "company": company,
+        "product_lower": product.lower(),
+        "year": rng.randint(2019, 2025),
+        "years": rng.randint(1, 20),
+    }
+    n = max(1, int(rng.expovariate(1.0 / mean_sentences)))
+    parts = [rng.choice(OPENINGS)]
+    parts += [rng.choice(SENTENCES) for _ in range(n)]
+    parts.append(rng.choice(CLOSINGS))
+    return " ".join(
+        p.format(amount=f"{rng.randint(5, 2500)}.{rng.randint(0, 99):02d}", times=rng.randint(2, 12), **fields)
+        for p in parts
+    )
+
+
+def iter_synthetic_complaints(n_rows, seed=42, narrative_rate=0.7, other_product_rate=0.3, mean_sentences=8):
+    """
+    Yield `n_rows` complaint rows (dicts keyed by CFPB_COLUMNS).
+
+    A share of rows has no narrative (`1 - narrative_rate`) or a product
+    outside the app's categories (`other_product_rate`), as in the real
+    export, so preprocessing has something to filter.
+    """
+    rng = random.Random(seed)
+    categories = list(PRODUCT_CATEGORIES)
+    start = date(2019, 1, 1)
+    for i in range(n_rows):
+        if rng.random() < other_product_rate:
+            category, product = None, rng.choice(OTHER_PRODUCTS)
+        else:
+            category = rng.choice(categories)
+            product = rng.choice(PRODUCT_CATEGORIES[category])
+        company = rng.choice(COMPANIES)
+        received = start + timedelta(days=rng.randint(0, 6 * 365))
+        has_narrative = rng.random() < narrative_rate
+        yield {
+            "Date received": received.isoformat(),
+            "Product": product,
+            "Sub-product": rng.choice(SUB_PRODUCTS[category]) if category else "",
+            "Issue": rng.choice(ISSUES[category]) if category else "Other",
+            "Sub-issue": "",
+            "Consumer complaint narrative": (
+                synthetic_narrative(rng, category or product, company, mean_sentences) if has_narrative else ""
+            ),
+            "Company public response": "Company has responded to the consumer and the CFPB and chooses not to provide a public response",
+            "Company": company,
+            "State": rng.choice(STATES),
+            "ZIP code": f"{rng.randint(10000, 99999)}",
+            "Tags": "",
+            "Consumer consent provided?": "Consent provided" if has_narrative else "Consent not provided",
+            "Submitted via": "Web",
+            "Date sent to company": (received + timedelta(days=rng.randint(0, 3))).isoformat(),
+            "Company response to consumer": "Closed with explanation",
+            "Timely response?": "Yes",
+            "Consumer disputed?": "N/A",
+            "Complaint ID": str(1_000_000 + i),
+        }
+
+
+def generate_complaints_csv(path, n_rows=10_000, seed=42, **kwargs):
+    """Write a synthetic raw complaints CSV with the CFPB export's columns. Returns `path`."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=CFPB_COLUMNS)
+        writer.writeheader()
+        writer.writerows(iter_synthetic_complaints(n_rows, seed=seed, **kwargs))
+    return path
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Generate a synthetic CFPB-shaped complaints CSV.")
+    parser.add_argument("output", nargs="?", default="Data/raw/synthetic_complaints.csv")
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    generate_complaints_csv(args.output, args.rows, seed=args.seed)
+    print(f"Wrote {args.rows:,} synthetic complaints to {args.output}")
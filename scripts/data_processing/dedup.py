@@ -0,0 +1,500 @@
+import os
+import json
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+DEFAULT_THRESHOLD = 0.8
+NUM_PERM = 128
+SHINGLE_SIZE = 5
+DUPLICATE_COUNT_COLUMN = "Duplicate Count"
+
+_MIX = np.uint64(0x9E3779B97F4A7C15)
+_PERM_BLOCK = 4
+_BYTE_BASE = 0x100000001B3
+_BYTE_BASE_INVERSE = pow(_BYTE_BASE, -1, 2 ** 64)
+
+
+def _mix64(x):
+    """splitmix64 finalizer: spreads the bits of uint64 hashes."""
+    x = x ^ (x >> np.uint64(30))
+    x = x * np.uint64(0xBF58476D1CE4E5B9)
+    x = x ^ (x >> np.uint64(27))
+    x = x * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def _combine(word_hashes, k):
+    """Hashes of every run of `k` consecutive word hashes."""
+    n = len(word_hashes) - k + 1
+    hashes = np.zeros(n, dtype=np.uint64)
+    for j in range(k):
+        hashes = hashes * _MIX + word_hashes[j:j + n]
+    return _mix64(hashes)
+
+
+_powers_cache = {}
+
+
+def _powers(base, n):
+    """base ** i (mod 2**64) for i < n, grown and cached per process."""
+    cached = _powers_cache.get(base)
+    if cached is None or len(cached) < n:
+        steps = np.full(max(n, 1 << 20), base, dtype=np.uint64)
+        steps[0] = 1
+        cached = _powers_cache[base] = np.cumprod(steps)
+    return cached[:n]
+
+
+def _word_hashes(texts):
+    """
+    uint64 hash of every word of `texts` (runs of bytes above ASCII space),
+    in order, and the number of words per text.
+
+    Words are hashed all at once from prefix sums of a polynomial over the
+    UTF-8 bytes, so the hashes are the same in every process (unlike
+    hash()) and no Python code runs per word.
+    """
+    encoded = [t.encode("utf-8") if isinstance(t, str) else b"" for t in texts]
+    data = np.frombuffer(b" ".join(encoded), dtype=np.uint8)
+    if not len(data):
+        return np.zeros(0, dtype=np.uint64), np.zeros(len(texts), dtype=np.int64)
+    is_word = data > 32
+    edges = np.diff(np.concatenate([[False], is_word, [False]]).astype(np.int8))
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+    prefix = np.zeros(len(data) + 1, dtype=np.uint64)
+    np.cumsum(data * _powers(_BYTE_BASE, len(data)), out=prefix[1:])
+    inverse = _powers(_BYTE_BASE_INVERSE, len(data))
+    hashes = _mix64((prefix[ends] - prefix[starts]) * inverse[starts] + np.uint64(1))
+
+    text_starts = np.cumsum([0] + [len(e) + 1 for e in encoded[:-1]])
+    owner = np.searchsorted(text_starts, starts, side="right") - 1
+    return hashes, np.bincount(owner, minlength=len(texts)).astype(np.int64)
+
+
+def shingle_hashes(texts, shingle_size=SHINGLE_SIZE):
+    """
+    uint64 hashes of the word `shingle_size`-grams of cleaned narratives.
+
+    The n-grams of the whole batch are combined in one pass over the
+    concatenated word hashes. A text shorter than one shingle is a single
+    shingle of all its words; an empty text is the shingle 0.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Concatenated shingle hashes and the
+        offset of each text's first shingle.
+    """
+    word_hashes, lengths = _word_hashes(texts)
+    full = lengths >= shingle_size
+    counts = np.where(full, lengths - shingle_size + 1, 1)
+    offsets = np.concatenate([[0], np.cumsum(counts)[:-1]]).astype(np.int64)
+    values = np.zeros(int(counts.sum()), dtype=np.uint64)
+
+    if full.any():
+        ends = np.cumsum(lengths)
+        starts = np.arange(max(len(word_hashes) - shingle_size + 1, 0))
+        owner = np.repeat(np.arange(len(lengths)), lengths)[:len(starts)]
+        inside = starts + shingle_size <= ends[owner]
+        values[full[np.repeat(np.arange(len(lengths)), counts)]] = _combine(word_hashes, shingle_size)[inside]
+    word_offsets = np.cumsum(lengths) - lengths
+    for i in np.flatnonzero(~full & (lengths > 0)):
+        values[offsets[i]] = _combine(word_hashes[word_offsets[i]:word_offsets[i] + lengths[i]], lengths[i])[0]
+    return values, offsets
+
+
+def permutations(num_perm=NUM_PERM, seed=1):
+    """Odd multipliers and offsets of the `num_perm` multiply-shift hash functions."""
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 2 ** 63, size=num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+    b = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+    return a, b
+
+
+def minhash_signatures(texts, num_perm=NUM_PERM, shingle_size=SHINGLE_SIZE, seed=1):
+    """
+    MinHash signatures of `texts`, one row per text.
+
+    All shingles of the batch are hashed together (a block of permutations
+    at a time) and reduced per text with np.minimum.reduceat. Each value
+    keeps the top 16 bits of its minimum (b-bit minwise hashing), which
+    halves memory against uint32 and adds only ~1.5e-5 to the estimated
+    Jaccard similarity.
+
+    Returns:
+        np.ndarray: (len(texts), num_perm) uint16.
+    """
+    a, b = permutations(num_perm, seed)
+    signatures = np.zeros((len(texts), num_perm), dtype=np.uint16)
+    if not len(texts):
+        return signatures
+    values, offsets = shingle_hashes(texts, shingle_size)
+    # A few permutations at a time keep the hashed block in cache
+    hashed = np.empty((_PERM_BLOCK, len(values)), dtype=np.uint64)
+    for first in range(0, num_perm, _PERM_BLOCK):
+        block = slice(first, first + _PERM_BLOCK)
+        out = hashed[:len(a[block])]
+        np.multiply(a[block, None], values[None, :], out=out)
+        np.add(out, b[block, None], out=out)
+        minimum = np.minimum.reduceat(out, offsets, axis=1)
+        signatures[:, block] = (minimum >> np.uint64(48)).T
+    return signatures
+
+
+def _signature_job(job):
+    texts, num_perm, shingle_size, seed = job
+    return minhash_signatures(texts, num_perm, shingle_size, seed)
+
+
+def iter_signature_batches(text_batches, num_perm=NUM_PERM, shingle_size=SHINGLE_SIZE, seed=1, workers=None):
+    """
+    Signatures of each batch of texts from `text_batches`, in order,
+    computed across `workers` processes.
+
+    At most two batches per worker are in flight, so an iterator over a
+    large file is never read far ahead of the pool.
+    """
+    workers = workers or os.cpu_count() or 1
+    jobs = ((list(texts), num_perm, shingle_size, seed) for texts in text_batches)
+    if workers == 1:
+        for job in jobs:
+            yield _signature_job(job)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for job in jobs:
+            pending.append(pool.submit(_signature_job, job))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def compute_signatures(texts, num_perm=NUM_PERM, shingle_size=SHINGLE_SIZE, seed=1, batch_docs=2000, workers=None):
+    """MinHash signatures of all `texts`, computed in parallel batches of `batch_docs`."""
+    texts = texts if isinstance(texts, list) else list(texts)
+    batches = (texts[i:i + batch_docs] for i in range(0, len(texts), batch_docs))
+    parts = list(iter_signature_batches(batches, num_perm, shingle_size, seed, workers))
+    return np.concatenate(parts) if parts else np.zeros((0, num_perm), dtype=np.uint16)
+
+
+def lsh_params(threshold=DEFAULT_THRESHOLD, num_perm=NUM_PERM, false_positive_weight=0.5):
+    """
+    (bands, rows) with bands * rows <= num_perm minimizing the weighted
+    false positive and false negative probability mass around `threshold`
+    (the same criterion as datasketch's MinHashLSH).
+    """
+    grid = np.linspace(0.0, 1.0, 201)
+    trapezoid = getattr(np, "trapezoid", None) or np.trapz
+
+    def area(bands, rows, low, high):
+        x = grid[(grid >= low) & (grid <= high)]
+        return trapezoid(1 - (1 - x ** rows) ** bands, x)
+
+    best, best_error = (1, num_perm), None
+    for bands in range(1, num_perm + 1):
+        for rows in range(1, num_perm // bands + 1):
+            false_positive = area(bands, rows, 0.0, threshold)
+            false_negative = (1 - threshold) - area(bands, rows, threshold, 1.0)
+            error = false_positive_weight * false_positive + (1 - false_positive_weight) * false_negative
+            if best_error is None or error < best_error:
+                best, best_error = (bands, rows), error
+    return best
+
+
+def _band_keys(signatures, first, rows):
+    keys = np.zeros(len(signatures), dtype=np.uint64)
+    for column in range(first, first + rows):
+        keys = keys * _MIX + signatures[:, column].astype(np.uint64)
+    return _mix64(keys)
+
+
+def _connected_components(n, left, right):
+    """Smallest member index of each row's component, by min-label propagation with pointer jumping."""
+    labels = np.arange(n, dtype=np.int64)
+    while len(left):
+        previous = labels.copy()
+        low = np.minimum(labels[left], labels[right])
+        np.minimum.at(labels, left, low)
+        np.minimum.at(labels, right, low)
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+        if np.array_equal(labels, previous):
+            break
+    return labels
+
+
+def _signature_similarity(signatures, left, right, block):
+    """Estimated Jaccard similarity (fraction of equal signature values) of row pairs."""
+    similarity = np.empty(len(left), dtype=np.float64)
+    step = max(1, block // signatures.shape[1])
+    for i in range(0, len(left), step):
+        similarity[i:i + step] = (signatures[left[i:i + step]] == signatures[right[i:i + step]]).mean(axis=1)
+    return similarity
+
+
+def _star_clusters(signatures, labels, left, right, threshold, block):
+    """
+    Split connected components so every member is within `threshold` of its representative.
+
+    Members too far from their component's first row are taken out; among
+    themselves (using only the pairs they share) they are clustered again
+    and checked against their new representatives, until all members pass.
+    """
+    n = len(labels)
+    check = np.flatnonzero(labels != np.arange(n))
+    while len(check):
+        similarity = _signature_similarity(signatures, check, labels[check], block)
+        failed = check[similarity < threshold]
+        if not len(failed):
+            break
+        is_failed = np.zeros(n, dtype=bool)
+        is_failed[failed] = True
+        shared = is_failed[left] & is_failed[right]
+        left, right = left[shared], right[shared]
+        labels[failed] = _connected_components(n, left, right)[failed]
+        check = failed[labels[failed] != failed]
+    return labels
+
+
+def cluster_near_duplicates(signatures, threshold=DEFAULT_THRESHOLD, bands=None, rows=None, verify=True,
+                            verify_block=1_000_000):
+    """
+    Group rows whose MinHash signatures are likely above `threshold` Jaccard similarity.
+
+    For every LSH band, rows are sorted by band key and each row sharing a
+    bucket is paired with the bucket's first (lowest) row, so candidate
+    pairs grow linearly with the number of duplicates instead of
+    quadratically with bucket size. With `verify`, pairs whose estimated
+    similarity (fraction of equal signature values) is below `threshold`
+    are dropped before clustering. Clusters start as the connected
+    components of the remaining pairs; since a chain A~B~C can link rows
+    that are far apart, each member is then checked against its cluster's
+    representative and split off if it is below `threshold` (star
+    clustering), which bounds every cluster's radius.
+
+    Returns:
+        Tuple[np.ndarray, dict]: Per row, the index of its cluster's
+        representative (its earliest row), and candidate / verified pair counts.
+    """
+    n, num_perm = signatures.shape
+    if bands is None or rows is None:
+        bands, rows = lsh_params(threshold, num_perm)
+    left_parts, right_parts = [], []
+    for band in range(bands):
+        keys = _band_keys(signatures, band * rows, rows)
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        starts = np.ones(n, dtype=bool)
+        starts[1:] = sorted_keys[1:] != sorted_keys[:-1]
+        if starts.all():
+            continue
+        group_first = order[np.maximum.accumulate(np.where(starts, np.arange(n), 0))]
+        left_parts.append(order[~starts])
+        right_parts.append(group_first[~starts])
+
+    stats = {"candidate_pairs": 0, "verified_pairs": 0}
+    if not left_parts:
+        return np.arange(n, dtype=np.int64), stats
+    pairs = np.unique(np.concatenate(left_parts) * n + np.concatenate(right_parts))
+    left, right = pairs // n, pairs % n
+    stats["candidate_pairs"] = len(pairs)
+
+    if verify:
+        keep = _signature_similarity(signatures, left, right, verify_block) >= threshold
+        left, right = left[keep], right[keep]
+    stats["verified_pairs"] = len(left)
+    labels = _connected_components(n, left, right)
+    if verify:
+        components = labels
+        labels = _star_clusters(signatures, components.copy(), left, right, threshold, verify_block)
+        stats["split_members"] = int((labels != components).sum())
+    return labels, stats
+
+
+def summarize(labels, threshold, num_perm, shingle_size, bands, rows, pair_stats, chars_in=None, chars_out=None):
+    """Corpus shrink report for cluster `labels` (see cluster_near_duplicates)."""
+    sizes = np.bincount(labels, minlength=len(labels))
+    rows_in = len(labels)
+    rows_out = int((labels == np.arange(rows_in)).sum())
+    report = {
+        "rows_in": rows_in,
+        "rows_out": rows_out,
+        "removed": rows_in - rows_out,
+        "shrink_pct": round(100 * (rows_in - rows_out) / rows_in, 2) if rows_in else 0.0,
+        "duplicate_clusters": int((sizes > 1).sum()),
+        "largest_cluster": int(sizes.max()) if rows_in else 0,
+        "threshold": threshold,
+        "num_perm": num_perm,
+        "shingle_size": shingle_size,
+        "bands": bands,
+        "rows_per_band": rows,
+        **pair_stats,
+    }
+    if chars_in is not None:
+        report["chars_in"] = chars_in
+        report["chars_out"] = chars_out
+        report["chars_shrink_pct"] = round(100 * (chars_in - chars_out) / chars_in, 2) if chars_in else 0.0
+    return report
+
+
+def _largest_clusters(sizes, n=10):
+    """Representatives of the `n` largest duplicate clusters, largest first."""
+    return [int(i) for i in np.argsort(-sizes, kind="stable")[:n] if sizes[i] > 1]
+
+
+def write_report(report, path):
+    """Write a dedup report as JSON next to the processed data."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, default=str)
+    print(f"Dedup report written to {path}")
+
+
+def report_path_for(output_path):
+    """Default report location for a processed file: <name>_dedup_report.json."""
+    return os.path.splitext(output_path)[0] + "_dedup_report.json"
+
+
+def deduplicate_frame(df, text_col="Cleaned Narrative", id_col="Complaint ID", threshold=DEFAULT_THRESHOLD,
+                      num_perm=NUM_PERM, shingle_size=SHINGLE_SIZE, workers=None, verify=True):
+    """
+    Keep one representative (the earliest row) per near-duplicate cluster of `df`.
+
+    Args:
+        df (pd.DataFrame): Cleaned complaints.
+        text_col (str): Column to compare, normally the output of clean_text.
+        threshold (float): Estimated Jaccard similarity of word shingles above which rows are duplicates.
+        workers (int, optional): Signature processes (defaults to CPU count).
+
+    Returns:
+        Tuple[pd.DataFrame, dict]: The representatives, with their cluster
+        size in the "Duplicate Count" column, and the shrink report.
+    """
+    start = time.perf_counter()
+    texts = df[text_col].fillna("").tolist()
+    signatures = compute_signatures(texts, num_perm, shingle_size, workers=workers)
+    signature_seconds = time.perf_counter() - start
+
+    bands, rows = lsh_params(threshold, num_perm)
+    labels, pair_stats = cluster_near_duplicates(signatures, threshold, bands, rows, verify=verify)
+    keep = labels == np.arange(len(labels))
+    sizes = np.bincount(labels, minlength=len(labels))
+
+    lengths = np.fromiter((len(t) for t in texts), dtype=np.int64, count=len(texts))
+    report = summarize(labels, threshold, num_perm, shingle_size, bands, rows, pair_stats,
+                       chars_in=int(lengths.sum()), chars_out=int(lengths[keep].sum()))
+    ids = df[id_col].tolist() if id_col in df else list(range(len(df)))
+    report["top_clusters"] = [{"representative": ids[i], "size": int(sizes[i]), "text": texts[i][:200]}
+                              for i in _largest_clusters(sizes)]
+
+    deduped = df[keep].copy()
+    deduped[DUPLICATE_COUNT_COLUMN] = sizes[keep]
+    report["seconds"] = {"signatures": round(signature_seconds, 3),
+                         "total": round(time.perf_counter() - start, 3)}
+    return deduped, report
+
+
+def deduplicate_parquet(input_parquet, output_parquet, text_col="Cleaned Narrative", id_col="Complaint ID",
+                        threshold=DEFAULT_THRESHOLD, num_perm=NUM_PERM, shingle_size=SHINGLE_SIZE,
+                        batch_rows=20_000, workers=None, verify=True):
+    """
+    Out-of-core near-duplicate removal for the streaming preprocessing output.
+
+    The first pass streams `text_col` and keeps only the signatures
+    (2 * num_perm bytes per row); the second streams every column again
+    and writes the representatives, with a "Duplicate Count" column, to
+    `output_parquet`.
+
+    Returns:
+        dict: The shrink report (see deduplicate_frame).
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    start = time.perf_counter()
+    parquet_file = pq.ParquetFile(input_parquet)
+    lengths = []
+
+    def text_batches():
+        for batch in parquet_file.iter_batches(batch_size=batch_rows, columns=[text_col]):
+            texts = batch.column(0).to_pylist()
+            lengths.append(np.fromiter((len(t or "") for t in texts), dtype=np.int64, count=len(texts)))
+            yield [t or "" for t in texts]
+
+    parts = list(iter_signature_batches(text_batches(), num_perm, shingle_size, workers=workers))
+    signatures = np.concatenate(parts) if parts else np.zeros((0, num_perm), dtype=np.uint16)
+    del parts
+    signature_seconds = time.perf_counter() - start
+
+    bands, rows = lsh_params(threshold, num_perm)
+    labels, pair_stats = cluster_near_duplicates(signatures, threshold, bands, rows, verify=verify)
+    del signatures
+    keep = labels == np.arange(len(labels))
+    sizes = np.bincount(labels, minlength=len(labels))
+    lengths = np.concatenate(lengths) if lengths else np.zeros(0, dtype=np.int64)
+    report = summarize(labels, threshold, num_perm, shingle_size, bands, rows, pair_stats,
+                       chars_in=int(lengths.sum()), chars_out=int(lengths[keep].sum()))
+
+    top = set(_largest_clusters(sizes))
+    previews = {}
+    schema = parquet_file.schema_arrow.append(pa.field(DUPLICATE_COUNT_COLUMN, pa.int64()))
+    os.makedirs(os.path.dirname(os.path.abspath(output_parquet)), exist_ok=True)
+    row = 0
+    with pq.ParquetWriter(output_parquet, schema) as writer:
+        for batch in parquet_file.iter_batches(batch_size=batch_rows):
+            mask = keep[row:row + batch.num_rows]
+            for i in np.flatnonzero(mask):
+                if row + i in top:
+                    previews[row + i] = (batch.column(id_col)[i].as_py() if id_col in batch.schema.names else row + i,
+                                         (batch.column(text_col)[i].as_py() or "")[:200])
+            table = pa.Table.from_batches([batch]).filter(pa.array(mask))
+            table = table.append_column(DUPLICATE_COUNT_COLUMN, pa.array(sizes[row:row + batch.num_rows][mask],
+                                                                         type=pa.int64()))
+            writer.write_table(table)
+            row += batch.num_rows
+
+    report["top_clusters"] = [{"representative": previews[i][0], "size": int(sizes[i]), "text": previews[i][1]}
+                              for i in sorted(previews, key=lambda i: -sizes[i])]
+    report["seconds"] = {"signatures": round(signature_seconds, 3),
+                         "total": round(time.perf_counter() - start, 3)}
+    return report
+
+
+def print_report(report):
+    print(f"Dedup: {report['rows_in']:,} -> {report['rows_out']:,} rows "
+          f"({report['removed']:,} near-duplicates removed, {report['shrink_pct']}% smaller; "
+          f"{report['duplicate_clusters']:,} clusters, largest {report['largest_cluster']:,})")
+    if "chars_shrink_pct" in report:
+        print(f"Text to embed: {report['chars_in']:,} -> {report['chars_out']:,} characters "
+              f"({report['chars_shrink_pct']}% smaller)")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Remove near-duplicate complaints (MinHash + LSH) from processed data.")
+    parser.add_argument("input", nargs="?", default="Data/processed/filtered_complaints.parquet")
+    parser.add_argument("output", nargs="?", default="Data/processed/deduped_complaints.parquet")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--num-perm", type=int, default=NUM_PERM)
+    parser.add_argument("--shingle-size", type=int, default=SHINGLE_SIZE)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--no-verify", action="store_true", help="Keep LSH candidates without checking their similarity")
+    args = parser.parse_args()
+
+    options = dict(threshold=args.threshold, num_perm=args.num_perm, shingle_size=args.shingle_size,
+                   workers=args.workers, verify=not args.no_verify)
+    if args.input.endswith(".parquet"):
+        report = deduplicate_parquet(args.input, args.output, **options)
+    else:
+        import pandas as pd
+
+        deduped, report = deduplicate_frame(pd.read_csv(args.input), **options)
+        deduped.to_csv(args.output, index=False)
+    print_report(report)
+    write_report(report, report_path_for(args.output))
@@ -0,0 +1,209 @@
+import os
+import csv
+import json
+import time
+import hashlib
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# A word is a run of characters Python's str.split() does not split on
+WORD_RE = r"[^\t\n\v\f\r \x1c-\x1f\x85\pZ]+"
+
+STATS_VERSION = 1
+DEFAULT_QUANTILES = (0.01, 0.05, 0.25, 0.5, 0.75, 0.9, 0.95, 0.99)
+
+
+def count_words(values):
+    """Words per string (same as len(s.split())) of a pandas Series or Arrow array; nulls stay null."""
+    if not isinstance(values, (pa.Array, pa.ChunkedArray)):
+        values = pa.array(values, type=pa.string(), from_pandas=True)
+    return pc.count_substring_regex(values, WORD_RE)
+
+
+def iter_column_batches(path, columns, block_size=64 << 20):
+    """
+    Yield pyarrow RecordBatches holding only `columns` of a raw/processed CSV or Parquet file.
+
+    CSV is parsed by Arrow's streaming reader (quoted newlines allowed, empty
+    strings and the usual NA markers read as null, like pandas); columns
+    missing from the file are skipped.
+    """
+    if str(path).endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        parquet_file = pq.ParquetFile(path)
+        present = [c for c in columns if c in parquet_file.schema_arrow.names]
+        yield from parquet_file.iter_batches(columns=present)
+        return
+
+    from pyarrow import csv as arrow_csv
+
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        header = next(csv.reader(f), [])
+    present = [c for c in columns if c in header]
+    reader = arrow_csv.open_csv(
+        path,
+        read_options=arrow_csv.ReadOptions(block_size=block_size),
+        parse_options=arrow_csv.ParseOptions(newlines_in_values=True),
+        convert_options=arrow_csv.ConvertOptions(
+            include_columns=present,
+            column_types={c: pa.string() for c in present},
+            strings_can_be_null=True,
+        ),
+    )
+    yield from reader
+
+
+def file_fingerprint(path):
+    """Cheap identity of a file's contents: absolute path, size and modification time."""
+    stat = os.stat(path)
+    return {"path": os.path.abspath(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+class WordCountHistogram:
+    """
+    Exact counts per word count up to `max_exact`; longer texts are only
+    counted (and their maximum kept), so quantiles above that are approximate.
+    """
+
+    def __init__(self, max_exact=50_000):
+        self.max_exact = max_exact
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.overflow = 0
+        self.n = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def add(self, lengths):
+        lengths = np.asarray(lengths, dtype=np.int64)
+        if not len(lengths):
+            return
+        self.n += len(lengths)
+        self.total += int(lengths.sum())
+        low, high = int(lengths.min()), int(lengths.max())
+        self.min = low if self.min is None else min(self.min, low)
+        self.max = high if self.max is None else max(self.max, high)
+        exact = lengths[lengths <= self.max_exact]
+        self.overflow += len(lengths) - len(exact)
+        counts = np.bincount(exact)
+        if len(counts) > len(self.counts):
+            counts[:len(self.counts)] += self.counts
+            self.counts = counts
+        else:
+            self.counts[:len(counts)] += counts
+
+    def quantile(self, q):
+        """Nearest-rank quantile; the maximum if it falls among the overflowed texts."""
+        if not self.n:
+            return None
+        rank = max(1, int(np.ceil(q * self.n)))
+        cumulative = np.cumsum(self.counts)
+        if not len(cumulative) or rank > cumulative[-1]:
+            return self.max
+        return int(np.searchsorted(cumulative, rank))
+
+    def as_dict(self, quantiles=DEFAULT_QUANTILES):
+        return {
+            "count": self.n,
+            "sum": self.total,
+            "mean": self.total / self.n if self.n else None,
+            "min": self.min,
+            "max": self.max,
+            "quantiles": {str(q): self.quantile(q) for q in quantiles},
+            "counts": self.counts.tolist(),
+            "overflow": self.overflow,
+            "max_exact": self.max_exact,
+        }
+
+
+def compute_eda_stats(path, product_col="Product", narrative_col="Consumer complaint narrative",
+                      extra_columns=(), cache_dir="Data/eda_cache", use_cache=True, max_exact_words=50_000):
+    """
+    Single-pass EDA aggregates of a raw or processed dataset, read in
+    column-projected Arrow batches (only the needed columns are parsed and
+    memory stays bounded by the batch size).
+
+    Results are cached in `cache_dir` under the file's fingerprint (path,
+    size, mtime) and the arguments, so re-running on an unchanged file
+    returns immediately.
+
+    Returns:
+        dict: "rows", "null_counts" per column, "product_counts",
+        "with_narratives", "without_narratives" and "word_count" (histogram
+        counts per word count, mean/min/max and quantiles), plus
+        "fingerprint", "seconds" and "cached".
+    """
+    columns = list(dict.fromkeys([product_col, narrative_col, *extra_columns]))
+    fingerprint = file_fingerprint(path)
+    key_source = json.dumps({"version": STATS_VERSION, "file": fingerprint, "columns": columns,
+                             "max_exact_words": max_exact_words}, sort_keys=True)
+    cache_path = os.path.join(cache_dir, f"eda_stats_{hashlib.sha1(key_source.encode('utf-8')).hexdigest()[:16]}.json")
+    if use_cache and os.path.exists(cache_path):
+        with open(cache_path, "r", encoding="utf-8") as f:
+            stats = json.load(f)
+        stats["cached"] = True
+        return stats
+
+    start = time.perf_counter()
+    rows = 0
+    null_counts = {}
+    product_counts = {}
+    histogram = WordCountHistogram(max_exact=max_exact_words)
+    for batch in iter_column_batches(path, columns):
+        rows += batch.num_rows
+        for name in batch.schema.names:
+            null_counts[name] = null_counts.get(name, 0) + batch.column(name).null_count
+        if product_col in batch.schema.names:
+            for entry in pc.value_counts(batch.column(product_col)).to_pylist():
+                if entry["values"] is not None:
+                    product_counts[entry["values"]] = product_counts.get(entry["values"], 0) + entry["counts"]
+        if narrative_col in batch.schema.names:
+            lengths = count_words(batch.column(narrative_col)).drop_null()
+            histogram.add(lengths.to_numpy(zero_copy_only=False))
+
+    stats = {
+        "version": STATS_VERSION,
+        "fingerprint": fingerprint,
+        "columns": columns,
+        "product_col": product_col,
+        "narrative_col": narrative_col,
+        "rows": rows,
+        "null_counts": null_counts,
+        "product_counts": dict(sorted(product_counts.items(), key=lambda item: -item[1])),
+        "with_narratives": rows - null_counts.get(narrative_col, rows),
+        "without_narratives": null_counts.get(narrative_col, rows),
+        "word_count": histogram.as_dict(),
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+    if use_cache:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = cache_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(stats, f)
+        os.replace(tmp_path, cache_path)
+    stats["cached"] = False
+    return stats
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Streaming EDA statistics for a complaints CSV or Parquet file.")
+    parser.add_argument("path", nargs="?", default="Data/raw/complaints.csv")
+    parser.add_argument("--narrative-col", default="Consumer complaint narrative")
+    parser.add_argument("--product-col", default="Product")
+    parser.add_argument("--cache-dir", default="Data/eda_cache")
+    parser.add_argument("--no-cache", action="store_true")
+    args = parser.parse_args()
+
+    stats = compute_eda_stats(args.path, product_col=args.product_col, narrative_col=args.narrative_col,
+                              cache_dir=args.cache_dir, use_cache=not args.no_cache)
+    words = stats["word_count"]
+    print(f"{stats['rows']:,} rows in {stats['seconds']}s{' (cached)' if stats['cached'] else ''}")
+    print(f"With narratives: {stats['with_narratives']:,}  without: {stats['without_narratives']:,}")
+    print(f"Word count: mean {words['mean']:.1f}, min {words['min']}, max {words['max']}, quantiles {words['quantiles']}")
+    print("Null counts:", stats["null_counts"])
+    for product, count in list(stats["product_counts"].items())[:20]:
+        print(f"  {count:>10,}  {product}")
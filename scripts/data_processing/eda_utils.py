@@ -1,21 +1,32 @@
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
+from scripts.data_processing.eda_stats import count_words
 
 # Set seaborn style for all plots
 sns.set(style="whitegrid")
 
-def load_data(file_path):
+def load_data(file_path, columns=None):
     """
     Load the complaint dataset from a CSV file.
 
     Parameters:
         file_path (str): Path to the CSV file.
+        columns (list, optional): Only load these columns.
 
     Returns:
         pd.DataFrame: Loaded DataFrame.
+
+    For the full export, eda_stats.compute_eda_stats streams the file instead;
+    the functions below accept its result in place of a DataFrame.
     """
-    return pd.read_csv(file_path)
+    return pd.read_csv(file_path, usecols=columns)
+
+
+def _word_counts(df, narrative_col):
+    """Word count of every non-null narrative, as an int array."""
+    return count_words(df[narrative_col].dropna().astype(str)).to_numpy(zero_copy_only=False)
 
 
 def plot_product_distribution(df, product_col="Product"):
@@ -23,10 +34,13 @@ def plot_product_distribution(df, product_col="Product"):
     Plot the distribution of complaints by product.
 
     Parameters:
-        df (pd.DataFrame): Complaint data.
+        df (pd.DataFrame or dict): Complaint data, or aggregates from eda_stats.compute_eda_stats.
         product_col (str): Column name for the product field.
     """
-    product_counts = df[product_col].value_counts()
+    if isinstance(df, dict):
+        product_counts = pd.Series(df["product_counts"]).sort_values(ascending=False)
+    else:
+        product_counts = df[product_col].value_counts()
     plt.figure(figsize=(10, 5))
     sns.barplot(x=product_counts.index, y=product_counts.values, palette="Blues_d")
     plt.title("Complaint Count by Product Category")
@@ -42,14 +56,17 @@ def plot_narrative_length_distribution(df, narrative_col="Consumer complaint nar
     Plot a histogram showing distribution of narrative lengths (in words).
 
     Parameters:
-        df (pd.DataFrame): Complaint data.
+        df (pd.DataFrame or dict): Complaint data, or aggregates from eda_stats.compute_eda_stats
+            (texts longer than its `max_exact` words are left out of the plot).
         narrative_col (str): Column name for the complaint text.
     """
-    df = df.copy()
-    df["narrative_length"] = df[narrative_col].dropna().astype(str).apply(lambda x: len(x.split()))
-    
     plt.figure(figsize=(10, 5))
-    sns.histplot(df["narrative_length"], bins=50, kde=True, color="orange")
+    if isinstance(df, dict):
+        counts = np.asarray(df["word_count"]["counts"])
+        # One weighted point per distinct word count instead of one per narrative
+        sns.histplot(x=np.arange(len(counts)), weights=counts, bins=50, kde=True, color="orange")
+    else:
+        sns.histplot(_word_counts(df, narrative_col), bins=50, kde=True, color="orange")
     plt.title("Distribution of Narrative Lengths (Word Count)")
     plt.xlabel("Word Count")
     plt.ylabel("Frequency")
@@ -62,22 +79,31 @@ def get_narrative_stats(df, narrative_col="Consumer complaint narrative"):
     Get statistics about complaint narratives.
 
     Parameters:
-        df (pd.DataFrame): Complaint data.
+        df (pd.DataFrame or dict): Complaint data, or aggregates from eda_stats.compute_eda_stats.
         narrative_col (str): Column name for the complaint text.
 
     Returns:
         dict: Summary statistics.
     """
-    df = df.copy()
-    df["narrative_length"] = df[narrative_col].dropna().astype(str).apply(lambda x: len(x.split()))
-
+    if isinstance(df, dict):
+        words = df["word_count"]
+        return {
+            "Total complaints": df["rows"],
+            "With narratives": df["with_narratives"],
+            "Without narratives": df["without_narratives"],
+            "Average word count": words["mean"],
+            "Max word count": words["max"],
+            "Min word count": words["min"]
+        }
+
+    lengths = _word_counts(df, narrative_col)
     stats = {
         "Total complaints": len(df),
         "With narratives": df[narrative_col].notnull().sum(),
         "Without narratives": df[narrative_col].isnull().sum(),
-        "Average word count": df["narrative_length"].mean(),
-        "Max word count": df["narrative_length"].max(),
-        "Min word count": df["narrative_length"].min()
+        "Average word count": lengths.mean() if len(lengths) else np.nan,
+        "Max word count": lengths.max() if len(lengths) else np.nan,
+        "Min word count": lengths.min() if len(lengths) else np.nan
     }
 
     return stats
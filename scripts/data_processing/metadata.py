@@ -0,0 +1,89 @@
+import pandas as pd
+
+# Product categories shown in the app, mapped to the raw CFPB product names they cover
+PRODUCT_CATEGORIES = {
+    "Credit card": [
+        "Credit card",
+        "Credit card or prepaid card",
+    ],
+    "Personal loan": [
+        "Personal loan",
+        "Payday loan, title loan, or personal loan",
+        "Payday loan, title loan, personal loan, or advance loan",
+    ],
+    "Buy Now, Pay Later (BNPL)": [
+        "Buy Now, Pay Later",
+        "Buy Now, Pay Later (BNPL)",
+    ],
+    "Savings account": [
+        "Savings account",
+        "Checking or savings account",
+    ],
+    "Money transfers": [
+        "Money transfers",
+        "Money transfer, virtual currency",
+        "Money transfer, virtual currency, or money service",
+    ],
+}
+
+_RAW_TO_CATEGORY = {
+    raw.lower(): category
+    for category, raw_names in PRODUCT_CATEGORIES.items()
+    for raw in raw_names + [category]
+}
+
+# Raw column -> metadata key stored with every chunk
+METADATA_COLUMNS = {
+    "Product": "product",
+    "Sub-product": "sub_product",
+    "Issue": "issue",
+    "Company": "company",
+    "Date received": "date_received",
+    # Near-duplicate cluster size, written by the de-duplication stage
+    "Duplicate Count": "duplicate_count",
+}
+
+
+def normalize_product(raw_product):
+    """Map a raw CFPB product name to its app category, or None if it is not covered."""
+    if not isinstance(raw_product, str):
+        return None
+    return _RAW_TO_CATEGORY.get(raw_product.strip().lower())
+
+
+def frame_metadata(df):
+    """
+    Build normalized chunk metadata for every row of a complaints DataFrame.
+
+    Products are mapped to their app category, dates become YYYYMMDD integers
+    (so range filters like {"$gte": 20230101} work), duplicate counts are
+    integers and missing values are
+    left out, since Chroma does not accept None metadata values.
+
+    Returns:
+        List[dict]: One metadata dict per row.
+    """
+    columns = {}
+    for column, key in METADATA_COLUMNS.items():
+        if column not in df:
+            continue
+        values = df[column]
+        if key == "product":
+            values = values.map(lambda p: normalize_product(p) or (p.strip() if isinstance(p, str) else None))
+        elif key == "duplicate_count":
+            values = pd.to_numeric(values, errors="coerce").astype("Int64")
+            values = values.astype(object).where(values.notna(), None)
+        elif key == "date_received":
+            dates = pd.to_datetime(values, errors="coerce", format="mixed")
+            values = (dates.dt.year * 10000 + dates.dt.month * 100 + dates.dt.day).astype("Int64")
+            values = values.astype(object).where(values.notna(), None)
+        else:
+            values = values.map(lambda v: v.strip() if isinstance(v, str) and v.strip() else None)
+        columns[key] = values.tolist()
+
+    metadatas = [{} for _ in range(len(df))]
+    for key, values in columns.items():
+        for metadata, value in zip(metadatas, values):
+            if value is not None:
+                metadata[key] = int(value) if key in ("date_received", "duplicate_count") else value
+    return metadatas
@@ -1,42 +1,94 @@
 import pandas as pd
 import re
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from scripts.data_processing.metadata import PRODUCT_CATEGORIES, normalize_product
+from scripts.data_processing.dedup import (
+    DEFAULT_THRESHOLD, deduplicate_frame, deduplicate_parquet, print_report, report_path_for, write_report
+)
+
+# Boilerplate phrases common in complaints, removed in a single precompiled pass
+BOILERPLATE_RE = re.compile(
+    r"i am writing to file a complaint"
+    r"|this is a complaint regarding"
+    r"|please investigate this issue"
+    r"|thank you for your attention"
+    r"|i would like to report"
+)
+NON_ALNUM_RE = re.compile(r"[^a-z0-9\s]")
+WHITESPACE_RE = re.compile(r"\s+")
+
+# Columns read from the raw export in streaming mode
+KEEP_COLUMNS = [
+    "Complaint ID",
+    "Date received",
+    "Product",
+    "Sub-product",
+    "Issue",
+    "Company",
+    "Consumer complaint narrative",
+]
 
 def load_data(filepath):
     """Load CSV data into a pandas DataFrame."""
     df = pd.read_csv(filepath)
     return df
 
+def iter_processed_data(filepath, columns=None, chunksize=50_000):
+    """
+    Yield DataFrame chunks of a processed CSV or Parquet file.
+
+    Only `columns` are read; requested columns missing from the file are skipped.
+    """
+    if str(filepath).endswith(".parquet"):
+        import pyarrow.parquet as pq
+        parquet_file = pq.ParquetFile(filepath)
+        if columns is not None:
+            columns = [c for c in columns if c in parquet_file.schema_arrow.names]
+        for batch in parquet_file.iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+    else:
+        usecols = None if columns is None else (lambda c: c in columns)
+        yield from pd.read_csv(filepath, usecols=usecols, chunksize=chunksize)
+
 def clean_text(text):
     """Basic text cleaning: lowercase, remove special chars, boilerplate."""
     if not isinstance(text, str):
         return ""
     text = text.lower()
-    # Remove boilerplate phrases common in complaints 
-    boilerplate_patterns = [
-        r"i am writing to file a complaint",
-        r"this is a complaint regarding",
-        r"please investigate this issue",
-        r"thank you for your attention",
-        r"i would like to report",
-    ]
-    for pattern in boilerplate_patterns:
-        text = re.sub(pattern, "", text)
+    text = BOILERPLATE_RE.sub("", text)
     # Remove non-alphanumeric chars except spaces
-    text = re.sub(r"[^a-z0-9\s]", "", text)
+    text = NON_ALNUM_RE.sub("", text)
     # Collapse multiple spaces
-    text = re.sub(r"\s+", " ", text).strip()
+    text = WHITESPACE_RE.sub(" ", text).strip()
     return text
 
+def clean_batch(texts):
+    """Clean a list of narratives (unit of work for the process pool)."""
+    return [clean_text(t) for t in texts]
+
 def filter_valid_products(df, valid_products):
-    """Filter DataFrame to keep only valid products and non-empty narratives."""
-    filtered_df = df[df['Product'].isin(valid_products)].copy()
+    """
+    Filter DataFrame to keep only valid products and non-empty narratives.
+
+    `valid_products` may list raw CFPB product names or app categories
+    (see scripts.data_processing.metadata.PRODUCT_CATEGORIES).
+    """
+    is_valid = df['Product'].isin(valid_products) | df['Product'].map(normalize_product).isin(valid_products)
+    filtered_df = df[is_valid].copy()
     filtered_df = filtered_df[filtered_df['Consumer complaint narrative'].notnull()]
     filtered_df = filtered_df[filtered_df['Consumer complaint narrative'].str.strip() != ""]
     return filtered_df
 
-def preprocess_dataset(input_csv, output_csv, valid_products):
-    """Complete preprocessing pipeline."""
+def preprocess_dataset(input_csv, output_csv, valid_products, dedup_threshold=DEFAULT_THRESHOLD):
+    """
+    Complete preprocessing pipeline.
+
+    After cleaning, near-duplicate narratives (estimated Jaccard similarity
+    of word shingles >= `dedup_threshold`) are collapsed to one row with a
+    "Duplicate Count"; pass dedup_threshold=None to keep every row.
+    """
     print(f"Loading data from {input_csv}...")
     df = load_data(input_csv)
     print(f"Original dataset size: {len(df):,}")
@@ -52,10 +104,121 @@ def preprocess_dataset(input_csv, output_csv, valid_products):
     df_filtered = df_filtered[df_filtered['Cleaned Narrative'].str.strip() != ""]
     print(f"Dataset size after cleaning empty narratives: {len(df_filtered):,}")
 
+    if dedup_threshold is not None:
+        print(f"Removing near-duplicate narratives (Jaccard >= {dedup_threshold})...")
+        df_filtered, report = deduplicate_frame(df_filtered, threshold=dedup_threshold)
+        print_report(report)
+        write_report(report, report_path_for(output_csv))
+
     print(f"Saving cleaned data to {output_csv}...")
     df_filtered.to_csv(output_csv, index=False)
     print("Preprocessing complete.")
 
+def _clean_parallel(pool, texts, workers):
+    """Clean narratives across the pool, preserving order."""
+    if pool is None or len(texts) < 2 * workers:
+        return clean_batch(texts)
+    step = -(-len(texts) // (workers * 4))
+    batches = [texts[i:i + step] for i in range(0, len(texts), step)]
+    cleaned = []
+    for part in pool.map(clean_batch, batches):
+        cleaned.extend(part)
+    return cleaned
+
+def preprocess_dataset_streaming(input_csv, output_parquet, valid_products, chunksize=100_000, workers=None,
+                                 dedup_threshold=DEFAULT_THRESHOLD):
+    """
+    Out-of-core preprocessing pipeline.
+
+    Reads the raw CSV in bounded chunks (only KEEP_COLUMNS), filters products
+    before cleaning, cleans narratives across a process pool and appends each
+    chunk to a Parquet file, so peak memory depends on `chunksize` only.
+    Near-duplicates are then removed in a second, streaming pass over that
+    file (see dedup.deduplicate_parquet), which only holds MinHash
+    signatures in memory.
+
+    Args:
+        input_csv (str): Path to the raw complaints CSV.
+        output_parquet (str): Path of the Parquet file to write.
+        valid_products (List[str]): Products to keep.
+        chunksize (int): Rows read per chunk.
+        workers (int, optional): Cleaning processes (defaults to CPU count).
+        dedup_threshold (float, optional): Jaccard similarity above which
+            narratives are near-duplicates; None skips de-duplication.
+
+    Returns:
+        dict: Row counts, elapsed seconds and rows/sec, plus the "dedup" report.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    workers = workers or os.cpu_count() or 1
+    valid_products = set(valid_products)
+    stats = {"rows_read": 0, "rows_filtered": 0, "rows_written": 0}
+    writer = None
+    schema = None
+    start = time.perf_counter()
+
+    print(f"Streaming {input_csv} in chunks of {chunksize:,} rows with {workers} worker(s)...")
+    os.makedirs(os.path.dirname(os.path.abspath(output_parquet)), exist_ok=True)
+    cleaned_parquet = output_parquet + ".undeduped" if dedup_threshold is not None else output_parquet
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        reader = pd.read_csv(
+            input_csv,
+            usecols=lambda c: c in KEEP_COLUMNS,
+            dtype=str,
+            chunksize=chunksize,
+        )
+        for chunk in reader:
+            stats["rows_read"] += len(chunk)
+            chunk = filter_valid_products(chunk, valid_products)
+            stats["rows_filtered"] += len(chunk)
+            if chunk.empty:
+                continue
+
+            texts = chunk['Consumer complaint narrative'].tolist()
+            chunk['Cleaned Narrative'] = _clean_parallel(pool, texts, workers)
+            chunk = chunk[chunk['Cleaned Narrative'] != ""]
+            if chunk.empty:
+                continue
+
+            # Keep a stable column layout across chunks
+            chunk = chunk.reindex(columns=KEEP_COLUMNS + ['Cleaned Narrative'])
+            chunk = chunk.astype(object).where(chunk.notna(), None)
+            if writer is None:
+                schema = pa.schema([(c, pa.string()) for c in chunk.columns])
+                writer = pq.ParquetWriter(cleaned_parquet, schema)
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            stats["rows_written"] += len(chunk)
+            print(f"  read {stats['rows_read']:,} rows, written {stats['rows_written']:,}")
+        if writer is None:
+            # Nothing survived filtering: still write an empty file with the usual columns
+            schema = pa.schema([(c, pa.string()) for c in KEEP_COLUMNS + ['Cleaned Narrative']])
+            writer = pq.ParquetWriter(cleaned_parquet, schema)
+            writer.write_table(schema.empty_table())
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        if writer is not None:
+            writer.close()
+
+    if dedup_threshold is not None:
+        print(f"Removing near-duplicate narratives (Jaccard >= {dedup_threshold})...")
+        report = deduplicate_parquet(cleaned_parquet, output_parquet, threshold=dedup_threshold, workers=workers)
+        os.remove(cleaned_parquet)
+        print_report(report)
+        write_report(report, report_path_for(output_parquet))
+        stats["rows_written"] = report["rows_out"]
+        stats["dedup"] = report
+
+    elapsed = time.perf_counter() - start
+    stats["seconds"] = round(elapsed, 3)
+    stats["rows_per_sec"] = round(stats["rows_read"] / elapsed, 1) if elapsed > 0 else 0.0
+    print(f"Preprocessing complete: {stats['rows_written']:,} rows written to {output_parquet}")
+    print(f"Throughput: {stats['rows_per_sec']:,} rows/sec ({elapsed:.1f}s)")
+    return stats
+
 def resolve_path(p):
     """Resolve to absolute path if relative."""
     return p if os.path.isabs(p) else os.path.join(os.getcwd(), p)
@@ -65,21 +228,29 @@ if __name__ == "__main__":
 
     print("Current working directory:", os.getcwd())
 
-    raw_data_path = sys.argv[1] if len(sys.argv) > 1 else "Data/raw/complaints.csv"
+    # `--stream` switches to the chunked, multi-process Parquet pipeline;
+    # `--no-dedup` keeps near-duplicates, `--dedup-threshold=0.9` changes the similarity cut-off
+    streaming = "--stream" in sys.argv
+    dedup_threshold = None if "--no-dedup" in sys.argv else DEFAULT_THRESHOLD
+    for a in sys.argv[1:]:
+        if a.startswith("--dedup-threshold=") and dedup_threshold is not None:
+            dedup_threshold = float(a.split("=", 1)[1])
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+
+    raw_data_path = args[0] if len(args) > 0 else "Data/raw/complaints.csv"
     raw_data_path = resolve_path(raw_data_path)
 
-    output_path = sys.argv[2] if len(sys.argv) > 2 else "Data/processed/filtered_complaints.csv"
+    default_output = "Data/processed/filtered_complaints.parquet" if streaming else "Data/processed/filtered_complaints.csv"
+    output_path = args[1] if len(args) > 1 else default_output
     output_path = resolve_path(output_path)
 
     print(f"Using input data path: {raw_data_path}")
     print(f"Using output data path: {output_path}")
 
-    valid_products = [
-        "Credit card",
-        "Personal loan",
-        "Buy Now, Pay Later",
-        "Savings account",
-        "Money transfer, virtual currency"
-    ]
+    # App categories; each covers the raw CFPB product names listed in PRODUCT_CATEGORIES
+    valid_products = list(PRODUCT_CATEGORIES)
 
-    preprocess_dataset(raw_data_path, output_path, valid_products)
+    if streaming:
+        preprocess_dataset_streaming(raw_data_path, output_path, valid_products, dedup_threshold=dedup_threshold)
+    else:
+        preprocess_dataset(raw_data_path, output_path, valid_products, dedup_threshold=dedup_threshold)
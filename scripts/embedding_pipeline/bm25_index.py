@@ -0,0 +1,178 @@
+import os
+import json
+from array import array
+from collections import Counter
+import numpy as np
+
+from scripts.data_processing.preprocess import clean_text
+
+
+class BM25IndexBuilder:
+    """
+    Accumulates (term, chunk, tf) postings in compact arrays and writes a BM25 index.
+
+    Texts are expected to be `clean_text` output (lowercased alphanumeric
+    tokens separated by spaces), so tokenizing is a plain split.
+    """
+
+    def __init__(self, partition_key="product"):
+        self.partition_key = partition_key
+        self.vocab = {}
+        self.ids = []
+        self.partition_values = []
+        self._term_ids = array("I")
+        self._doc_ids = array("I")
+        self._tfs = array("H")
+        self._doc_lengths = array("I")
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, ids, texts, metadatas=None):
+        metadatas = metadatas or [{} for _ in ids]
+        for chunk_id, text, metadata in zip(ids, texts, metadatas):
+            doc = len(self.ids)
+            self.ids.append(chunk_id)
+            self.partition_values.append((metadata or {}).get(self.partition_key))
+            tokens = text.split()
+            self._doc_lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                self._term_ids.append(self.vocab.setdefault(term, len(self.vocab)))
+                self._doc_ids.append(doc)
+                self._tfs.append(min(tf, 65535))
+
+    def save(self, directory):
+        """Sort postings by term and write the array-backed index to `directory`."""
+        os.makedirs(directory, exist_ok=True)
+        term_ids = np.frombuffer(self._term_ids, dtype=np.uint32)
+        doc_ids = np.frombuffer(self._doc_ids, dtype=np.uint32)
+        tfs = np.frombuffer(self._tfs, dtype=np.uint16)
+        order = np.lexsort((doc_ids, term_ids))
+        offsets = np.zeros(len(self.vocab) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(term_ids, minlength=len(self.vocab)))
+
+        values = sorted({v for v in self.partition_values if v is not None})
+        codes = {v: i for i, v in enumerate(values)}
+        partition_codes = np.array([codes.get(v, -1) for v in self.partition_values], dtype=np.int16)
+
+        np.save(os.path.join(directory, "offsets.npy"), offsets)
+        np.save(os.path.join(directory, "doc_ids.npy"), doc_ids[order].astype(np.int32))
+        np.save(os.path.join(directory, "tfs.npy"), tfs[order])
+        np.save(os.path.join(directory, "doc_lengths.npy"), np.frombuffer(self._doc_lengths, dtype=np.uint32).astype(np.int32))
+        np.save(os.path.join(directory, "partitions.npy"), partition_codes)
+        with open(os.path.join(directory, "vocab.json"), "w", encoding="utf-8") as f:
+            json.dump(sorted(self.vocab, key=self.vocab.get), f)
+        with open(os.path.join(directory, "ids.json"), "w", encoding="utf-8") as f:
+            json.dump(self.ids, f)
+        with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"n_docs": len(self.ids), "n_terms": len(self.vocab), "n_postings": len(order),
+                       "partition_key": self.partition_key, "partition_values": values}, f)
+
+
+class BM25Index:
+    """
+    Read-only BM25 index with memory-mapped postings.
+
+    Postings of term t are doc_ids[offsets[t]:offsets[t+1]] with matching
+    term frequencies in tfs. Terms present in more than `max_df_ratio` of
+    chunks carry almost no BM25 weight and are skipped, which keeps the cost
+    of stop-word-heavy questions bounded.
+    """
+
+    def __init__(self, directory="vector_store/bm25", k1=1.5, b=0.75, max_df_ratio=0.5):
+        self.directory = directory
+        self.k1 = k1
+        self.b = b
+        with open(os.path.join(directory, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.n_docs = meta["n_docs"]
+        self.partition_key = meta["partition_key"]
+        self._partition_codes = {v: i for i, v in enumerate(meta["partition_values"])}
+        with open(os.path.join(directory, "vocab.json"), "r", encoding="utf-8") as f:
+            self.vocab = {term: i for i, term in enumerate(json.load(f))}
+        with open(os.path.join(directory, "ids.json"), "r", encoding="utf-8") as f:
+            self.ids = json.load(f)
+        self.offsets = np.load(os.path.join(directory, "offsets.npy"))
+        self.doc_ids = np.load(os.path.join(directory, "doc_ids.npy"), mmap_mode="r")
+        self.tfs = np.load(os.path.join(directory, "tfs.npy"), mmap_mode="r")
+        self.partitions = np.load(os.path.join(directory, "partitions.npy"), mmap_mode="r")
+        doc_lengths = np.load(os.path.join(directory, "doc_lengths.npy"))
+        avgdl = float(doc_lengths.mean()) if len(doc_lengths) else 1.0
+        # Per-document length normalization, precomputed once
+        self._norm = (k1 * (1 - b + b * doc_lengths / max(avgdl, 1e-9))).astype(np.float32)
+        self.max_df = max(1, int(max_df_ratio * self.n_docs))
+
+    def search(self, query_text, top_k=10, filters=None):
+        """
+        BM25 search over chunks.
+
+        Only an exact-match partition filter (e.g. {"product": "Credit card"}) is
+        applied here; operator filters such as {"product": {"$in": [...]}} are
+        left to the caller's metadata post-filter.
+
+        Returns:
+            List[Tuple[str, float]]: (chunk id, score), best first.
+        """
+        filters = filters or {}
+        code = None
+        if isinstance(filters.get(self.partition_key), str):
+            code = self._partition_codes.get(filters[self.partition_key])
+            if code is None:
+                return []
+
+        docs, scores = [], []
+        for term in set(clean_text(query_text).split()):
+            t = self.vocab.get(term)
+            if t is None:
+                continue
+            start, end = self.offsets[t], self.offsets[t + 1]
+            df = end - start
+            if df > self.max_df:
+                continue
+            idf = np.log(1.0 + (self.n_docs - df + 0.5) / (df + 0.5))
+            d = np.asarray(self.doc_ids[start:end])
+            tf = np.asarray(self.tfs[start:end], dtype=np.float32)
+            if code is not None:
+                keep = self.partitions[d] == code
+                d, tf = d[keep], tf[keep]
+            docs.append(d)
+            scores.append(idf * tf * (self.k1 + 1) / (tf + self._norm[d]))
+        if not docs:
+            return []
+
+        docs = np.concatenate(docs)
+        unique_docs, inverse = np.unique(docs, return_inverse=True)
+        totals = np.bincount(inverse, weights=np.concatenate(scores))
+        k = min(top_k, len(unique_docs))
+        top = np.argpartition(-totals, k - 1)[:k]
+        top = top[np.argsort(-totals[top])]
+        return [(self.ids[unique_docs[i]], float(totals[i])) for i in top]
+
+
+def build_bm25_from_dataset(data_path, directory="vector_store/bm25", text_col="Cleaned Narrative",
+                            id_col="Complaint ID", chunk_size=500, chunk_overlap=100, read_chunksize=50_000):
+    """Rebuild the lexical index from a processed dataset, using the same chunk ids as the vector store."""
+    from scripts.data_processing.preprocess import iter_processed_data
+    from scripts.data_processing.metadata import frame_metadata
+    from scripts.embedding_pipeline.fast_chunking import chunk_texts
+    from scripts.embedding_pipeline.indexer import make_chunk_id
+
+    builder = BM25IndexBuilder()
+    for df in iter_processed_data(data_path, columns=[id_col, text_col, "Product"], chunksize=read_chunksize):
+        for complaint_id, text, metadata in zip(df[id_col].astype(str), df[text_col], frame_metadata(df)):
+            if not isinstance(text, str) or not text.strip():
+                continue
+            chunks = {make_chunk_id(complaint_id, c["text"]): c["text"]
+                      for c in chunk_texts([text], chunk_size=chunk_size, chunk_overlap=chunk_overlap)}
+            builder.add(list(chunks), list(chunks.values()), [metadata] * len(chunks))
+    builder.save(directory)
+    print(f"BM25 index: {len(builder)} chunks, {len(builder.vocab)} terms -> {directory}")
+    return builder
+
+
+if __name__ == "__main__":
+    import sys
+
+    data_path = sys.argv[1] if len(sys.argv) > 1 else "Data/processed/filtered_complaints.csv"
+    output_dir = sys.argv[2] if len(sys.argv) > 2 else "vector_store/bm25"
+    build_bm25_from_dataset(data_path, output_dir)
@@ -1,19 +1,42 @@
-from sentence_transformers import SentenceTransformer
 import os
-import pandas as pd
 import numpy as np
 
-def load_embedding_model(model_path=None, model_name='all-MiniLM-L6-v2'):
+def load_embedding_model(model_path=None, model_name='all-MiniLM-L6-v2', backend=None, quantized=True, num_threads=None):
     """
     Load a SentenceTransformer embedding model from local path (offline) or Hugging Face (online).
 
     Args:
         model_path (str, optional): Path to local model folder.
         model_name (str): Hugging Face model name (used if model_path is None).
+        backend (str, optional): "sentence-transformers" (PyTorch) or "onnx";
+            defaults to the EMBEDDING_BACKEND environment variable, else PyTorch.
+            With "onnx", model_path is an ONNX export (see onnx_embedding.py) or a
+            local model, exported next to it on first use.
+        quantized (bool): ONNX only: use the int8 model when exported.
+        num_threads (int, optional): ONNX only: onnxruntime intra-op threads.
 
     Returns:
-        SentenceTransformer: Loaded embedding model.
+        SentenceTransformer or OnnxEmbeddingModel: Loaded embedding model.
     """
+    backend = backend or os.getenv("EMBEDDING_BACKEND", "sentence-transformers")
+    if backend == "onnx":
+        from scripts.embedding_pipeline.onnx_embedding import OnnxEmbeddingModel, CONFIG_NAME, DEFAULT_ONNX_DIR, export_onnx
+
+        onnx_dir = model_path or DEFAULT_ONNX_DIR
+        if not os.path.exists(os.path.join(onnx_dir, CONFIG_NAME)):
+            # A local model: its export lives in "<model_path>-onnx"
+            exported = onnx_dir.rstrip("/") + "-onnx"
+            if not os.path.exists(os.path.join(exported, CONFIG_NAME)):
+                if not os.path.exists(os.path.join(onnx_dir, "modules.json")):
+                    raise FileNotFoundError(f"{onnx_dir} is neither an ONNX export nor a local SentenceTransformer model.")
+                print(f"Exporting {onnx_dir} to ONNX...")
+                export_onnx(onnx_dir, exported, quantize=quantized)
+            onnx_dir = exported
+        print(f"Loading ONNX embedding model from: {onnx_dir}")
+        return OnnxEmbeddingModel(onnx_dir, quantized=quantized, num_threads=num_threads)
+
+    from sentence_transformers import SentenceTransformer
+
     if model_path and os.path.exists(model_path):
         print(f"Loading embedding model from local path: {model_path}")
         return SentenceTransformer(model_path)
@@ -21,26 +44,35 @@ def load_embedding_model(model_path=None, model_name='all-MiniLM-L6-v2'):
         print(f"Downloading embedding model from Hugging Face: {model_name}")
         return SentenceTransformer(model_name)
 
-def embed_texts(model, texts):
+def embed_texts(model, texts, cache=None):
     """
     Generate embeddings for a list of texts.
 
     Args:
         model (SentenceTransformer): The loaded model.
         texts (List[str]): List of text strings to embed.
+        cache (EmbeddingCache, optional): On-disk cache consulted before encoding.
 
     Returns:
         np.ndarray: Embedding vectors (n_texts x embedding_dim).
     """
-    embeddings = model.encode(
+    from scripts.embedding_pipeline.embedding_cache import encode_with_cache
+
+    embeddings = encode_with_cache(
+        model,
         texts,
+        cache=cache,
         show_progress_bar=True,
         convert_to_numpy=True,
         normalize_embeddings=True
     )
+    if cache is not None:
+        cache.flush()
     return embeddings
 
 if __name__ == "__main__":
+    import pandas as pd
+
     # Dynamically build the path to filtered_complaints.csv relative to this script
     base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../Data/processed"))
     csv_path = os.path.join(base_dir, "filtered_complaints.csv")
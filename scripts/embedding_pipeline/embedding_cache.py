@@ -0,0 +1,192 @@
+import os
+import re
+import json
+import zlib
+import hashlib
+import threading
+import numpy as np
+
+
+def normalize_text(text):
+    """Whitespace-normalized text used for cache keys."""
+    return " ".join(str(text).split())
+
+
+def cache_model_name(model, model_name):
+    """
+    Cache namespace for vectors of `model`: ONNX models get one per variant
+    (e.g. "<model_name>@onnx-int8"), since their vectors differ slightly from
+    the PyTorch ones and must not be mixed into one store.
+    """
+    variant = getattr(model, "variant", None)
+    return f"{model_name}@onnx-{variant}" if variant else model_name
+
+
+class EmbeddingCache:
+    """
+    Persistent on-disk cache of normalized embeddings.
+
+    Vectors live in a memory-mapped float32 matrix with a fixed number of
+    slots; a memory-mapped uint64 array holds, per slot, an 8-byte hash of
+    model name and normalized text plus a CRC32 of the vector, and is the
+    index. When all slots are used, the oldest entries are overwritten first
+    (ring buffer eviction).
+
+    A slot's key is cleared before its vector is overwritten and written back
+    after, so a crash between `store` and `flush` never leaves a key pointing
+    at another text's vector; the checksum catches slots whose pages did not
+    all reach the disk.
+    """
+
+    FORMAT = 2
+
+    def __init__(self, cache_dir="vector_store/embedding_cache", model_name="all-MiniLM-L6-v2", max_entries=1_000_000):
+        self.model_name = model_name
+        self.directory = os.path.join(cache_dir, re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name))
+        os.makedirs(self.directory, exist_ok=True)
+        self._meta_path = os.path.join(self.directory, "meta.json")
+        self._keys_path = os.path.join(self.directory, "keys.u64")
+        self._vectors_path = os.path.join(self.directory, "vectors.f32")
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        meta = {}
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        if meta.get("format") != self.FORMAT:
+            # Caches written before keys were kept next to the vectors can't be trusted after a crash
+            meta = {}
+        self.capacity = meta.get("capacity", max_entries)
+        self.dim = meta.get("dim")
+        self._next_slot = meta.get("next_slot", 0)
+
+        if os.path.exists(self._keys_path) and self.dim is not None:
+            # (key, crc32) per slot
+            self._keys = np.memmap(self._keys_path, dtype=np.uint64, mode="r+", shape=(self.capacity, 2))
+            self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(self.capacity, self.dim))
+        else:
+            self._keys = None
+            self._vectors = None
+        self._slots = {}
+        if self._keys is not None:
+            occupied = np.flatnonzero(self._keys[:, 0])
+            self._slots = dict(zip(self._keys[occupied, 0].tolist(), occupied.tolist()))
+
+    def __len__(self):
+        return len(self._slots)
+
+    def key(self, text):
+        digest = hashlib.blake2b(
+            f"{self.model_name}\0{normalize_text(text)}".encode("utf-8"), digest_size=8
+        ).digest()
+        # 0 marks an empty slot
+        return int.from_bytes(digest, "little") or 1
+
+    def lookup(self, texts):
+        """
+        Look up cached vectors.
+
+        Returns:
+            Tuple[np.ndarray | None, List[int]]: (n_texts x dim) array with hits
+            filled in (None if the cache is still empty), and positions of misses.
+        """
+        with self._lock:
+            if self._vectors is None:
+                self.misses += len(texts)
+                return None, list(range(len(texts)))
+            found = np.zeros((len(texts), self.dim), dtype=np.float32)
+            missing = []
+            for i, text in enumerate(texts):
+                key = self.key(text)
+                slot = self._slots.get(key)
+                if slot is not None and zlib.crc32(self._vectors[slot].tobytes()) != int(self._keys[slot, 1]):
+                    # Torn write: the vector page didn't reach the disk with its key
+                    self._keys[slot] = 0
+                    del self._slots[key]
+                    slot = None
+                if slot is None:
+                    missing.append(i)
+                else:
+                    found[i] = self._vectors[slot]
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+            return found, missing
+
+    def store(self, texts, vectors):
+        """Insert vectors, evicting the oldest slots once the cache is full."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            if self._vectors is None:
+                self.dim = int(vectors.shape[1])
+                self._keys = np.memmap(self._keys_path, dtype=np.uint64, mode="w+", shape=(self.capacity, 2))
+                self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="w+", shape=(self.capacity, self.dim))
+                self._write_meta()
+            for text, vector in zip(texts, vectors):
+                key = self.key(text)
+                if key in self._slots:
+                    continue
+                slot = self._next_slot
+                old_key = int(self._keys[slot, 0])
+                if old_key:
+                    if self._slots.get(old_key) == slot:
+                        del self._slots[old_key]
+                    self.evictions += 1
+                self._keys[slot, 0] = 0
+                self._vectors[slot] = vector
+                self._keys[slot] = (key, zlib.crc32(self._vectors[slot].tobytes()))
+                self._slots[key] = slot
+                self._next_slot = (slot + 1) % self.capacity
+
+    def _write_meta(self):
+        meta = {"format": self.FORMAT, "model_name": self.model_name, "dim": self.dim,
+                "capacity": self.capacity, "next_slot": self._next_slot}
+        tmp_path = self._meta_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self._meta_path)
+
+    def flush(self):
+        """Write vectors and keys back to disk and record the ring position."""
+        with self._lock:
+            if self._vectors is None:
+                return
+            self._vectors.flush()
+            self._keys.flush()
+            self._write_meta()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+def encode_with_cache(model, texts, cache=None, **encode_kwargs):
+    """
+    Encode texts, reading cached vectors first and only sending misses to `model.encode`.
+
+    The cache is meant for normalized embeddings, so callers should always pass
+    `normalize_embeddings=True` when a cache is given.
+    """
+    if cache is None:
+        return model.encode(texts, **encode_kwargs)
+    found, missing = cache.lookup(texts)
+    if not missing:
+        return found
+    missing_texts = [texts[i] for i in missing]
+    computed = np.asarray(model.encode(missing_texts, **encode_kwargs), dtype=np.float32)
+    cache.store(missing_texts, computed)
+    if found is None:
+        if len(missing) == len(texts):
+            return computed
+        found = np.zeros((len(texts), computed.shape[1]), dtype=np.float32)
+    found[missing] = computed
+    return found
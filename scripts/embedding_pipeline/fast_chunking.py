@@ -0,0 +1,194 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+# Same separators, in the same order, as chunking.chunk_texts
+SEPARATORS = ("\n\n", "\n", ".", " ", "")
+
+
+def _split_spans(text, start, end, separator):
+    """
+    Spans of text[start:end] split on `separator`, each piece starting with
+    the separator that preceded it (LangChain's keep_separator=True);
+    empty pieces are dropped. An empty separator splits into characters.
+    """
+    if separator == "":
+        return [(i, i + 1) for i in range(start, end)]
+    spans = []
+    piece_start = start
+    position = text.find(separator, start, end)
+    while position != -1:
+        if position > piece_start:
+            spans.append((piece_start, position))
+        piece_start = position
+        position = text.find(separator, position + len(separator), end)
+    if end > piece_start:
+        spans.append((piece_start, end))
+    return spans
+
+
+def _strip_span(text, start, end):
+    """(start, end) with surrounding whitespace removed, or None if nothing is left."""
+    piece = text[start:end]
+    stripped = piece.lstrip()
+    if not stripped:
+        return None
+    start += len(piece) - len(stripped)
+    return start, start + len(stripped.rstrip())
+
+
+def _merge_spans(text, spans, chunk_size, chunk_overlap, out):
+    """RecursiveCharacterTextSplitter._merge_splits on contiguous spans (separator "")."""
+    current = []
+    total = 0
+    for span in spans:
+        length = span[1] - span[0]
+        if total + length > chunk_size and current:
+            stripped = _strip_span(text, current[0][0], current[-1][1])
+            if stripped is not None:
+                out.append(stripped)
+            while total > chunk_overlap or (total + length > chunk_size and total > 0):
+                total -= current[0][1] - current[0][0]
+                current.pop(0)
+        current.append(span)
+        total += length
+    if current:
+        stripped = _strip_span(text, current[0][0], current[-1][1])
+        if stripped is not None:
+            out.append(stripped)
+
+
+def _split_recursive(text, start, end, separators, chunk_size, chunk_overlap, out):
+    separator = separators[-1]
+    remaining = ()
+    for i, candidate in enumerate(separators):
+        if candidate == "":
+            separator = candidate
+            break
+        if text.find(candidate, start, end) != -1:
+            separator = candidate
+            remaining = separators[i + 1:]
+            break
+
+    good = []
+    for span in _split_spans(text, start, end, separator):
+        if span[1] - span[0] < chunk_size:
+            good.append(span)
+            continue
+        if good:
+            _merge_spans(text, good, chunk_size, chunk_overlap, out)
+            good = []
+        if not remaining:
+            out.append(span)
+        else:
+            _split_recursive(text, span[0], span[1], remaining, chunk_size, chunk_overlap, out)
+    if good:
+        _merge_spans(text, good, chunk_size, chunk_overlap, out)
+
+
+def split_offsets(text, chunk_size=500, chunk_overlap=100, separators=SEPARATORS):
+    """
+    Chunk boundaries of one text, matching the chunks of chunking.chunk_texts.
+
+    Returns:
+        List[Tuple[int, int]]: (start, end) character offsets; the chunks are text[start:end].
+    """
+    if not isinstance(text, str) or text.strip() == "":
+        return []
+    out = []
+    _split_recursive(text, 0, len(text), tuple(separators), chunk_size, chunk_overlap, out)
+    return out
+
+
+def chunk_texts(texts, chunk_size=500, chunk_overlap=100, workers=1):
+    """
+    Drop-in for chunking.chunk_texts: same chunks, same [{"text", "source_index"}] output.
+    Pass workers=None to use every core on large inputs.
+    """
+    return chunk_offsets(texts, chunk_size=chunk_size, chunk_overlap=chunk_overlap, workers=workers).to_dicts()
+
+
+def split_text(text, chunk_size=500, chunk_overlap=100, separators=SEPARATORS):
+    """Chunk strings of one text (same as chunk_texts([text]) without the dicts)."""
+    return [text[start:end] for start, end in split_offsets(text, chunk_size, chunk_overlap, separators)]
+
+
+class ChunkBatch:
+    """
+    Chunks of a contiguous run of source texts, stored as offsets.
+
+    `source_index`, `start` and `end` are parallel int arrays; chunk i is
+    texts[source_index[i]][start[i]:end[i]]. Chunk strings are only created
+    when asked for.
+    """
+
+    def __init__(self, texts, source_index, start, end):
+        self.texts = texts
+        self.source_index = source_index
+        self.start = start
+        self.end = end
+
+    def __len__(self):
+        return len(self.source_index)
+
+    def text(self, i):
+        return self.texts[self.source_index[i]][self.start[i]:self.end[i]]
+
+    def chunk_texts(self):
+        return [self.text(i) for i in range(len(self))]
+
+    def to_dicts(self):
+        """Chunks in the chunk_texts format: [{"text", "source_index"}]."""
+        return [{"text": self.text(i), "source_index": int(self.source_index[i])} for i in range(len(self))]
+
+
+def _offsets_for(job):
+    """Worker: offsets for texts[first:first + len(texts)] as three int arrays."""
+    first, texts, chunk_size, chunk_overlap, separators = job
+    sources, starts, ends = [], [], []
+    for i, text in enumerate(texts):
+        for start, end in split_offsets(text, chunk_size, chunk_overlap, separators):
+            sources.append(first + i)
+            starts.append(start)
+            ends.append(end)
+    return (np.asarray(sources, dtype=np.int64), np.asarray(starts, dtype=np.int32),
+            np.asarray(ends, dtype=np.int32))
+
+
+def iter_chunk_batches(texts, chunk_size=500, chunk_overlap=100, separators=SEPARATORS,
+                       batch_docs=2000, workers=None):
+    """
+    Chunk `texts` across `workers` processes, yielding one ChunkBatch per
+    `batch_docs` source texts, in order.
+
+    Workers only send offsets back, so the chunk strings are never copied;
+    with workers=1 (or a single batch) everything runs in this process.
+    """
+    texts = texts if isinstance(texts, list) else list(texts)
+    workers = workers or os.cpu_count() or 1
+    jobs = ((first, texts[first:first + batch_docs], chunk_size, chunk_overlap, tuple(separators))
+            for first in range(0, len(texts), batch_docs))
+    if workers == 1 or len(texts) <= batch_docs:
+        for job in jobs:
+            yield ChunkBatch(texts, *_offsets_for(job))
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # map yields results in input order, so consumers see batches in source order
+        for offsets in pool.map(_offsets_for, jobs):
+            yield ChunkBatch(texts, *offsets)
+
+
+def chunk_offsets(texts, chunk_size=500, chunk_overlap=100, separators=SEPARATORS, batch_docs=2000, workers=None):
+    """
+    Chunk all `texts` in parallel.
+
+    Returns:
+        ChunkBatch: Offsets of every chunk, in source order.
+    """
+    texts = texts if isinstance(texts, list) else list(texts)
+    batches = list(iter_chunk_batches(texts, chunk_size, chunk_overlap, separators, batch_docs, workers))
+    if not batches:
+        empty = np.zeros(0, dtype=np.int32)
+        return ChunkBatch(texts, empty.astype(np.int64), empty, empty)
+    return ChunkBatch(texts, np.concatenate([b.source_index for b in batches]),
+                      np.concatenate([b.start for b in batches]), np.concatenate([b.end for b in batches]))
@@ -0,0 +1,811 @@
+import os
+import re
+import json
+import shutil
+import time
+import numpy as np
+
+PARTITION_PREFIX = "complaints_collection__"
+INDEX_VERSION_NAME = "index_version.json"
+
+
+def partition_name(product):
+    """Name of the per-product partition collection (Chroma allows [a-zA-Z0-9._-])."""
+    slug = re.sub(r"[^a-z0-9]+", "_", product.lower()).strip("_")
+    return PARTITION_PREFIX + slug
+
+
+def read_index_version(directory):
+    """Current index version of a vector store directory (None if never written)."""
+    path = os.path.join(directory, INDEX_VERSION_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f).get("version")
+
+
+def bump_index_version(directory):
+    """
+    Record that the indexed content changed. Readers such as the answer
+    cache compare versions to know when cached results are stale.
+    """
+    version = f"{time.time_ns():x}"
+    tmp_path = os.path.join(directory, INDEX_VERSION_NAME + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": version, "updated_at": time.strftime("%Y-%m-%dT%H:%M:%S")}, f)
+    os.replace(tmp_path, os.path.join(directory, INDEX_VERSION_NAME))
+    return version
+
+
+def build_where(filters):
+    """Turn a flat {key: condition} dict into a Chroma `where` clause."""
+    if not filters:
+        return None
+    if len(filters) == 1:
+        return dict(filters)
+    return {"$and": [{key: value} for key, value in filters.items()]}
+
+
+class VectorIndexBackend:
+    """
+    Vector index operations used by VectorStoreChroma and ComplaintRetriever.
+
+    `query` returns Chroma's result layout: a dict with one list per query
+    under "ids", "documents", "metadatas" and "distances" (cosine distance
+    for normalized embeddings; Chroma stores created with the default l2
+    space return squared L2, which for normalized vectors is twice that and
+    ranks the same), plus "embeddings" when asked for.
+    """
+
+    def add(self, ids, embeddings, documents, metadatas=None):
+        self.upsert(ids, embeddings, documents, metadatas)
+
+    def upsert(self, ids, embeddings, documents, metadatas=None):
+        raise NotImplementedError
+
+    def update_metadata(self, ids, metadatas):
+        raise NotImplementedError
+
+    def delete(self, ids):
+        raise NotImplementedError
+
+    def get(self, ids, include_embeddings=False):
+        """Documents and metadata (and embeddings) for `ids`, in the same order (missing ids are skipped)."""
+        raise NotImplementedError
+
+    def query(self, query_embeddings, top_k=5, filters=None, include_embeddings=False, two_stage=False):
+        raise NotImplementedError
+
+    def count(self):
+        raise NotImplementedError
+
+    def ids(self):
+        """Ids of every stored chunk."""
+        raise NotImplementedError
+
+    def save(self):
+        """Make pending writes durable (no-op for stores that persist on write)."""
+
+
+class ChromaBackend(VectorIndexBackend):
+    """
+    Chroma-backed index.
+
+    Every chunk goes into `complaints_collection`. With `partition_key="product"`
+    each chunk is also written to a per-product partition collection, and
+    product-filtered queries are served from that partition.
+    """
+
+    def __init__(self, persist_directory="vector_store/chromadb", embedding_function=None,
+                 partition_key="product", create=True, client=None):
+        from chromadb import PersistentClient
+
+        self.persist_directory = persist_directory
+        self.client = client or PersistentClient(path=persist_directory)
+        self.embedding_function = embedding_function
+        self.partition_key = partition_key
+        self._partitions = {}
+        # Partition names found missing, with the index version file's mtime at the time
+        self._missing_partitions = {}
+
+        if not create:
+            self.collection = self.client.get_collection("complaints_collection")
+        elif "complaints_collection" in [col.name for col in self.client.list_collections()]:
+            self.collection = self.client.get_collection("complaints_collection")
+        else:
+            self.collection = self.client.create_collection(
+                name="complaints_collection",
+                embedding_function=embedding_function,
+                metadata={"hnsw:space": "cosine"}
+            )
+        # Partitions use the main collection's distance (stores created before cosine use l2)
+        self._space = (self.collection.metadata or {}).get("hnsw:space", "l2")
+
+    def partition(self, value):
+        self._missing_partitions.pop(partition_name(value), None)
+        return self.client.get_or_create_collection(
+            name=partition_name(value),
+            embedding_function=self.embedding_function,
+            metadata={"hnsw:space": self._space}
+        )
+
+    def partitions(self):
+        return [self.client.get_collection(col.name) for col in self.client.list_collections()
+                if col.name.startswith(PARTITION_PREFIX)]
+
+    def _write_partitions(self, ids, embeddings, documents, metadatas):
+        if not self.partition_key or metadatas is None or embeddings is None:
+            return
+        groups = {}
+        for i, metadata in enumerate(metadatas):
+            value = (metadata or {}).get(self.partition_key)
+            if value is not None:
+                groups.setdefault(value, []).append(i)
+        for value, rows in groups.items():
+            self.partition(value).upsert(
+                documents=[documents[i] for i in rows],
+                metadatas=[metadatas[i] for i in rows],
+                ids=[ids[i] for i in rows],
+                embeddings=[embeddings[i] for i in rows]
+            )
+
+    def add(self, ids, embeddings, documents, metadatas=None):
+        self.collection.add(documents=documents, metadatas=metadatas, ids=ids, embeddings=embeddings)
+        self._write_partitions(ids, embeddings, documents, metadatas)
+
+    def upsert(self, ids, embeddings, documents, metadatas=None):
+        self.collection.upsert(documents=documents, metadatas=metadatas, ids=ids, embeddings=embeddings)
+        self._write_partitions(ids, embeddings, documents, metadatas)
+
+    def update_metadata(self, ids, metadatas):
+        self.collection.update(ids=ids, metadatas=metadatas)
+        if self.partition_key:
+            # The partition may have changed: move the chunks
+            for partition in self.partitions():
+                partition.delete(ids=ids)
+            stored = self.collection.get(ids=ids, include=["documents", "metadatas", "embeddings"])
+            self._write_partitions(stored["ids"], stored["embeddings"], stored["documents"], stored["metadatas"])
+
+    def delete(self, ids):
+        self.collection.delete(ids=ids)
+        for partition in self.partitions():
+            partition.delete(ids=ids)
+
+    def get(self, ids, include_embeddings=False):
+        include = ["documents", "metadatas"] + (["embeddings"] if include_embeddings else [])
+        stored = self.collection.get(ids=list(ids), include=include)
+        position = {i: n for n, i in enumerate(stored["ids"])}
+        found = [i for i in ids if i in position]
+        result = {"ids": found,
+                  "documents": [stored["documents"][position[i]] for i in found],
+                  "metadatas": [stored["metadatas"][position[i]] for i in found]}
+        if include_embeddings:
+            result["embeddings"] = [list(stored["embeddings"][position[i]]) for i in found]
+        return result
+
+    def _index_stamp(self):
+        path = os.path.join(self.persist_directory, INDEX_VERSION_NAME)
+        return os.path.getmtime(path) if os.path.exists(path) else None
+
+    def _partition_for_query(self, product):
+        name = partition_name(product)
+        partition = self._partitions.get(name)
+        if partition is not None:
+            return partition
+        # A miss is only trusted until the index changes: products indexed later get their partition
+        stamp = self._index_stamp()
+        if name in self._missing_partitions and self._missing_partitions[name] == stamp:
+            return None
+        try:
+            partition = self.client.get_collection(name)
+        except Exception:
+            # Index built without partitions: fall back to a filtered search
+            self._missing_partitions[name] = stamp
+            return None
+        self._missing_partitions.pop(name, None)
+        self._partitions[name] = partition
+        return partition
+
+    def _route(self, filters):
+        """
+        Pick the collection and `where` clause for a search.
+
+        A product filter is served by that product's partition collection, so
+        the search only touches the partition's vectors; any remaining filters
+        (e.g. date_received ranges) are applied inside the partition.
+        """
+        filters = dict(filters or {})
+        product = filters.get(self.partition_key) if self.partition_key else None
+        if isinstance(product, str):
+            partition = self._partition_for_query(product)
+            if partition is not None:
+                filters.pop(self.partition_key)
+                return partition, build_where(filters)
+        return self.collection, build_where(filters)
+
+    def query(self, query_embeddings, top_k=5, filters=None, include_embeddings=False, two_stage=False):
+        if two_stage:
+            raise ValueError("Two-stage search needs a NumpyIndex built with coarse codes.")
+        collection, where = self._route(filters)
+        keys = ["documents", "metadatas", "distances"] + (["embeddings"] if include_embeddings else [])
+        results = collection.query(
+            query_embeddings=[list(map(float, q)) for q in query_embeddings],
+            n_results=top_k,
+            where=where,
+            include=keys
+        )
+        return {key: results[key] for key in ["ids"] + keys}
+
+    def count(self):
+        return self.collection.count()
+
+    def ids(self):
+        return self.collection.get(include=[])["ids"]
+
+
+def write_string_column(path, strings):
+    """Write strings as one UTF-8 blob (`path`) plus an int64 offsets array (`path`.offsets.npy)."""
+    offsets = np.zeros(len(strings) + 1, dtype=np.int64)
+    with open(path, "wb") as f:
+        for i, s in enumerate(strings):
+            data = (s or "").encode("utf-8")
+            f.write(data)
+            offsets[i + 1] = offsets[i] + len(data)
+    np.save(path + ".offsets.npy", offsets)
+
+
+class StringColumn:
+    """Read-only, memory-mapped view of a column written by write_string_column."""
+
+    def __init__(self, path):
+        self._offsets = np.load(path + ".offsets.npy", mmap_mode="r")
+        size = int(self._offsets[-1]) if len(self._offsets) else 0
+        self._data = np.memmap(path, dtype=np.uint8, mode="r") if size else np.zeros(0, dtype=np.uint8)
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        start, end = int(self._offsets[i]), int(self._offsets[i + 1])
+        return bytes(self._data[start:end]).decode("utf-8")
+
+
+def _matches(value, condition):
+    """Evaluate one Chroma-style metadata condition against a value."""
+    if not isinstance(condition, dict):
+        return value == condition
+    for op, target in condition.items():
+        if op == "$eq" and not value == target:
+            return False
+        if op == "$ne" and not value != target:
+            return False
+        if op == "$in" and value not in target:
+            return False
+        if op == "$nin" and value in target:
+            return False
+        if op in ("$gt", "$gte", "$lt", "$lte"):
+            if value is None:
+                return False
+            if op == "$gt" and not value > target:
+                return False
+            if op == "$gte" and not value >= target:
+                return False
+            if op == "$lt" and not value < target:
+                return False
+            if op == "$lte" and not value <= target:
+                return False
+    return True
+
+
+def metadata_matches(metadata, filters):
+    """True if a metadata dict satisfies every {key: condition} filter."""
+    metadata = metadata or {}
+    return all(_matches(metadata.get(key), condition) for key, condition in (filters or {}).items())
+
+
+class NumpyIndex(VectorIndexBackend):
+    """
+    In-process vector index over a NumPy matrix of normalized embeddings.
+
+    Vectors are stored as float32, float16 or int8 (symmetric per-row scale)
+    and, once saved, memory-mapped from disk. Search is exact brute force by
+    default; with `n_lists > 0` an IVF coarse quantizer (spherical k-means)
+    is trained on save and only the `n_probe` nearest lists are scanned.
+    Rows of each product are kept as a pre-filtered row set, so product
+    filters only score that product's vectors.
+
+    With `coarse` set, a reduced copy of every vector is stored on save:
+    "binary" sign codes (1 bit per dimension, Hamming distance) or "pca"
+    projections onto the top `coarse_dim` principal directions. Two-stage
+    search scans only those codes, then re-scores the best
+    `rerank_factor * top_k` rows with the full vectors.
+
+    Writes are kept in memory until `save()`, which compacts deleted rows,
+    re-quantizes, retrains the IVF lists and coarse codes, and re-opens the
+    files memory-mapped.
+    """
+
+    QUANTIZATIONS = ("float32", "float16", "int8")
+    COARSE = ("binary", "pca")
+    DATA_FILES = ("vectors.npy", "scales.npy", "ids.json", "metadatas.json", "ivf_centroids.npy",
+                  "ivf_order.npy", "ivf_offsets.npy", "coarse_projection.npy", "coarse_codes.npy")
+
+    def __init__(self, directory="vector_store/numpy_index", quantization="float32", n_lists=0,
+                 n_probe=8, partition_key="product", block_rows=65536, coarse=None, coarse_dim=64,
+                 rerank_factor=10):
+        if quantization not in self.QUANTIZATIONS:
+            raise ValueError(f"quantization must be one of {self.QUANTIZATIONS}")
+        if coarse not in (None,) + self.COARSE:
+            raise ValueError(f"coarse must be None or one of {self.COARSE}")
+        self.directory = directory
+        self.quantization = quantization
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.partition_key = partition_key
+        self.block_rows = block_rows
+        self.coarse = coarse
+        self.coarse_dim = coarse_dim
+        self.rerank_factor = rerank_factor
+
+        self.dim = None
+        self._ids = []
+        self._documents = []
+        self._metadatas = []
+        self._vectors = None
+        self._scales = None
+        self._alive = np.zeros(0, dtype=bool)
+        self._row_of = {}
+        self._ivf = None
+        self._coarse = None
+        self._partitions = {}
+        self._pending = []
+        # Subdirectory of `directory` holding the saved arrays ("" = files directly in it)
+        self._data_dir = ""
+
+        if os.path.exists(os.path.join(directory, "meta.json")):
+            self._load()
+
+    # ----- persistence -----
+
+    def _path(self, name):
+        return os.path.join(self.directory, self._data_dir, name)
+
+    def _load(self):
+        with open(os.path.join(self.directory, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self._data_dir = meta.get("data_dir", "")
+        self.dim = meta["dim"]
+        self.quantization = meta["quantization"]
+        self.n_lists = meta.get("n_lists", 0)
+        self.coarse = meta.get("coarse")
+        self.coarse_dim = meta.get("coarse_dim", self.coarse_dim)
+        self._vectors = np.load(self._path("vectors.npy"), mmap_mode="r")
+        self._scales = np.load(self._path("scales.npy")) if self.quantization == "int8" else None
+        with open(self._path("ids.json"), "r", encoding="utf-8") as f:
+            self._ids = json.load(f)
+        with open(self._path("metadatas.json"), "r", encoding="utf-8") as f:
+            self._metadatas = json.load(f)
+        self._documents = StringColumn(self._path("documents.bin"))
+        self._alive = np.ones(len(self._ids), dtype=bool)
+        self._row_of = {chunk_id: row for row, chunk_id in enumerate(self._ids)}
+        self._ivf = None
+        if self.n_lists and os.path.exists(self._path("ivf_centroids.npy")):
+            self._ivf = (np.load(self._path("ivf_centroids.npy")),
+                         np.load(self._path("ivf_order.npy"), mmap_mode="r"),
+                         np.load(self._path("ivf_offsets.npy")))
+        self._coarse = None
+        if self.coarse == "binary":
+            self._coarse = (None, np.load(self._path("coarse_codes.npy"), mmap_mode="r"))
+        elif self.coarse == "pca":
+            self._coarse = (np.load(self._path("coarse_projection.npy")),
+                            np.load(self._path("coarse_codes.npy"), mmap_mode="r"))
+        self._build_partitions()
+
+    def save(self):
+        """
+        Compact, quantize, (re)train IVF lists and write everything to `directory`.
+
+        Arrays go to a new data-<version>/ subdirectory, and meta.json is
+        replaced last to point at it, so a crash never leaves a mix of old and
+        new files and processes that still map the old files keep working.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        self._flush_pending()
+        rows = np.flatnonzero(self._alive)
+        vectors = self._dequantize(rows) if len(rows) else np.zeros((0, self.dim or 0), dtype=np.float32)
+        ids = [self._ids[r] for r in rows]
+        documents = [self._documents[r] for r in rows]
+        metadatas = [self._metadatas[r] for r in rows]
+
+        data_dir = f"data-{time.time_ns():x}"
+        tmp_dir = os.path.join(self.directory, data_dir + ".tmp")
+        os.makedirs(tmp_dir)
+        path = lambda name: os.path.join(tmp_dir, name)
+
+        quantized, scales = self._quantize(vectors)
+        np.save(path("vectors.npy"), quantized)
+        if scales is not None:
+            np.save(path("scales.npy"), scales)
+        with open(path("ids.json"), "w", encoding="utf-8") as f:
+            json.dump(ids, f)
+        with open(path("metadatas.json"), "w", encoding="utf-8") as f:
+            json.dump(metadatas, f)
+        write_string_column(path("documents.bin"), documents)
+
+        if self.n_lists and len(rows) >= self.n_lists:
+            centroids, order, offsets = train_ivf(vectors, self.n_lists)
+            np.save(path("ivf_centroids.npy"), centroids)
+            np.save(path("ivf_order.npy"), order)
+            np.save(path("ivf_offsets.npy"), offsets)
+
+        if self.coarse == "binary":
+            np.save(path("coarse_codes.npy"), sign_codes(vectors))
+        elif self.coarse == "pca":
+            projection = train_pca(vectors, self.coarse_dim)
+            np.save(path("coarse_projection.npy"), projection)
+            np.save(path("coarse_codes.npy"), (vectors @ projection).astype(np.float32))
+        os.rename(tmp_dir, os.path.join(self.directory, data_dir))
+
+        meta = {"dim": self.dim, "count": len(ids), "quantization": self.quantization,
+                "n_lists": self.n_lists, "coarse": self.coarse, "coarse_dim": self.coarse_dim,
+                "data_dir": data_dir, "saved_at": time.time()}
+        with open(os.path.join(self.directory, "meta.json.tmp"), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(os.path.join(self.directory, "meta.json.tmp"), os.path.join(self.directory, "meta.json"))
+
+        # Drop older versions (and files of the flat layout used before data directories)
+        for name in os.listdir(self.directory):
+            if name.startswith("data-") and name != data_dir:
+                shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+            elif name in self.DATA_FILES or name.startswith("documents.bin"):
+                os.remove(os.path.join(self.directory, name))
+        self._load()
+
+    # ----- quantization -----
+
+    def _quantize(self, vectors):
+        if self.quantization == "float16":
+            return vectors.astype(np.float16), None
+        if self.quantization == "int8":
+            scales = np.abs(vectors).max(axis=1) / 127.0 if len(vectors) else np.zeros(0, dtype=np.float32)
+            scales = np.where(scales > 0, scales, 1.0).astype(np.float32)
+            return np.round(vectors / scales[:, None]).astype(np.int8), scales
+        return vectors.astype(np.float32), None
+
+    def _dequantize(self, rows):
+        block = np.asarray(self._vectors[rows], dtype=np.float32)
+        if self._scales is not None:
+            block *= self._scales[rows][:, None]
+        return block
+
+    # ----- writes -----
+
+    def _materialize(self):
+        """Switch from the read-only memory map to in-memory float32 arrays before writing."""
+        if self._vectors is not None and (isinstance(self._vectors, np.memmap) or self._scales is not None
+                                          or self._vectors.dtype != np.float32):
+            self._vectors = self._dequantize(np.arange(len(self._vectors)))
+            self._scales = None
+        if isinstance(self._documents, StringColumn):
+            self._documents = [self._documents[i] for i in range(len(self._documents))]
+        self._ivf = None
+        self._coarse = None
+
+    def upsert(self, ids, embeddings, documents, metadatas=None):
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        metadatas = metadatas or [{} for _ in ids]
+        # A repeated id keeps its last copy; earlier copies would be live rows that no id maps to
+        keep = list({chunk_id: i for i, chunk_id in enumerate(ids)}.values())
+        if len(keep) < len(ids):
+            ids, documents, metadatas = [ids[i] for i in keep], [documents[i] for i in keep], [metadatas[i] for i in keep]
+            embeddings = embeddings[keep]
+        self._materialize()
+        if self.dim is None:
+            self.dim = int(embeddings.shape[1])
+            self._vectors = np.zeros((0, self.dim), dtype=np.float32)
+        self.delete([i for i in ids if i in self._row_of])
+        start = len(self._ids)
+        # Appended blocks are concatenated lazily, on the next read
+        self._pending.append(embeddings)
+        self._ids.extend(ids)
+        self._documents.extend(documents)
+        self._metadatas.extend(dict(m or {}) for m in metadatas)
+        for offset, chunk_id in enumerate(ids):
+            self._row_of[chunk_id] = start + offset
+        self._partitions = None
+
+    def update_metadata(self, ids, metadatas):
+        for chunk_id, metadata in zip(ids, metadatas):
+            row = self._row_of.get(chunk_id)
+            if row is not None:
+                self._metadatas[row] = dict(metadata)
+        self._partitions = None
+
+    def delete(self, ids):
+        rows = [self._row_of.pop(chunk_id) for chunk_id in ids if chunk_id in self._row_of]
+        if rows:
+            self._flush_pending()
+            self._alive[rows] = False
+            self._partitions = None
+
+    def _flush_pending(self):
+        """Concatenate appended blocks and rebuild partition row sets if needed."""
+        if self._pending:
+            added = sum(len(block) for block in self._pending)
+            self._vectors = np.concatenate([self._vectors] + self._pending)
+            self._alive = np.concatenate([self._alive, np.ones(added, dtype=bool)])
+            self._pending = []
+        if self._partitions is None:
+            self._build_partitions()
+
+    def _build_partitions(self):
+        groups = {}
+        if self.partition_key:
+            for row in np.flatnonzero(self._alive):
+                value = self._metadatas[row].get(self.partition_key)
+                if value is not None:
+                    groups.setdefault(value, []).append(row)
+        self._partitions = {value: np.asarray(rows, dtype=np.int64) for value, rows in groups.items()}
+
+    # ----- reads -----
+
+    def count(self):
+        self._flush_pending()
+        return int(self._alive.sum())
+
+    def ids(self):
+        return list(self._row_of)
+
+    def get(self, ids, include_embeddings=False):
+        rows = [self._row_of[i] for i in ids if i in self._row_of]
+        result = {"ids": [self._ids[r] for r in rows],
+                  "documents": [self._documents[r] for r in rows],
+                  "metadatas": [self._metadatas[r] for r in rows]}
+        if include_embeddings:
+            result["embeddings"] = self.vectors(rows).tolist() if rows else []
+        return result
+
+    def vectors(self, rows):
+        """Float32 vectors for row numbers (dequantized if needed)."""
+        self._flush_pending()
+        return self._dequantize(np.asarray(rows, dtype=np.int64))
+
+    def _candidate_rows(self, query, filters, use_ivf):
+        """Rows to score for one query: partition rows, IVF lists, or None for all rows."""
+        filters = dict(filters or {})
+        rows = None
+        product = filters.pop(self.partition_key, None) if self.partition_key else None
+        if isinstance(product, str):
+            rows = self._partitions.get(product, np.zeros(0, dtype=np.int64))
+        elif product is not None:
+            filters[self.partition_key] = product
+
+        if use_ivf and self._ivf is not None:
+            centroids, order, offsets = self._ivf
+            probe = np.argsort(-(centroids @ query))[:self.n_probe]
+            lists = np.concatenate([np.asarray(order[offsets[c]:offsets[c + 1]]) for c in probe])
+            rows = lists if rows is None else np.intersect1d(rows, lists, assume_unique=True)
+
+        if filters:
+            base = np.arange(len(self._ids)) if rows is None else rows
+            rows = np.asarray([r for r in base if metadata_matches(self._metadatas[r], filters)], dtype=np.int64)
+        if not self._alive.all():
+            rows = np.flatnonzero(self._alive) if rows is None else rows[self._alive[rows]]
+        return rows
+
+    def _score(self, query, rows):
+        """
+        Inner-product scores of `query` against `rows` (all rows if None), in
+        blocks. `query` is one vector, or a (dim, m) matrix of m queries
+        scored in the same pass (scores are then (rows, m)).
+        """
+        if rows is None:
+            n = len(self._ids)
+            scores = np.empty((n,) + query.shape[1:], dtype=np.float32)
+            for start in range(0, n, self.block_rows):
+                block = np.asarray(self._vectors[start:start + self.block_rows], dtype=np.float32)
+                scores[start:start + len(block)] = block @ query
+            scales = self._scales
+        else:
+            scores = np.asarray(self._vectors[rows], dtype=np.float32) @ query
+            scales = self._scales[rows] if self._scales is not None else None
+        if scales is not None:
+            scores *= scales if scores.ndim == 1 else scales[:, None]
+        return scores
+
+    @staticmethod
+    def _top_k(rows, scores, top_k):
+        k = min(top_k, len(scores))
+        if k == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return (top if rows is None else rows[top]), scores[top]
+
+    def _coarse_scores(self, query, rows):
+        """Stage-one scores from the stored codes (higher is better), in blocks."""
+        projection, codes = self._coarse
+        if projection is None:
+            query_code = sign_codes(query[None, :])[0]
+            score = lambda block: -hamming_distances(block, query_code)
+        else:
+            projected = (query @ projection).astype(np.float32)
+            score = lambda block: block @ projected
+        if rows is not None:
+            return score(codes[rows])
+        n = len(self._ids)
+        scores = np.empty(n, dtype=np.float32)
+        for start in range(0, n, self.block_rows):
+            block = codes[start:start + self.block_rows]
+            scores[start:start + len(block)] = score(block)
+        return scores
+
+    def search(self, query_embeddings, top_k=5, filters=None, use_ivf=True, two_stage=False):
+        """
+        Top-k row numbers and scores per query.
+
+        With two_stage=True (and coarse codes saved) the codes pick
+        `rerank_factor * top_k` candidates and only those are scored with the
+        full vectors; otherwise the search is exact (or IVF).
+
+        Returns:
+            List[Tuple[np.ndarray, np.ndarray]]: (rows, scores) per query, best first.
+        """
+        self._flush_pending()
+        two_stage = two_stage and self._coarse is not None
+        queries = np.asarray(query_embeddings, dtype=np.float32).reshape(-1, self.dim)
+        if len(queries) > 1 and not two_stage and not (use_ivf and self._ivf is not None):
+            # Every query scores the same rows: read and dequantize each block once for all of them
+            rows = self._candidate_rows(queries[0], filters, use_ivf=False)
+            scores = self._score(np.ascontiguousarray(queries.T), rows)
+            return [self._top_k(rows, scores[:, j], top_k) for j in range(len(queries))]
+        results = []
+        for query in queries:
+            rows = self._candidate_rows(query, filters, use_ivf and not two_stage)
+            if two_stage:
+                coarse = self._coarse_scores(query, rows)
+                if rows is None:
+                    rows = np.arange(len(self._ids))
+                n_candidates = min(len(rows), max(top_k * self.rerank_factor, top_k))
+                if n_candidates < len(rows):
+                    rows = rows[np.argpartition(-coarse, n_candidates - 1)[:n_candidates]]
+            results.append(self._top_k(rows, self._score(query, rows), top_k))
+        return results
+
+    def query(self, query_embeddings, top_k=5, filters=None, include_embeddings=False, two_stage=False):
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        if include_embeddings:
+            results["embeddings"] = []
+        for rows, scores in self.search(query_embeddings, top_k=top_k, filters=filters, two_stage=two_stage):
+            results["ids"].append([self._ids[r] for r in rows])
+            results["documents"].append([self._documents[r] for r in rows])
+            results["metadatas"].append([self._metadatas[r] for r in rows])
+            results["distances"].append((1.0 - scores).tolist())
+            if include_embeddings:
+                results["embeddings"].append(self.vectors(rows).tolist())
+        return results
+
+
+def train_ivf(vectors, n_lists, n_iter=10, sample_size=100_000, seed=42):
+    """
+    Spherical k-means coarse quantizer.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: centroids (n_lists x dim),
+        row numbers ordered by list, and list offsets into that order.
+    """
+    rng = np.random.default_rng(seed)
+    sample = vectors[rng.choice(len(vectors), size=min(sample_size, len(vectors)), replace=False)]
+    centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+    for _ in range(n_iter):
+        assign = np.argmax(sample @ centroids.T, axis=1)
+        for c in range(n_lists):
+            members = sample[assign == c]
+            if len(members):
+                centroids[c] = members.sum(axis=0)
+        centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+
+    assign = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), 65536):
+        assign[start:start + 65536] = np.argmax(vectors[start:start + 65536] @ centroids.T, axis=1)
+    order = np.argsort(assign, kind="stable")
+    offsets = np.zeros(n_lists + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(np.bincount(assign, minlength=n_lists))
+    return centroids.astype(np.float32), order, offsets
+
+
+def sign_codes(vectors):
+    """Binary codes: one bit per dimension (1 where the component is positive), packed into bytes."""
+    return np.packbits(np.asarray(vectors) > 0, axis=1)
+
+
+# Bits set in every uint16 value, for Hamming distances without np.bitwise_count (NumPy < 2)
+_POPCOUNT16 = np.unpackbits(np.arange(1 << 16, dtype=np.uint16).view(np.uint8)).reshape(-1, 16).sum(axis=1).astype(np.uint8)
+
+
+def hamming_distances(codes, query_code):
+    """Hamming distance between each row of packed `codes` and one packed query code."""
+    xor = np.bitwise_xor(np.asarray(codes), query_code)
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(xor).sum(axis=1, dtype=np.int32).astype(np.float32)
+    if xor.shape[1] % 2:
+        xor = np.pad(xor, ((0, 0), (0, 1)))
+    return _POPCOUNT16[np.ascontiguousarray(xor).view(np.uint16)].sum(axis=1, dtype=np.int32).astype(np.float32)
+
+
+def train_pca(vectors, dim, sample_size=100_000, seed=42):
+    """
+    Projection (vectors.dim x dim) onto the top principal directions of the
+    vectors' second-moment matrix (not mean-centered, so inner products are
+    approximately preserved).
+    """
+    rng = np.random.default_rng(seed)
+    sample = vectors[rng.choice(len(vectors), size=min(sample_size, len(vectors)), replace=False)]
+    _, _, components = np.linalg.svd(np.asarray(sample, dtype=np.float32), full_matrices=False)
+    return components[:dim].T.astype(np.float32)
+
+
+def recall_at_k(index, queries, k=5, reference=None, filters=None, two_stage=False):
+    """
+    Recall@k of `index` against exact search.
+
+    The reference is `reference` (e.g. a float32 NumpyIndex over the same
+    rows) or, by default, the same index searched without IVF or two-stage
+    search. Rows are compared by chunk id.
+    """
+    reference = reference or index
+    approx = index.search(queries, top_k=k, filters=filters, two_stage=two_stage)
+    exact = reference.search(queries, top_k=k, filters=filters, use_ivf=False)
+    hits = total = 0
+    for (rows_a, _), (rows_e, _) in zip(approx, exact):
+        truth = {reference._ids[r] for r in rows_e}
+        hits += len(truth.intersection(index._ids[r] for r in rows_a))
+        total += len(truth)
+    return hits / total if total else 1.0
+
+
+def export_chroma_to_numpy(chroma_backend, index, batch_size=5000):
+    """Copy every chunk of a Chroma collection into a NumpyIndex and save it."""
+    collection = chroma_backend.collection
+    total = collection.count()
+    for offset in range(0, total, batch_size):
+        batch = collection.get(offset=offset, limit=batch_size,
+                               include=["documents", "metadatas", "embeddings"])
+        index.upsert(batch["ids"], np.asarray(batch["embeddings"], dtype=np.float32),
+                     batch["documents"], batch["metadatas"])
+        print(f"Copied {min(offset + batch_size, total)} of {total} chunks...")
+    index.save()
+    return index
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build a NumPy vector index from the Chroma store.")
+    parser.add_argument("--chroma-dir", default="vector_store/chromadb")
+    parser.add_argument("--output-dir", default="vector_store/numpy_index")
+    parser.add_argument("--quantization", choices=NumpyIndex.QUANTIZATIONS, default="float32")
+    parser.add_argument("--n-lists", type=int, default=0, help="IVF lists (0 = exact search)")
+    parser.add_argument("--n-probe", type=int, default=8)
+    parser.add_argument("--coarse", choices=NumpyIndex.COARSE, default=None,
+                        help="Store coarse codes for two-stage search")
+    parser.add_argument("--coarse-dim", type=int, default=64)
+    parser.add_argument("--recall-queries", type=int, default=200)
+    args = parser.parse_args()
+
+    source = ChromaBackend(persist_directory=args.chroma_dir, create=False)
+    index = NumpyIndex(args.output_dir, quantization=args.quantization, n_lists=args.n_lists, n_probe=args.n_probe,
+                       coarse=args.coarse, coarse_dim=args.coarse_dim)
+    export_chroma_to_numpy(source, index)
+
+    # Use stored vectors as queries and an exact float32 copy as ground truth
+    rows = np.random.default_rng(0).choice(index.count(), size=min(args.recall_queries, index.count()), replace=False)
+    queries = index.vectors(rows)
+    reference = NumpyIndex(args.output_dir + "_exact") if args.quantization != "float32" else None
+    if reference is not None:
+        export_chroma_to_numpy(source, reference)
+    print(f"Vectors: {index.count()} x {index.dim} ({index.quantization}), "
+          f"{os.path.getsize(os.path.join(args.output_dir, 'vectors.npy')) / 1e6:.1f} MB")
+    print(f"recall@5 vs exact search: {recall_at_k(index, queries, k=5, reference=reference):.4f}")
+    if args.coarse:
+        print(f"two-stage recall@5: {recall_at_k(index, queries, k=5, reference=reference, two_stage=True):.4f}")
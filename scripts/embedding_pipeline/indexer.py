@@ -0,0 +1,220 @@
+import os
+import json
+import hashlib
+import time
+
+from scripts.data_processing.preprocess import iter_processed_data
+from scripts.data_processing.metadata import METADATA_COLUMNS, frame_metadata
+from scripts.embedding_pipeline.fast_chunking import chunk_texts
+from scripts.embedding_pipeline.vector_store import VectorStoreChroma, embed_texts, batch_add_documents
+from scripts.embedding_pipeline.index_backends import bump_index_version
+
+MANIFEST_NAME = "index_manifest.json"
+
+
+def content_hash(text):
+    """Short, stable hash of a text."""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+def make_chunk_id(complaint_id, chunk_text):
+    """
+    Stable chunk id derived from the complaint ID and the chunk content.
+
+    Re-indexing the same complaint yields the same ids, so unchanged chunks
+    are never embedded twice and ids never collide across runs.
+    """
+    return f"{complaint_id}:{content_hash(chunk_text)}"
+
+
+def unique_chunks(complaint_id, chunks):
+    """
+    (chunk_id, chunk_index, text) for each distinct chunk of a complaint, in
+    order; a repeated chunk keeps the index of its first occurrence.
+    """
+    unique = {}
+    for chunk_index, chunk in enumerate(chunks):
+        unique.setdefault(make_chunk_id(complaint_id, chunk["text"]), (chunk_index, chunk["text"]))
+    return [(chunk_id, chunk_index, text) for chunk_id, (chunk_index, text) in unique.items()]
+
+
+def manifest_entry(narrative_hash, metadata_hash, unique):
+    """Manifest entry of a complaint indexed as `unique` (see unique_chunks)."""
+    return {"hash": narrative_hash, "meta": metadata_hash,
+            "chunks": [chunk_id for chunk_id, _, _ in unique],
+            "chunk_indexes": [chunk_index for _, chunk_index, _ in unique]}
+
+
+def stored_chunk_indexes(store, chunk_ids):
+    """chunk_index metadata of indexed chunks, for manifest entries written before it was recorded."""
+    stored = store.backend.get(chunk_ids)
+    found = {chunk_id: (metadata or {}).get("chunk_index")
+             for chunk_id, metadata in zip(stored["ids"], stored["metadatas"])}
+    return [found[chunk_id] if found.get(chunk_id) is not None else n for n, chunk_id in enumerate(chunk_ids)]
+
+
+def load_manifest(manifest_path):
+    """
+    Load the index manifest.
+
+    Returns:
+        dict: {"collection": str,
+               "complaints": {complaint_id: {"hash": str, "meta": str, "chunks": [ids],
+                                             "chunk_indexes": [int]}}}
+    """
+    if not os.path.exists(manifest_path):
+        return {"collection": "complaints_collection", "complaints": {}}
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(manifest_path, manifest):
+    """Atomically write the manifest (write to a temp file, then rename)."""
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, manifest_path)
+
+
+def sync_index(
+    data_path,
+    store,
+    model,
+    manifest_path=None,
+    text_col="Cleaned Narrative",
+    id_col="Complaint ID",
+    chunk_size=500,
+    chunk_overlap=100,
+    read_chunksize=50_000,
+    embed_batch_size=100,
+    cache=None,
+):
+    """
+    Incrementally bring `complaints_collection` in line with a processed dataset.
+
+    Only complaints that are new or whose narrative changed are chunked and
+    embedded; within those, only chunks whose id is not already indexed are
+    upserted. Complaints whose metadata (product, issue, ...) changed only get
+    a metadata update. Chunks that no longer exist for a complaint, and all
+    chunks of complaints that disappeared from the dataset, are deleted. The
+    manifest is saved after every read chunk, so an interrupted run resumes
+    cheaply.
+
+    Args:
+        data_path (str): Processed CSV or Parquet file.
+        store (VectorStoreChroma): Target vector store.
+        model (SentenceTransformer): Embedding model.
+        manifest_path (str, optional): Defaults to <persist_directory>/index_manifest.json.
+        cache (EmbeddingCache, optional): On-disk embedding cache.
+
+    Returns:
+        dict: Counters describing what changed.
+    """
+    manifest_path = manifest_path or os.path.join(store.persist_directory, MANIFEST_NAME)
+    manifest = load_manifest(manifest_path)
+    known = manifest["complaints"]
+    seen = set()
+    stats = {"complaints_unchanged": 0, "complaints_changed": 0, "complaints_metadata_updated": 0,
+             "complaints_removed": 0, "chunks_upserted": 0, "chunks_deleted": 0}
+    start = time.perf_counter()
+    columns = [id_col, text_col] + list(METADATA_COLUMNS)
+
+    for df in iter_processed_data(data_path, columns=columns, chunksize=read_chunksize):
+        new_ids, new_texts, new_metadatas = [], [], []
+        kept_ids, kept_metadatas = [], []
+        stale_ids = []
+        updates = {}
+
+        for complaint_id, text, metadata in zip(df[id_col], df[text_col], frame_metadata(df)):
+            if not isinstance(text, str) or text.strip() == "":
+                continue
+            complaint_id = str(complaint_id)
+            seen.add(complaint_id)
+            metadata["complaint_id"] = complaint_id
+
+            narrative_hash = content_hash(text)
+            metadata_hash = content_hash(json.dumps(metadata, sort_keys=True))
+            entry = known.get(complaint_id)
+            if entry is not None and entry["hash"] == narrative_hash:
+                if entry.get("meta") == metadata_hash:
+                    stats["complaints_unchanged"] += 1
+                    continue
+                # Same text, new metadata: no re-embedding needed
+                stats["complaints_metadata_updated"] += 1
+                # Reuse the indexes written at indexing time (chunks repeated in a complaint are stored once)
+                chunk_indexes = entry.get("chunk_indexes") or stored_chunk_indexes(store, entry["chunks"])
+                for chunk_id, chunk_index in zip(entry["chunks"], chunk_indexes):
+                    kept_ids.append(chunk_id)
+                    kept_metadatas.append({**metadata, "chunk_index": chunk_index})
+                updates[complaint_id] = {**entry, "meta": metadata_hash, "chunk_indexes": chunk_indexes}
+                continue
+            stats["complaints_changed"] += 1
+
+            chunks = chunk_texts([text], chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+            unique = unique_chunks(complaint_id, chunks)
+            old_ids = set(entry["chunks"]) if entry is not None else set()
+            for chunk_id, chunk_index, chunk_text in unique:
+                if chunk_id in old_ids:
+                    kept_ids.append(chunk_id)
+                    kept_metadatas.append({**metadata, "chunk_index": chunk_index})
+                    continue
+                new_ids.append(chunk_id)
+                new_texts.append(chunk_text)
+                new_metadatas.append({**metadata, "chunk_index": chunk_index})
+            stale_ids.extend(old_ids.difference(chunk_id for chunk_id, _, _ in unique))
+            updates[complaint_id] = manifest_entry(narrative_hash, metadata_hash, unique)
+
+        if new_texts:
+            print(f"Embedding {len(new_texts)} new or changed chunks...")
+            embeddings = embed_texts(model, new_texts, batch_size=embed_batch_size, cache=cache)
+            batch_add_documents(store, new_texts, new_metadatas, new_ids, embeddings, upsert=True)
+            stats["chunks_upserted"] += len(new_ids)
+        if kept_ids:
+            store.update_metadata(kept_ids, kept_metadatas)
+        if stale_ids:
+            store.delete_documents(stale_ids)
+            stats["chunks_deleted"] += len(stale_ids)
+
+        known.update(updates)
+        # Writes must be durable before the manifest says they happened
+        store.backend.save()
+        save_manifest(manifest_path, manifest)
+
+    removed = [cid for cid in known if cid not in seen]
+    if removed:
+        removed_ids = [chunk_id for cid in removed for chunk_id in known[cid]["chunks"]]
+        print(f"Deleting {len(removed_ids)} chunks from {len(removed)} removed complaints...")
+        store.delete_documents(removed_ids)
+        for cid in removed:
+            del known[cid]
+        stats["complaints_removed"] = len(removed)
+        stats["chunks_deleted"] += len(removed_ids)
+    store.backend.save()
+    save_manifest(manifest_path, manifest)
+    if stats["complaints_changed"] or stats["complaints_metadata_updated"] or stats["complaints_removed"]:
+        bump_index_version(store.persist_directory)
+
+    stats["seconds"] = round(time.perf_counter() - start, 2)
+    return stats
+
+
+if __name__ == "__main__":
+    import sys
+    from scripts.embedding_pipeline.embedding import load_embedding_model
+    from scripts.embedding_pipeline.embedding_cache import EmbeddingCache, cache_model_name
+    from scripts.embedding_pipeline.bm25_index import build_bm25_from_dataset
+
+    data_path = sys.argv[1] if len(sys.argv) > 1 else "Data/processed/filtered_complaints.csv"
+    persist_directory = sys.argv[2] if len(sys.argv) > 2 else "vector_store/chromadb"
+
+    model = load_embedding_model(model_name="sentence-transformers/all-MiniLM-L6-v2")
+    store = VectorStoreChroma(persist_directory=persist_directory, embedding_function=None)
+    cache = EmbeddingCache(model_name=cache_model_name(model, "sentence-transformers/all-MiniLM-L6-v2"))
+
+    stats = sync_index(data_path, store, model, cache=cache)
+    print("Incremental indexing complete:")
+    for key, value in stats.items():
+        print(f"  {key}: {value}")
+
+    # The lexical index is cheap to rebuild (no embeddings), so it is rebuilt in full, next to the store
+    build_bm25_from_dataset(data_path, os.path.join(os.path.dirname(os.path.abspath(persist_directory)), "bm25"))
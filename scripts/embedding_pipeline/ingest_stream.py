@@ -0,0 +1,302 @@
+import os
+import json
+import queue
+import threading
+import time
+
+from scripts.data_processing.preprocess import iter_processed_data
+from scripts.data_processing.metadata import METADATA_COLUMNS, frame_metadata
+from scripts.embedding_pipeline.fast_chunking import chunk_texts
+from scripts.embedding_pipeline.embedding_cache import encode_with_cache
+from scripts.embedding_pipeline.indexer import (MANIFEST_NAME, content_hash, load_manifest, make_chunk_id,
+                                                manifest_entry, save_manifest, unique_chunks)
+from scripts.embedding_pipeline.index_backends import bump_index_version
+from scripts.embedding_pipeline.bm25_index import BM25IndexBuilder
+
+CHECKPOINT_NAME = "ingest_checkpoint.json"
+
+# Marks the end of a stream between stages
+_DONE = object()
+
+
+class StageStats:
+    """Item count and busy time of one pipeline stage."""
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.batches = 0
+        self.busy_seconds = 0.0
+
+    def add(self, items, seconds):
+        self.items += items
+        self.batches += 1
+        self.busy_seconds += seconds
+
+    def as_dict(self):
+        rate = self.items / self.busy_seconds if self.busy_seconds > 0 else 0.0
+        return {"items": self.items, "batches": self.batches,
+                "busy_seconds": round(self.busy_seconds, 3), "items_per_sec": round(rate, 1)}
+
+
+def load_checkpoint(checkpoint_path):
+    if not os.path.exists(checkpoint_path):
+        return {"rows_done": 0}
+    with open(checkpoint_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_checkpoint(checkpoint_path, checkpoint):
+    tmp_path = checkpoint_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, checkpoint_path)
+
+
+def _put(q, item, stop):
+    """Blocking put that gives up once the pipeline is stopping."""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(q, stop):
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    return _DONE
+
+
+def ingest_streaming(
+    data_path,
+    store,
+    model,
+    checkpoint_path=None,
+    text_col="Cleaned Narrative",
+    id_col="Complaint ID",
+    chunk_size=500,
+    chunk_overlap=100,
+    read_chunksize=10_000,
+    embed_batch_size=256,
+    upsert_batch_size=500,
+    queue_size=4,
+    cache=None,
+    bm25_dir=None,
+    manifest_path=None,
+    checkpoint_rows=None,
+):
+    """
+    Chunk, embed and upsert a processed dataset as three overlapping stages.
+
+    A chunking thread and an embedding thread feed the upsert loop through
+    bounded queues of `queue_size` batches, so a slow stage applies
+    backpressure upstream and at most that many batches are in flight. The
+    sync_index manifest and, with `bm25_dir`, the BM25 builder still grow
+    with the corpus. Batches end on document boundaries; every
+    `checkpoint_rows` rows the backend is saved and the number of fully
+    ingested rows is checkpointed, and a restarted run skips those rows.
+    Upserts use content-addressed ids, so replaying the last partial batch
+    after a crash is harmless. Saving is a no-op for Chroma, but rewrites a
+    buffered backend (NumpyIndex) whole, so raise `checkpoint_rows` there.
+
+    The sync_index manifest (narrative hash, metadata hash and chunk ids per
+    complaint) is written together with each checkpoint, so a later
+    `sync_index` run only re-embeds what changed since the streamed load.
+
+    Args:
+        data_path (str): Processed CSV or Parquet file.
+        store (VectorStoreChroma): Target vector store.
+        model (SentenceTransformer): Embedding model.
+        checkpoint_path (str, optional): Defaults to <persist_directory>/ingest_checkpoint.json.
+        queue_size (int): Max batches buffered between two stages.
+        cache (EmbeddingCache, optional): On-disk embedding cache.
+        bm25_dir (str, optional): Also build a BM25 lexical index over all chunks here.
+        manifest_path (str, optional): Defaults to <persist_directory>/index_manifest.json.
+        checkpoint_rows (int, optional): Rows between checkpoint and manifest writes
+            (defaults to `read_chunksize`; both are rewritten whole each time).
+
+    Returns:
+        dict: Per-stage throughput and totals.
+    """
+    checkpoint_path = checkpoint_path or os.path.join(store.persist_directory, CHECKPOINT_NAME)
+    checkpoint = load_checkpoint(checkpoint_path)
+    if checkpoint.get("data_path") not in (None, os.path.abspath(data_path)):
+        print("Checkpoint belongs to a different dataset; starting from the beginning.")
+        checkpoint = {"rows_done": 0}
+    rows_done = checkpoint["rows_done"]
+    if rows_done:
+        print(f"Resuming after {rows_done:,} already ingested rows...")
+    manifest_path = manifest_path or os.path.join(store.persist_directory, MANIFEST_NAME)
+    manifest = load_manifest(manifest_path)
+    checkpoint_rows = checkpoint_rows or read_chunksize
+
+    embed_queue = queue.Queue(maxsize=queue_size)
+    upsert_queue = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    errors = []
+    stats = {name: StageStats(name) for name in ("chunk", "embed", "upsert")}
+    # Only the chunk thread touches the builder; it sees every row, including resumed ones
+    bm25_builder = BM25IndexBuilder() if bm25_dir else None
+
+    def chunk_stage():
+        try:
+            ids, texts, metadatas, entries = [], [], [], {}
+            row = 0
+            columns = [id_col, text_col] + list(METADATA_COLUMNS)
+            for df in iter_processed_data(data_path, columns=columns, chunksize=read_chunksize):
+                complaint_ids = df[id_col].astype(str).tolist()
+                narratives = df[text_col].tolist()
+                row_metadata = frame_metadata(df)
+                for offset, text in enumerate(narratives):
+                    position = row + offset
+                    if not isinstance(text, str) or not text.strip():
+                        continue
+                    if position < rows_done and bm25_builder is None:
+                        continue
+                    start = time.perf_counter()
+                    complaint_id = complaint_ids[offset]
+                    chunks = chunk_texts([text], chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+                    if bm25_builder is not None:
+                        lexical = {make_chunk_id(complaint_id, c["text"]): c["text"] for c in chunks}
+                        bm25_builder.add(list(lexical), list(lexical.values()), [row_metadata[offset]] * len(lexical))
+                        if position < rows_done:
+                            continue
+                    metadata = {**row_metadata[offset], "complaint_id": complaint_id}
+                    unique = unique_chunks(complaint_id, chunks)
+                    for chunk_id, chunk_index, chunk_text in unique:
+                        ids.append(chunk_id)
+                        texts.append(chunk_text)
+                        metadatas.append({**metadata, "chunk_index": chunk_index})
+                    # Same entry sync_index would write for this complaint
+                    entries[complaint_id] = manifest_entry(content_hash(text),
+                                                           content_hash(json.dumps(metadata, sort_keys=True)), unique)
+                    stats["chunk"].add(len(chunks), time.perf_counter() - start)
+                    if len(texts) >= embed_batch_size:
+                        if not _put(embed_queue, (ids, texts, metadatas, entries, position + 1), stop):
+                            return
+                        ids, texts, metadatas, entries = [], [], [], {}
+                row += len(narratives)
+            if texts:
+                _put(embed_queue, (ids, texts, metadatas, entries, row), stop)
+            elif row > rows_done:
+                # Trailing rows had no text; still record them as done
+                _put(embed_queue, ([], [], [], {}, row), stop)
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            _put(embed_queue, _DONE, stop)
+
+    def embed_stage():
+        try:
+            while True:
+                item = _get(embed_queue, stop)
+                if item is _DONE:
+                    break
+                ids, texts, metadatas, entries, end_row = item
+                start = time.perf_counter()
+                embeddings = None
+                if texts:
+                    embeddings = encode_with_cache(
+                        model, texts, cache=cache,
+                        batch_size=64, convert_to_numpy=True, normalize_embeddings=True
+                    )
+                stats["embed"].add(len(texts), time.perf_counter() - start)
+                if not _put(upsert_queue, (ids, texts, metadatas, entries, embeddings, end_row), stop):
+                    return
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            _put(upsert_queue, _DONE, stop)
+
+    threads = [
+        threading.Thread(target=chunk_stage, name="ingest-chunk", daemon=True),
+        threading.Thread(target=embed_stage, name="ingest-embed", daemon=True),
+    ]
+    wall_start = time.perf_counter()
+    for t in threads:
+        t.start()
+
+    def save_progress(end_row):
+        # Writes must be durable before the manifest and checkpoint say they happened
+        store.backend.save()
+        save_manifest(manifest_path, manifest)
+        save_checkpoint(checkpoint_path, {"data_path": os.path.abspath(data_path), "rows_done": end_row})
+        if cache is not None:
+            cache.flush()
+
+    saved_row = rows_done
+    try:
+        while True:
+            item = _get(upsert_queue, stop)
+            if item is _DONE:
+                break
+            ids, texts, metadatas, entries, embeddings, end_row = item
+            start = time.perf_counter()
+            # Duplicate chunks inside one batch would make Chroma reject the upsert
+            keep = list({chunk_id: i for i, chunk_id in enumerate(ids)}.values())
+            for s in range(0, len(keep), upsert_batch_size):
+                part = keep[s:s + upsert_batch_size]
+                store.upsert_documents(
+                    [texts[i] for i in part],
+                    metadatas=[metadatas[i] for i in part],
+                    ids=[ids[i] for i in part],
+                    embeddings=embeddings[part]
+                )
+            stats["upsert"].add(len(keep), time.perf_counter() - start)
+            manifest["complaints"].update(entries)
+            if end_row - saved_row >= checkpoint_rows:
+                save_progress(end_row)
+                saved_row = end_row
+    except BaseException:
+        stop.set()
+        raise
+    finally:
+        for t in threads:
+            t.join()
+
+    if errors:
+        raise errors[0]
+
+    store.backend.save()
+    save_manifest(manifest_path, manifest)
+    if cache is not None:
+        cache.flush()
+    if bm25_builder is not None:
+        bm25_builder.save(bm25_dir)
+    bump_index_version(store.persist_directory)
+    # Finished cleanly: the next run starts from scratch (upserts are idempotent)
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    wall = time.perf_counter() - wall_start
+    report = {name: s.as_dict() for name, s in stats.items()}
+    report["wall_seconds"] = round(wall, 3)
+    report["chunks_per_sec"] = round(stats["upsert"].items / wall, 1) if wall > 0 else 0.0
+    return report
+
+
+if __name__ == "__main__":
+    import sys
+    from scripts.embedding_pipeline.embedding import load_embedding_model
+    from scripts.embedding_pipeline.embedding_cache import EmbeddingCache, cache_model_name
+    from scripts.embedding_pipeline.vector_store import VectorStoreChroma
+
+    data_path = sys.argv[1] if len(sys.argv) > 1 else "Data/processed/filtered_complaints.csv"
+    persist_directory = sys.argv[2] if len(sys.argv) > 2 else "vector_store/chromadb"
+
+    model = load_embedding_model(model_name="sentence-transformers/all-MiniLM-L6-v2")
+    store = VectorStoreChroma(persist_directory=persist_directory, embedding_function=None)
+    cache = EmbeddingCache(model_name=cache_model_name(model, "sentence-transformers/all-MiniLM-L6-v2"))
+
+    bm25_dir = os.path.join(os.path.dirname(os.path.abspath(persist_directory)), "bm25")
+    report = ingest_streaming(data_path, store, model, cache=cache, bm25_dir=bm25_dir)
+    print("Streaming ingestion complete:")
+    for stage, values in report.items():
+        print(f"  {stage}: {values}")
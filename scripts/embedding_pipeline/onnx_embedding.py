@@ -0,0 +1,246 @@
+import os
+import json
+import numpy as np
+
+CONFIG_NAME = "onnx_config.json"
+MODEL_FILES = {"float32": "model.onnx", "int8": "model.int8.onnx"}
+DEFAULT_ONNX_DIR = "models/all-MiniLM-L6-v2-onnx"
+
+# Sample sentences for the drift check when no texts are given
+DRIFT_TEXTS = [
+    "I was charged a late fee even though I paid on time.",
+    "The money transfer never arrived and customer service did not respond.",
+    "My credit card was closed without notice.",
+    "They keep charging interest on my buy now pay later plan after I returned the item.",
+    "I cannot access my savings account and the bank froze my funds for weeks.",
+    "Unauthorized transactions appeared on my statement and my dispute was denied.",
+    "The personal loan payoff amount was wrong and they refused to correct it.",
+    "Why do customers complain about BNPL?",
+]
+
+
+def _read_json(path, default=None):
+    if not os.path.exists(path):
+        return default
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _sentence_transformer_settings(model_path):
+    """Pooling mode, normalization and max sequence length of a saved SentenceTransformer folder."""
+    pooling, normalize = "mean", False
+    for module in _read_json(os.path.join(model_path, "modules.json"), []):
+        kind = module.get("type", "")
+        if kind.endswith("Normalize"):
+            normalize = True
+        elif kind.endswith("Pooling"):
+            config = _read_json(os.path.join(model_path, module.get("path", ""), "config.json"), {})
+            if isinstance(config.get("pooling_mode"), str):
+                pooling = config["pooling_mode"]
+            elif config.get("pooling_mode_cls_token"):
+                pooling = "cls"
+            elif config.get("pooling_mode_max_tokens"):
+                pooling = "max"
+    bert_config = _read_json(os.path.join(model_path, "sentence_bert_config.json"), {})
+    return pooling, normalize, bert_config.get("max_seq_length", 256)
+
+
+def export_onnx(model_path, output_dir=None, quantize=True, opset=17):
+    """
+    Export a local SentenceTransformer model (e.g. models/all-MiniLM-L6-v2-local) to ONNX.
+
+    Writes model.onnx (float32), model.int8.onnx (dynamic int8 quantization
+    of the linear layers, if `quantize`), the tokenizer and onnx_config.json
+    (pooling, normalization, max sequence length) to `output_dir`.
+    Needs torch, transformers and onnx; serving only needs onnxruntime and tokenizers.
+
+    Returns:
+        str: `output_dir`.
+    """
+    import torch
+    import inspect
+    from transformers import AutoModel, AutoTokenizer
+
+    output_dir = output_dir or model_path.rstrip("/") + "-onnx"
+    os.makedirs(output_dir, exist_ok=True)
+    pooling, normalize, max_seq_length = _sentence_transformer_settings(model_path)
+
+    tokenizer = AutoTokenizer.from_pretrained(model_path)
+    tokenizer.save_pretrained(output_dir)
+    model = AutoModel.from_pretrained(model_path).eval()
+
+    sample = tokenizer(["export sample", "a second, longer export sample"], padding=True, return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+    options = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+    float_path = os.path.join(output_dir, MODEL_FILES["float32"])
+
+    class TokenEmbeddings(torch.nn.Module):
+        # Inputs by name (forward's positional order differs across transformers versions)
+        def __init__(self):
+            super().__init__()
+            self.model = model
+
+        def forward(self, *inputs):
+            return self.model(**dict(zip(input_names, inputs)))[0]
+
+    with torch.no_grad():
+        torch.onnx.export(TokenEmbeddings().eval(), tuple(sample[name] for name in input_names), float_path,
+                          input_names=input_names, output_names=["last_hidden_state"],
+                          dynamic_axes=dynamic_axes, opset_version=opset, **options)
+    print(f"Exported {model_path} -> {float_path}")
+
+    files = {"float32": MODEL_FILES["float32"]}
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+
+        quantize_dynamic(float_path, os.path.join(output_dir, MODEL_FILES["int8"]), weight_type=QuantType.QInt8)
+        files["int8"] = MODEL_FILES["int8"]
+        print(f"Quantized (int8 dynamic) -> {os.path.join(output_dir, MODEL_FILES['int8'])}")
+
+    config = {
+        "source": os.path.abspath(model_path),
+        "dim": int(model.config.hidden_size),
+        "pooling": pooling,
+        "normalize": normalize,
+        "max_seq_length": int(max_seq_length),
+        "inputs": input_names,
+        "pad_token": tokenizer.pad_token,
+        "pad_token_id": int(tokenizer.pad_token_id),
+        "files": files,
+    }
+    with open(os.path.join(output_dir, CONFIG_NAME), "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=2)
+    return output_dir
+
+
+class OnnxEmbeddingModel:
+    """
+    SentenceTransformer-compatible encoder running an exported model on
+    onnxruntime's CPU provider.
+
+    Tokenization uses the `tokenizers` library and pooling / normalization
+    follow the source model, so vectors match the PyTorch ones up to the
+    drift recorded by `check_drift`. Only torch-free libraries are imported.
+    """
+
+    def __init__(self, model_dir=DEFAULT_ONNX_DIR, quantized=True, num_threads=None, max_seq_length=None):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.model_dir = model_dir
+        self.config = _read_json(os.path.join(model_dir, CONFIG_NAME))
+        if self.config is None:
+            raise FileNotFoundError(f"No ONNX export in {model_dir}; run export_onnx first.")
+        variant = "int8" if quantized and "int8" in self.config["files"] else "float32"
+        self.variant = variant
+        self.max_seq_length = max_seq_length or self.config["max_seq_length"]
+
+        if num_threads is None and os.getenv("ONNX_NUM_THREADS"):
+            num_threads = int(os.getenv("ONNX_NUM_THREADS"))
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.inter_op_num_threads = 1
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(os.path.join(model_dir, self.config["files"][variant]), options,
+                                            providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=self.max_seq_length)
+        self.tokenizer.enable_padding(pad_id=self.config["pad_token_id"], pad_token=self.config["pad_token"])
+
+    def get_sentence_embedding_dimension(self):
+        return self.config["dim"]
+
+    def _embed_batch(self, texts):
+        encodings = self.tokenizer.encode_batch(texts)
+        feeds = {
+            "input_ids": np.asarray([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.asarray([e.attention_mask for e in encodings], dtype=np.int64),
+            "token_type_ids": np.asarray([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        hidden = self.session.run(None, {name: feeds[name] for name in self.input_names})[0]
+        mask = feeds["attention_mask"][:, :, None].astype(np.float32)
+        pooling = self.config["pooling"]
+        if pooling == "cls":
+            return hidden[:, 0]
+        if pooling == "max":
+            return np.where(mask > 0, hidden, -1e9).max(axis=1)
+        return (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+
+    def encode(self, sentences, batch_size=32, show_progress_bar=False, convert_to_numpy=True,
+               normalize_embeddings=False, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        vectors = np.zeros((len(texts), self.config["dim"]), dtype=np.float32)
+        # Longest first, like SentenceTransformer, so batches pad to similar lengths
+        order = sorted(range(len(texts)), key=lambda i: -len(texts[i]))
+        for start in range(0, len(order), batch_size):
+            rows = order[start:start + batch_size]
+            vectors[rows] = self._embed_batch([texts[i] for i in rows])
+        if normalize_embeddings or self.config["normalize"]:
+            vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        return vectors[0] if single else vectors
+
+
+def check_drift(reference_model, onnx_model, texts=None, batch_size=32):
+    """
+    Cosine similarity between normalized reference (PyTorch) and ONNX vectors of the same texts.
+
+    Returns:
+        dict: min / mean cosine similarity and max drift (1 - min cosine).
+    """
+    texts = texts or DRIFT_TEXTS
+    reference = reference_model.encode(texts, batch_size=batch_size, normalize_embeddings=True)
+    candidate = onnx_model.encode(texts, batch_size=batch_size, normalize_embeddings=True)
+    cosine = np.sum(np.asarray(reference, dtype=np.float32) * candidate, axis=1)
+    return {"texts": len(texts), "min_cosine": round(float(cosine.min()), 6),
+            "mean_cosine": round(float(cosine.mean()), 6), "max_drift": round(float(1 - cosine.min()), 6)}
+
+
+def verify_export(model_path, output_dir, texts=None, max_drift=None):
+    """
+    Check each exported variant against the PyTorch model and record the
+    result in onnx_config.json.
+
+    Raises:
+        ValueError: If a variant drifts more than its bound (`max_drift`, by
+        default 1e-4 for float32 and 0.02 for int8).
+    """
+    from sentence_transformers import SentenceTransformer
+
+    bounds = max_drift or {"float32": 1e-4, "int8": 0.02}
+    reference = SentenceTransformer(model_path)
+    config = _read_json(os.path.join(output_dir, CONFIG_NAME))
+    report = {}
+    for variant in config["files"]:
+        drift = check_drift(reference, OnnxEmbeddingModel(output_dir, quantized=variant == "int8"), texts)
+        drift["bound"] = bounds[variant]
+        report[variant] = drift
+        print(f"{variant}: min cosine {drift['min_cosine']}, drift {drift['max_drift']} (bound {bounds[variant]})")
+    config["drift"] = report
+    with open(os.path.join(output_dir, CONFIG_NAME), "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=2)
+    failed = [variant for variant, drift in report.items() if drift["max_drift"] > drift["bound"]]
+    if failed:
+        raise ValueError(f"ONNX export drifts beyond its bound for: {', '.join(failed)}")
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Export the embedding model to ONNX (optionally int8) and check drift.")
+    parser.add_argument("--model-path", default="models/all-MiniLM-L6-v2-local")
+    parser.add_argument("--output-dir", default=DEFAULT_ONNX_DIR)
+    parser.add_argument("--no-quantize", action="store_true")
+    parser.add_argument("--max-drift-int8", type=float, default=0.02)
+    parser.add_argument("--max-drift-float32", type=float, default=1e-4)
+    args = parser.parse_args()
+
+    export_onnx(args.model_path, args.output_dir, quantize=not args.no_quantize)
+    verify_export(args.model_path, args.output_dir,
+                  max_drift={"float32": args.max_drift_float32, "int8": args.max_drift_int8})
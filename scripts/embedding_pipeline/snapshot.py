@@ -0,0 +1,486 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import numpy as np
+from scripts.embedding_pipeline.index_backends import (
+    INDEX_VERSION_NAME, NumpyIndex, StringColumn, _matches, read_index_version, write_string_column
+)
+
+SNAPSHOT_FORMAT = "complaint-index-snapshot"
+SNAPSHOT_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+DEFAULT_SNAPSHOT_DIR = "vector_store/snapshot"
+
+# String metadata with at most this share of distinct values is dictionary-encoded
+DICTIONARY_MAX_RATIO = 0.5
+
+
+def id_hash(chunk_id):
+    """64-bit hash of a chunk id, used for the sorted id lookup table."""
+    return int.from_bytes(hashlib.blake2b(str(chunk_id).encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def file_sha256(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def iter_store_pages(backend, page_size):
+    """(ids, float32 embeddings, documents, metadatas) pages of every chunk in a Chroma or NumPy backend."""
+    collection = getattr(backend, "collection", None)
+    if collection is not None:
+        total = collection.count()
+        for offset in range(0, total, page_size):
+            page = collection.get(include=["documents", "metadatas", "embeddings"], limit=page_size, offset=offset)
+            yield (page["ids"], np.asarray(page["embeddings"], dtype=np.float32), page["documents"],
+                   [m or {} for m in page["metadatas"]])
+        return
+    rows = np.flatnonzero(backend._alive) if backend.count() else np.zeros(0, dtype=np.int64)
+    for start in range(0, len(rows), page_size):
+        page = rows[start:start + page_size]
+        yield ([backend._ids[r] for r in page], backend.vectors(page), [backend._documents[r] for r in page],
+               [dict(backend._metadatas[r]) for r in page])
+
+
+def _column_kind(values):
+    present = [v for v in values if v is not None]
+    if all(isinstance(v, bool) for v in present):
+        return "bool"
+    if all(isinstance(v, int) and not isinstance(v, bool) for v in present):
+        return "int"
+    if all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in present):
+        return "float"
+    if all(isinstance(v, str) for v in present):
+        distinct = len(set(present))
+        return "dictionary" if distinct <= max(1, DICTIONARY_MAX_RATIO * len(values)) else "string"
+    return "json"
+
+
+def _write_metadata_column(directory, name, values):
+    """Write one metadata key column-wise; returns its manifest entry."""
+    kind = _column_kind(values)
+    entry = {"kind": kind, "file": name}
+    path = os.path.join(directory, name)
+    if kind == "dictionary":
+        categories = sorted({v for v in values if v is not None})
+        code_of = {value: code for code, value in enumerate(categories)}
+        codes = np.fromiter((code_of[v] if v is not None else -1 for v in values), dtype=np.int32, count=len(values))
+        np.save(path + ".codes.npy", codes)
+        entry["categories"] = categories
+    elif kind in ("int", "float", "bool"):
+        dtype = {"int": np.int64, "float": np.float64, "bool": np.bool_}[kind]
+        np.save(path + ".npy", np.asarray([v if v is not None else 0 for v in values], dtype=dtype))
+        np.save(path + ".valid.npy", np.asarray([v is not None for v in values], dtype=bool))
+    else:
+        encode = (lambda v: v) if kind == "string" else json.dumps
+        write_string_column(path + ".bin", [encode(v) if v is not None else "" for v in values])
+        np.save(path + ".valid.npy", np.asarray([v is not None for v in values], dtype=bool))
+    return entry
+
+
+def export_snapshot(source, output_dir=DEFAULT_SNAPSHOT_DIR, model_name=None, quantization="float32",
+                    partition_key="product", page_size=5000):
+    """
+    Write every chunk of a vector store to a versioned, memory-mappable snapshot.
+
+    Layout of `output_dir`:
+        vectors.npy (+ scales.npy)        contiguous embedding matrix (float32, float16 or int8)
+        ids.bin, documents.bin            string columns (UTF-8 blob + offsets, see StringColumn)
+        id_hashes.npy, id_rows.npy        sorted id hashes for id lookups
+        meta_<i>.*                        one column per metadata key (dictionary codes, numbers or strings)
+        manifest.json                     format version, model name, shapes, columns and sha256 checksums
+
+    Rows are ordered by `partition_key` so each product's rows are one
+    contiguous slice. The snapshot is written to a temporary directory and
+    swapped in, so processes that still map the old files keep working.
+
+    Args:
+        source: A VectorStoreChroma, ChromaBackend or NumpyIndex.
+        model_name (str): Embedding model the vectors were made with; readers check it.
+
+    Returns:
+        dict: The manifest.
+    """
+    backend = getattr(source, "backend", source)
+    source_dir = getattr(source, "persist_directory", None) or getattr(backend, "persist_directory", None) \
+        or getattr(backend, "directory", None)
+    return write_snapshot(iter_store_pages(backend, page_size), backend.count(), output_dir, model_name=model_name,
+                          quantization=quantization, partition_key=partition_key, source_dir=source_dir)
+
+
+def write_snapshot(pages, count, output_dir=DEFAULT_SNAPSHOT_DIR, model_name=None, quantization="float32",
+                   partition_key="product", source_dir=None):
+    """
+    Write a snapshot from `count` chunks given as (ids, float32 embeddings,
+    documents, metadatas) pages (see export_snapshot for the layout).
+
+    Vectors go straight to a memory-mapped file; ids, documents and metadata
+    of all `count` chunks are held in memory until written.
+
+    Args:
+        source_dir (str, optional): Store the chunks came from, recorded with its index version.
+
+    Returns:
+        dict: The manifest.
+    """
+    if quantization not in NumpyIndex.QUANTIZATIONS:
+        raise ValueError(f"quantization must be one of {NumpyIndex.QUANTIZATIONS}")
+    start = time.perf_counter()
+    tmp_dir = output_dir.rstrip("/\\") + f".tmp-{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    ids, documents, metadatas = [], [], []
+    raw = None
+    for page_ids, embeddings, page_documents, page_metadatas in pages:
+        if raw is None:
+            raw = np.lib.format.open_memmap(os.path.join(tmp_dir, "vectors.f32.tmp"), mode="w+",
+                                            dtype=np.float32, shape=(count, embeddings.shape[1]))
+        raw[len(ids):len(ids) + len(page_ids)] = embeddings
+        ids.extend(page_ids)
+        documents.extend(page_documents)
+        metadatas.extend(page_metadatas)
+        print(f"  read {len(ids):,} chunks")
+    n = len(ids)
+    dim = int(raw.shape[1]) if raw is not None else 0
+
+    # Group rows by partition (stable, so source order is kept inside a partition)
+    order = sorted(range(n), key=lambda i: (metadatas[i].get(partition_key) is None,
+                                            str(metadatas[i].get(partition_key, ""))))
+    order = np.asarray(order, dtype=np.int64)
+
+    vectors = np.lib.format.open_memmap(os.path.join(tmp_dir, "vectors.npy"), mode="w+",
+                                        dtype=np.dtype(quantization), shape=(n, dim))
+    scales = np.ones(n, dtype=np.float32) if quantization == "int8" else None
+    for first in range(0, n, 65536):
+        block = np.asarray(raw[np.sort(order[first:first + 65536])], dtype=np.float32)
+        block = block[np.argsort(np.argsort(order[first:first + 65536]))]
+        if quantization == "int8":
+            block_scales = np.abs(block).max(axis=1) / 127.0
+            block_scales = np.where(block_scales > 0, block_scales, 1.0).astype(np.float32)
+            scales[first:first + len(block)] = block_scales
+            block = np.round(block / block_scales[:, None])
+        vectors[first:first + len(block)] = block.astype(vectors.dtype)
+    vectors.flush()
+    del vectors, raw
+    os.remove(os.path.join(tmp_dir, "vectors.f32.tmp"))
+    if scales is not None:
+        np.save(os.path.join(tmp_dir, "scales.npy"), scales)
+
+    ids = [ids[i] for i in order]
+    write_string_column(os.path.join(tmp_dir, "ids.bin"), ids)
+    write_string_column(os.path.join(tmp_dir, "documents.bin"), [documents[i] for i in order])
+    hashes = np.fromiter((id_hash(i) for i in ids), dtype=np.uint64, count=n)
+    id_rows = np.argsort(hashes, kind="stable")
+    np.save(os.path.join(tmp_dir, "id_hashes.npy"), hashes[id_rows])
+    np.save(os.path.join(tmp_dir, "id_rows.npy"), id_rows.astype(np.int64))
+
+    keys = list(dict.fromkeys(key for metadata in metadatas for key in metadata))
+    columns = {}
+    for position, key in enumerate(keys):
+        values = [metadatas[i].get(key) for i in order]
+        columns[key] = _write_metadata_column(tmp_dir, f"meta_{position}", values)
+
+    partitions = {}
+    if partition_key in columns and columns[partition_key]["kind"] == "dictionary":
+        codes = np.load(os.path.join(tmp_dir, columns[partition_key]["file"] + ".codes.npy"))
+        for code, value in enumerate(columns[partition_key]["categories"]):
+            rows = np.flatnonzero(codes == code)
+            partitions[value] = [int(rows[0]), int(rows[-1]) + 1] if len(rows) else [0, 0]
+
+    files = {name: {"bytes": os.path.getsize(os.path.join(tmp_dir, name)),
+                    "sha256": file_sha256(os.path.join(tmp_dir, name))}
+             for name in sorted(os.listdir(tmp_dir))}
+    manifest = {
+        "format": SNAPSHOT_FORMAT,
+        "version": SNAPSHOT_VERSION,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "model_name": model_name,
+        "count": n,
+        "dim": dim,
+        "quantization": quantization,
+        "partition_key": partition_key,
+        "partitions": partitions,
+        "metadata_columns": columns,
+        "source": {"path": os.path.abspath(source_dir) if source_dir else None,
+                   "index_version": read_index_version(source_dir) if source_dir else None},
+        "files": files,
+        "checksum": hashlib.sha256("".join(f"{name}:{info['sha256']}\n" for name, info in files.items())
+                                   .encode("utf-8")).hexdigest(),
+    }
+    with open(os.path.join(tmp_dir, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    # The answer cache keys its entries on the index version of the directory it watches
+    with open(os.path.join(tmp_dir, INDEX_VERSION_NAME), "w", encoding="utf-8") as f:
+        json.dump({"version": manifest["checksum"][:16], "updated_at": manifest["created_at"]}, f)
+
+    if os.path.exists(output_dir):
+        old_dir = output_dir.rstrip("/\\") + f".old-{os.getpid()}"
+        os.rename(output_dir, old_dir)
+        os.rename(tmp_dir, output_dir)
+        shutil.rmtree(old_dir, ignore_errors=True)
+    else:
+        os.makedirs(os.path.dirname(os.path.abspath(output_dir)), exist_ok=True)
+        os.rename(tmp_dir, output_dir)
+    print(f"Snapshot of {n:,} chunks written to {output_dir} in {time.perf_counter() - start:.1f}s")
+    return manifest
+
+
+def read_manifest(path):
+    """Manifest of the snapshot in `path`, checked for a supported format and version."""
+    manifest_path = os.path.join(path, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        raise FileNotFoundError(f"No index snapshot in {path}; run export_snapshot first.")
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format") != SNAPSHOT_FORMAT or manifest.get("version", 0) > SNAPSHOT_VERSION:
+        raise ValueError(f"{path} holds an unsupported snapshot ({manifest.get('format')} "
+                         f"v{manifest.get('version')}); this code reads {SNAPSHOT_FORMAT} v{SNAPSHOT_VERSION}.")
+    return manifest
+
+
+def verify_snapshot(path):
+    """
+    Recompute every file's sha256 against the manifest.
+
+    Raises:
+        ValueError: If a file is missing or its size or checksum differs.
+    """
+    manifest = read_manifest(path)
+    for name, info in manifest["files"].items():
+        file_path = os.path.join(path, name)
+        if not os.path.exists(file_path) or os.path.getsize(file_path) != info["bytes"] \
+                or file_sha256(file_path) != info["sha256"]:
+            raise ValueError(f"Snapshot file {file_path} is missing or does not match its checksum.")
+    return manifest
+
+
+class MetadataColumns:
+    """
+    Read-only, memory-mapped metadata columns of a snapshot.
+
+    Indexing a row returns its metadata dict; `mask` evaluates Chroma-style
+    filters on whole columns at once.
+    """
+
+    def __init__(self, path, manifest):
+        self.count = manifest["count"]
+        self.columns = {}
+        for key, entry in manifest["metadata_columns"].items():
+            base = os.path.join(path, entry["file"])
+            kind = entry["kind"]
+            if kind == "dictionary":
+                column = (np.load(base + ".codes.npy", mmap_mode="r"), entry["categories"])
+            elif kind in ("int", "float", "bool"):
+                column = (np.load(base + ".npy", mmap_mode="r"), np.load(base + ".valid.npy", mmap_mode="r"))
+            else:
+                column = (StringColumn(base + ".bin"), np.load(base + ".valid.npy", mmap_mode="r"))
+            self.columns[key] = (kind, column)
+
+    def __len__(self):
+        return self.count
+
+    def value(self, key, row):
+        kind, column = self.columns[key]
+        if kind == "dictionary":
+            code = int(column[0][row])
+            return column[1][code] if code >= 0 else None
+        values, valid = column
+        if not valid[row]:
+            return None
+        if kind == "int":
+            return int(values[row])
+        if kind == "float":
+            return float(values[row])
+        if kind == "bool":
+            return bool(values[row])
+        return values[row] if kind == "string" else json.loads(values[row])
+
+    def __getitem__(self, row):
+        metadata = {}
+        for key in self.columns:
+            value = self.value(key, row)
+            if value is not None:
+                metadata[key] = value
+        return metadata
+
+    def mask(self, key, condition):
+        """Rows whose `key` value satisfies `condition` (same semantics as metadata_matches)."""
+        if key not in self.columns:
+            return np.full(self.count, _matches(None, condition), dtype=bool)
+        kind, column = self.columns[key]
+        if kind == "dictionary":
+            codes, categories = column
+            # Evaluate once per distinct value, then gather by code (code -1 is a missing value)
+            outcome = np.asarray([_matches(value, condition) for value in categories] + [_matches(None, condition)],
+                                 dtype=bool)
+            return outcome[np.asarray(codes)]
+        targets = condition.values() if isinstance(condition, dict) else [condition]
+        numeric = kind in ("int", "float") and all(
+            isinstance(t, (int, float)) and not isinstance(t, bool)
+            or isinstance(t, (list, tuple)) and all(isinstance(x, (int, float)) for x in t) for t in targets)
+        if not numeric:
+            return np.fromiter((_matches(self.value(key, row), condition) for row in range(self.count)),
+                               dtype=bool, count=self.count)
+        values, valid = np.asarray(column[0]), np.asarray(column[1])
+        condition = condition if isinstance(condition, dict) else {"$eq": condition}
+        mask = np.ones(self.count, dtype=bool)
+        for op, target in condition.items():
+            if op == "$eq":
+                mask &= valid & (values == target)
+            elif op == "$ne":
+                mask &= ~(valid & (values == target))
+            elif op == "$in":
+                mask &= valid & np.isin(values, list(target))
+            elif op == "$nin":
+                mask &= ~(valid & np.isin(values, list(target)))
+            elif op == "$gt":
+                mask &= valid & (values > target)
+            elif op == "$gte":
+                mask &= valid & (values >= target)
+            elif op == "$lt":
+                mask &= valid & (values < target)
+            elif op == "$lte":
+                mask &= valid & (values <= target)
+        return mask
+
+
+class SnapshotIndex(NumpyIndex):
+    """
+    Read-only index over a snapshot written by export_snapshot.
+
+    Every array is memory-mapped, so opening is near-instant and all
+    worker processes on a host share one page-cache copy of the vectors,
+    texts and metadata. Search is NumpyIndex's exact search; a product
+    filter scores only that product's contiguous slice of rows.
+    """
+
+    def __init__(self, path=DEFAULT_SNAPSHOT_DIR, expected_model=None, block_rows=65536, verify=False):
+        manifest = verify_snapshot(path) if verify else read_manifest(path)
+        if expected_model and manifest.get("model_name") and manifest["model_name"] != expected_model:
+            raise ValueError(f"Snapshot {path} was built with {manifest['model_name']}, not {expected_model}.")
+        super().__init__(directory=path, quantization=manifest["quantization"],
+                         partition_key=manifest.get("partition_key"), block_rows=block_rows)
+        self.manifest = manifest
+        self.model_name = manifest.get("model_name")
+        self.dim = manifest["dim"]
+        self._vectors = np.load(self._path("vectors.npy"), mmap_mode="r")
+        self._scales = np.load(self._path("scales.npy"), mmap_mode="r") if self.quantization == "int8" else None
+        self._ids = StringColumn(self._path("ids.bin"))
+        self._documents = StringColumn(self._path("documents.bin"))
+        self._metadatas = MetadataColumns(path, manifest)
+        self._id_hashes = np.load(self._path("id_hashes.npy"), mmap_mode="r")
+        self._id_rows = np.load(self._path("id_rows.npy"), mmap_mode="r")
+        self._alive = np.ones(manifest["count"], dtype=bool)
+        self._partitions = {value: np.arange(start, end, dtype=np.int64)
+                            for value, (start, end) in manifest.get("partitions", {}).items()}
+
+    def _read_only(self, *args, **kwargs):
+        raise NotImplementedError("SnapshotIndex is read-only; export a new snapshot to change it.")
+
+    upsert = update_metadata = delete = save = _materialize = _read_only
+
+    def count(self):
+        return len(self._alive)
+
+    def ids(self):
+        return [self._ids[row] for row in range(len(self._ids))]
+
+    def _rows_for_ids(self, ids):
+        rows = []
+        for chunk_id in ids:
+            h = np.uint64(id_hash(chunk_id))
+            position = int(np.searchsorted(self._id_hashes, h))
+            while position < len(self._id_hashes) and self._id_hashes[position] == h:
+                row = int(self._id_rows[position])
+                if self._ids[row] == chunk_id:
+                    rows.append(row)
+                    break
+                position += 1
+        return rows
+
+    def get(self, ids, include_embeddings=False):
+        rows = self._rows_for_ids(ids)
+        result = {"ids": [self._ids[r] for r in rows],
+                  "documents": [self._documents[r] for r in rows],
+                  "metadatas": [self._metadatas[r] for r in rows]}
+        if include_embeddings:
+            result["embeddings"] = self.vectors(rows).tolist() if rows else []
+        return result
+
+    def _candidate_rows(self, query, filters, use_ivf):
+        filters = dict(filters or {})
+        rows = None
+        product = filters.pop(self.partition_key, None) if self.partition_key else None
+        if isinstance(product, str):
+            rows = self._partitions.get(product, np.zeros(0, dtype=np.int64))
+        elif product is not None:
+            filters[self.partition_key] = product
+        if filters:
+            mask = np.ones(len(self._alive), dtype=bool)
+            for key, condition in filters.items():
+                mask &= self._metadatas.mask(key, condition)
+            rows = np.flatnonzero(mask) if rows is None else rows[mask[rows]]
+        return rows
+
+    def _score(self, query, rows):
+        # Partition rows are one contiguous range: score the mapped slice without a gather copy
+        if rows is not None and len(rows) and rows[-1] - rows[0] + 1 == len(rows):
+            start, end = int(rows[0]), int(rows[-1]) + 1
+            scores = np.empty((len(rows),) + query.shape[1:], dtype=np.float32)
+            for first in range(start, end, self.block_rows):
+                block = np.asarray(self._vectors[first:min(first + self.block_rows, end)], dtype=np.float32)
+                scores[first - start:first - start + len(block)] = block @ query
+            if self._scales is not None:
+                scales = np.asarray(self._scales[start:end])
+                scores *= scales if scores.ndim == 1 else scales[:, None]
+            return scores
+        return super()._score(query, rows)
+
+
+def import_snapshot(path, store, batch_size=500):
+    """
+    Load every chunk of a snapshot into `store` (a VectorStoreChroma), e.g.
+    to rebuild a Chroma directory on a new host. Returns the chunk count.
+    """
+    index = SnapshotIndex(path, verify=True)
+    n = index.count()
+    for start in range(0, n, batch_size):
+        rows = np.arange(start, min(start + batch_size, n))
+        store.upsert_documents([index._documents[r] for r in rows],
+                               metadatas=[index._metadatas[r] for r in rows],
+                               ids=[index._ids[r] for r in rows],
+                               embeddings=index.vectors(rows).tolist())
+        print(f"  imported {start + len(rows):,} of {n:,} chunks")
+    return n
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Export, import or verify a memory-mappable index snapshot.")
+    parser.add_argument("command", choices=["export", "import", "verify"])
+    parser.add_argument("--store", default="vector_store/chromadb", help="Chroma persist directory")
+    parser.add_argument("--snapshot", default=DEFAULT_SNAPSHOT_DIR)
+    parser.add_argument("--model-name", default="sentence-transformers/all-MiniLM-L6-v2")
+    parser.add_argument("--quantization", default="float32", choices=NumpyIndex.QUANTIZATIONS)
+    args = parser.parse_args()
+
+    if args.command == "verify":
+        manifest = verify_snapshot(args.snapshot)
+        print(f"{args.snapshot}: {manifest['count']:,} chunks, model {manifest['model_name']}, checksum OK")
+    else:
+        from scripts.embedding_pipeline.vector_store import VectorStoreChroma
+        from scripts.embedding_pipeline.index_backends import bump_index_version
+
+        store = VectorStoreChroma(persist_directory=args.store, embedding_function=None)
+        if args.command == "export":
+            store.export_snapshot(args.snapshot, model_name=args.model_name, quantization=args.quantization)
+        else:
+            store.import_snapshot(args.snapshot)
+            bump_index_version(args.store)
@@ -4,62 +4,108 @@ import numpy as np
 import chromadb
 from chromadb import PersistentClient
 from chromadb.utils.embedding_functions import SentenceTransformerEmbeddingFunction
+from scripts.embedding_pipeline.embedding_cache import encode_with_cache
+from scripts.embedding_pipeline.index_backends import ChromaBackend
 
 
 class VectorStoreChroma:
-    def __init__(self, persist_directory="vector_store/chromadb", embedding_function=None):
+    """
+    Vector store for complaint chunks.
+
+    Storage is delegated to a VectorIndexBackend: by default a ChromaBackend
+    (with per-product partition collections when `partition_key` is set), or
+    any other backend such as NumpyIndex.
+    """
+
+    def __init__(self, persist_directory="vector_store/chromadb", embedding_function=None, partition_key="product", backend=None):
         self.persist_directory = persist_directory
         os.makedirs(self.persist_directory, exist_ok=True)
 
-        self.client = PersistentClient(path=self.persist_directory)
+        self.backend = backend or ChromaBackend(
+            persist_directory=self.persist_directory,
+            embedding_function=embedding_function,
+            partition_key=partition_key
+        )
+        self.embedding_function = embedding_function
+        # Chroma handles, kept for callers that use the collection directly
+        self.client = getattr(self.backend, "client", None)
+        self.collection = getattr(self.backend, "collection", None)
 
-        if "complaints_collection" in [col.name for col in self.client.list_collections()]:
-            self.collection = self.client.get_collection("complaints_collection")
-        else:
-            self.collection = self.client.create_collection(
-                name="complaints_collection",
-                embedding_function=embedding_function
-            )
+    def partitions(self):
+        return self.backend.partitions() if hasattr(self.backend, "partitions") else []
 
     def add_documents(self, texts, metadatas=None, ids=None, embeddings=None):
-        self.collection.add(
-            documents=texts,
-            metadatas=metadatas,
-            ids=ids,
-            embeddings=embeddings
-        )
+        self.backend.add(ids, embeddings, texts, metadatas)
+
+    def upsert_documents(self, texts, metadatas=None, ids=None, embeddings=None):
+        self.backend.upsert(ids, embeddings, texts, metadatas)
+
+    def update_metadata(self, ids, metadatas, batch_size=500):
+        """Replace metadata of existing chunks (moving them to the matching partition)."""
+        for start_idx in range(0, len(ids), batch_size):
+            self.backend.update_metadata(ids[start_idx:start_idx + batch_size], metadatas[start_idx:start_idx + batch_size])
+
+    def delete_documents(self, ids, batch_size=5000):
+        for start_idx in range(0, len(ids), batch_size):
+            self.backend.delete(ids[start_idx:start_idx + batch_size])
 
     def query(self, query_text, n_results=5):
-        return self.collection.query(query_texts=[query_text], n_results=n_results)
+        if self.collection is not None:
+            return self.collection.query(query_texts=[query_text], n_results=n_results)
+        if self.embedding_function is None:
+            raise ValueError(f"{type(self.backend).__name__} stores only vectors; pass an embedding_function "
+                             "to VectorStoreChroma to query it with text")
+        return self.backend.query(np.asarray(self.embedding_function([query_text]), dtype=np.float32),
+                                  top_k=n_results)
 
     def persist(self):
-        # Persistence is automatic with PersistentClient
-        print("Persistence is automatic with PersistentClient. No need to call persist().")
+        if isinstance(self.backend, ChromaBackend):
+            # Persistence is automatic with PersistentClient
+            print("Persistence is automatic with PersistentClient. No need to call persist().")
+        else:
+            self.backend.save()
 
     def reset(self):
-        self.collection.delete(where={})
+        """Delete every chunk (call `persist()` afterwards for backends that buffer writes)."""
+        self.delete_documents(self.backend.ids())
+
+    def export_snapshot(self, output_dir="vector_store/snapshot", model_name=None, **kwargs):
+        """Write a memory-mappable snapshot of every chunk (see snapshot.export_snapshot)."""
+        from scripts.embedding_pipeline.snapshot import export_snapshot
+        return export_snapshot(self, output_dir, model_name=model_name, **kwargs)
+
+    def import_snapshot(self, path="vector_store/snapshot", batch_size=500):
+        """Upsert every chunk of a snapshot into this store. Returns the chunk count."""
+        from scripts.embedding_pipeline.snapshot import import_snapshot
+        return import_snapshot(path, self, batch_size=batch_size)
 
 
-def embed_texts(model, texts, batch_size=100):
+def embed_texts(model, texts, batch_size=100, cache=None):
     embeddings = []
     for i in range(0, len(texts), batch_size):
         batch = texts[i:i + batch_size]
-        emb = model.encode(
+        emb = encode_with_cache(
+            model,
             batch,
+            cache=cache,
             show_progress_bar=True,
             convert_to_numpy=True,
             normalize_embeddings=True
         )
         embeddings.append(emb)
+    if cache is not None:
+        cache.flush()
+        print(f"Embedding cache: {cache.stats()}")
     return np.vstack(embeddings)
 
 
-def batch_add_documents(store, texts, metadatas, ids, embeddings, batch_size=500):
+def batch_add_documents(store, texts, metadatas, ids, embeddings, batch_size=500, upsert=False):
     total = len(texts)
+    write = store.upsert_documents if upsert else store.add_documents
     for start_idx in range(0, total, batch_size):
         end_idx = min(start_idx + batch_size, total)
         print(f"Adding batch {start_idx} to {end_idx} of {total}...")
-        store.add_documents(
+        write(
             texts[start_idx:end_idx],
             metadatas=metadatas[start_idx:end_idx],
             ids=ids[start_idx:end_idx],
@@ -69,19 +115,31 @@ def batch_add_documents(store, texts, metadatas, ids, embeddings, batch_size=500
 
 if __name__ == "__main__":
     from scripts.embedding_pipeline.embedding import load_embedding_model, embed_texts as custom_embed
-    from scripts.embedding_pipeline.chunking import chunk_texts
+    from scripts.embedding_pipeline.fast_chunking import chunk_texts
+    from scripts.embedding_pipeline.indexer import make_chunk_id
+    from scripts.embedding_pipeline.embedding_cache import EmbeddingCache, cache_model_name
+    from scripts.data_processing.metadata import frame_metadata
 
     # Load and sample data
     df = pd.read_csv("Data/processed/filtered_complaints.csv")
     df = df.sample(n=1000, random_state=42)
+    df = df.dropna(subset=["Cleaned Narrative"])
 
     # Chunk narratives
-    texts = df["Cleaned Narrative"].dropna().tolist()
+    texts = df["Cleaned Narrative"].tolist()
+    complaint_ids = df["Complaint ID"].astype(str).tolist()
     chunks = chunk_texts(texts)
 
-    chunk_texts_only = [chunk["text"] for chunk in chunks]
-    metadatas = [{"source_index": chunk["source_index"]} for chunk in chunks]
-    ids = [str(i) for i in range(len(chunks))]
+    # Stable content-addressed ids; for nightly refreshes use scripts.embedding_pipeline.indexer
+    chunks = list({make_chunk_id(complaint_ids[c["source_index"]], c["text"]): c for c in chunks}.items())
+    ids = [chunk_id for chunk_id, _ in chunks]
+    chunk_texts_only = [chunk["text"] for _, chunk in chunks]
+    row_metadata = frame_metadata(df)
+    metadatas = [
+        {**row_metadata[chunk["source_index"]], "source_index": chunk["source_index"],
+         "complaint_id": complaint_ids[chunk["source_index"]]}
+        for _, chunk in chunks
+    ]
 
     # Load embedding model 
     try:
@@ -93,7 +151,8 @@ if __name__ == "__main__":
     # Generate embeddings
     try:
         print(f"Embedding {len(chunk_texts_only)} chunks...")
-        embeddings = embed_texts(model, chunk_texts_only, batch_size=100)
+        cache = EmbeddingCache(model_name=cache_model_name(model, "sentence-transformers/all-MiniLM-L6-v2"))
+        embeddings = embed_texts(model, chunk_texts_only, batch_size=100, cache=cache)
         print(f" Embeddings created. Shape: {embeddings.shape}")
     except Exception as e:
         print("Embedding failed:", e)
@@ -105,7 +164,7 @@ if __name__ == "__main__":
         embedding_function=None
     )
 
-    batch_add_documents(store, chunk_texts_only, metadatas, ids, embeddings, batch_size=500)
+    batch_add_documents(store, chunk_texts_only, metadatas, ids, embeddings, batch_size=500, upsert=True)
 
     # No error: just a notification now
     store.persist()
@@ -0,0 +1,208 @@
+import os
+import json
+import atexit
+import threading
+import time
+import numpy as np
+
+from scripts.embedding_pipeline.index_backends import INDEX_VERSION_NAME, read_index_version
+
+
+class SemanticAnswerCache:
+    """
+    Cache of (answer, sources) keyed by query embedding and product filter.
+
+    A question whose normalized embedding has cosine similarity of at least
+    `threshold` with a cached question for the same product and top_k gets
+    the cached result. Entries expire after `ttl_seconds`; beyond
+    `max_entries` the least recently used are evicted. The whole cache is
+    dropped when the vector index version changes (see
+    `index_backends.bump_index_version`), and it is persisted in
+    `cache_dir` so it survives restarts.
+
+    With `autosave`, changes are written by a background timer at most once
+    every `save_interval` seconds (and on interpreter exit), so `store` never
+    waits on disk I/O.
+    """
+
+    def __init__(self, cache_dir="vector_store/answer_cache", index_dir="vector_store/chromadb",
+                 threshold=0.92, ttl_seconds=24 * 3600, max_entries=2000, autosave=True, save_interval=5.0):
+        self.cache_dir = cache_dir
+        self.index_dir = index_dir
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.autosave = autosave
+        self.save_interval = save_interval
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._save_timer = None
+        self._dirty = False
+        self._entries = []
+        self._embeddings = None
+        self._index_mtime = None
+        self.index_version = None
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.seconds_saved = 0.0
+        self._load()
+        if autosave:
+            atexit.register(self.flush)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _path(self):
+        return os.path.join(self.cache_dir, "answer_cache.npz")
+
+    def _load(self):
+        path = self._path()
+        self._check_index_version()
+        if not os.path.exists(path):
+            return
+        with np.load(path, allow_pickle=False) as data:
+            saved = json.loads(data["state"].tobytes().decode("utf-8"))
+            embeddings = data["embeddings"]
+        if saved.get("index_version") != self.index_version:
+            return
+        if len(saved["entries"]) != len(embeddings):
+            print(f"Answer cache in {self.cache_dir} is inconsistent; starting empty.")
+            return
+        self._entries = saved["entries"]
+        self._embeddings = embeddings if self._entries else None
+        self._expire(time.time())
+
+    def save(self):
+        """Atomically write the cache to `cache_dir` (entries and embeddings in one file)."""
+        with self._save_lock:
+            with self._lock:
+                entries = [dict(e) for e in self._entries]
+                embeddings = self._embeddings
+                index_version = self.index_version
+                self._dirty = False
+            os.makedirs(self.cache_dir, exist_ok=True)
+            path = self._path()
+            state = json.dumps({"index_version": index_version, "entries": entries}).encode("utf-8")
+            with open(path + ".tmp", "wb") as f:
+                np.savez(f, state=np.frombuffer(state, dtype=np.uint8),
+                         embeddings=embeddings if embeddings is not None else np.zeros((0, 0), dtype=np.float32))
+            os.replace(path + ".tmp", path)
+
+    def _schedule_save(self):
+        with self._lock:
+            self._dirty = True
+            if self._save_timer is not None:
+                return
+            self._save_timer = threading.Timer(self.save_interval, self._timed_save)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def _timed_save(self):
+        with self._lock:
+            self._save_timer = None
+        self.save()
+
+    def flush(self):
+        """Write pending changes now instead of waiting for the autosave timer."""
+        with self._lock:
+            timer, self._save_timer = self._save_timer, None
+            dirty = self._dirty
+        if timer is not None:
+            timer.cancel()
+        if dirty:
+            self.save()
+
+    def _check_index_version(self):
+        """Clear the cache if the index changed since it was filled (one stat() per call)."""
+        path = os.path.join(self.index_dir, INDEX_VERSION_NAME)
+        mtime = os.path.getmtime(path) if os.path.exists(path) else None
+        if mtime == self._index_mtime and self.index_version is not None:
+            return
+        self._index_mtime = mtime
+        version = read_index_version(self.index_dir)
+        if version != self.index_version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries, self._embeddings = [], None
+            self.index_version = version
+
+    def _remove(self, keep):
+        self._entries = [e for e, k in zip(self._entries, keep) if k]
+        self._embeddings = self._embeddings[keep] if self._entries else None
+
+    def _expire(self, now):
+        if not self._entries:
+            return
+        keep = np.array([now - e["created"] < self.ttl_seconds for e in self._entries], dtype=bool)
+        if not keep.all():
+            self._remove(keep)
+
+    def lookup(self, embedding, product="All", top_k=5):
+        """
+        Returns:
+            Tuple[str, List[str]] or None: Cached (answer, sources) of the most
+            similar cached question, if it is similar enough.
+        """
+        query = np.asarray(embedding, dtype=np.float32)
+        with self._lock:
+            self._check_index_version()
+            now = time.time()
+            self._expire(now)
+            best, best_score = None, self.threshold
+            if self._entries:
+                scores = self._embeddings @ query
+                for i in np.argsort(-scores):
+                    if scores[i] < best_score:
+                        break
+                    entry = self._entries[i]
+                    if entry["product"] == product and entry["top_k"] == top_k:
+                        best = entry
+                        break
+            if best is None:
+                self.misses += 1
+                return None
+            best["last_used"] = now
+            best["hits"] += 1
+            self.hits += 1
+            self.seconds_saved += best["seconds"]
+            return best["answer"], list(best["sources"])
+
+    def store(self, embedding, product, top_k, answer, sources, seconds=0.0):
+        """Add a freshly generated result; `seconds` is what producing it cost."""
+        vector = np.asarray(embedding, dtype=np.float32).reshape(1, -1)
+        now = time.time()
+        with self._lock:
+            self._check_index_version()
+            self._entries.append({"product": product, "top_k": top_k, "answer": answer,
+                                  "sources": list(sources), "seconds": float(seconds),
+                                  "created": now, "last_used": now, "hits": 0})
+            self._embeddings = vector if self._embeddings is None else np.vstack([self._embeddings, vector])
+            self._expire(now)
+            if len(self._entries) > self.max_entries:
+                # Least recently used go first
+                order = np.argsort([e["last_used"] for e in self._entries])
+                keep = np.ones(len(self._entries), dtype=bool)
+                keep[order[:len(self._entries) - self.max_entries]] = False
+                self._remove(keep)
+        if self.autosave:
+            self._schedule_save()
+
+    def clear(self):
+        with self._lock:
+            self._entries, self._embeddings = [], None
+        if self.autosave:
+            self._schedule_save()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "seconds_saved": round(self.seconds_saved, 3),
+            "invalidations": self.invalidations,
+            "index_version": self.index_version,
+        }
@@ -0,0 +1,121 @@
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from scripts.rag_pipeline.telemetry import telemetry
+
+_STOP = object()
+
+
+class MicroBatcher:
+    """
+    Turns concurrent single-item calls into batched calls of `handler`.
+
+    Callers `submit` items from any thread. One dispatcher thread takes the
+    first queued item, keeps collecting for up to `max_wait_ms` or until
+    `max_batch_size` items, calls `handler(items)` once and resolves each
+    caller's future with its own result. While a batch runs, new items
+    queue up, so batches grow with load and a lone request only waits
+    `max_wait_ms`.
+
+    `handler` must return one result per item, in order; if it raises,
+    every caller in the batch gets the exception.
+    """
+
+    def __init__(self, handler, max_batch_size=32, max_wait_ms=5.0, name="batcher"):
+        self.handler = handler
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.name = name
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+        self.recent_sizes = deque(maxlen=1000)
+        telemetry.gauge("rag_batcher_queue_depth", self.queue_depth, batcher=name)
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name=f"{self.name}-dispatch", daemon=True)
+                    self._thread.start()
+
+    def submit(self, item):
+        """Queue one item; returns a Future for its result."""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((item, future, time.perf_counter()))
+        return future
+
+    def __call__(self, item, timeout=None):
+        """Submit one item and wait for its result."""
+        return self.submit(item).result(timeout)
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            batch = [first]
+            deadline = time.perf_counter() + self.max_wait
+            stopping = False
+            while len(batch) < self.max_batch_size:
+                try:
+                    entry = self._queue.get(timeout=max(0.0, deadline - time.perf_counter()))
+                except queue.Empty:
+                    break
+                if entry is _STOP:
+                    stopping = True
+                    break
+                batch.append(entry)
+            self._dispatch(batch)
+            if stopping:
+                return
+
+    def _dispatch(self, batch):
+        start = time.perf_counter()
+        for _, _, queued in batch:
+            telemetry.observe("rag_batch_wait_seconds", start - queued, batcher=self.name)
+        items = [item for item, _, _ in batch]
+        try:
+            results = self.handler(items)
+            if len(results) != len(items):
+                raise RuntimeError(f"{self.name}: handler returned {len(results)} results for {len(items)} items")
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+        else:
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
+        self.batches += 1
+        self.items += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        self.recent_sizes.append(len(batch))
+        telemetry.observe("rag_batch_size", len(batch), batcher=self.name)
+
+    def stats(self):
+        """Batches run, items served, mean / largest batch size and current queue depth."""
+        recent = list(self.recent_sizes)
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "recent_mean_batch_size": round(sum(recent) / len(recent), 2) if recent else 0.0,
+            "largest_batch": self.largest_batch,
+            "queue_depth": self.queue_depth(),
+        }
+
+    def close(self):
+        """Serve what is queued, then stop the dispatcher thread."""
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
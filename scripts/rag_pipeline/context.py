@@ -0,0 +1,187 @@
+import numpy as np
+
+from scripts.rag_pipeline.startup import LazyResource
+
+
+class TokenCounter:
+    """
+    Counts tokens with the generation model's tokenizer.
+
+    `model_name` is a local tokenizer directory (or an already downloaded Hub
+    name); it is loaded on first use from local files only, so workers never
+    download at request time. Without one, or if it cannot be loaded, counts
+    fall back to ~4 characters per token.
+    """
+
+    def __init__(self, model_name=None):
+        self.model_name = model_name
+        self._tokenizer = LazyResource("context tokenizer", self._load)
+
+    def _load(self):
+        if self.model_name is None:
+            return None
+        try:
+            from transformers import AutoTokenizer
+            return AutoTokenizer.from_pretrained(self.model_name, local_files_only=True)
+        except Exception as e:
+            print(f"Tokenizer for {self.model_name} unavailable ({e}); estimating tokens from length.")
+            return None
+
+    def count(self, text):
+        return self.count_many([text])[0]
+
+    def count_many(self, texts):
+        tokenizer = self._tokenizer.get()
+        if tokenizer is None:
+            return [max(1, round(len(t) / 4)) for t in texts]
+        return [len(ids) for ids in tokenizer(list(texts), add_special_tokens=False)["input_ids"]]
+
+    def truncate(self, text, max_tokens):
+        tokenizer = self._tokenizer.get()
+        if tokenizer is None:
+            return text[:max_tokens * 4]
+        ids = tokenizer(text, add_special_tokens=False)["input_ids"][:max_tokens]
+        return tokenizer.decode(ids)
+
+
+def merge_text(first, second, max_overlap=200):
+    """Join two consecutive chunks, dropping the longest suffix of `first` that starts `second`."""
+    for k in range(min(len(first), len(second), max_overlap), 0, -1):
+        if first.endswith(second[:k]):
+            return first + second[k:]
+    return first + " " + second
+
+
+def merge_adjacent(candidates, max_overlap=200):
+    """
+    Merge consecutive chunks (chunk_index n and n + 1) of the same complaint
+    into one passage, and drop exact duplicate texts.
+
+    A merged passage keeps the best score and the normalized mean embedding
+    of its parts. Passages are returned best score first.
+    """
+    passages, seen_texts = [], set()
+    by_complaint = {}
+    for candidate in candidates:
+        key = " ".join(candidate["text"].split())
+        if key in seen_texts:
+            continue
+        seen_texts.add(key)
+        metadata = candidate.get("metadata") or {}
+        complaint_id, chunk_index = metadata.get("complaint_id"), metadata.get("chunk_index")
+        if complaint_id is None or chunk_index is None:
+            passages.append({**candidate, "ids": [candidate["id"]]})
+            continue
+        by_complaint.setdefault(complaint_id, []).append(candidate)
+
+    for parts in by_complaint.values():
+        parts.sort(key=lambda c: c["metadata"]["chunk_index"])
+        run = [parts[0]]
+        for part in parts[1:]:
+            if part["metadata"]["chunk_index"] == run[-1]["metadata"]["chunk_index"] + 1:
+                run.append(part)
+            else:
+                passages.append(_merge_run(run, max_overlap))
+                run = [part]
+        passages.append(_merge_run(run, max_overlap))
+
+    passages.sort(key=lambda p: -p["score"])
+    return passages
+
+
+def _merge_run(run, max_overlap):
+    text = run[0]["text"]
+    for part in run[1:]:
+        text = merge_text(text, part["text"], max_overlap)
+    embedding = np.mean([np.asarray(p["embedding"], dtype=np.float32) for p in run], axis=0)
+    embedding /= max(float(np.linalg.norm(embedding)), 1e-12)
+    best = max(run, key=lambda p: p["score"])
+    return {"id": best["id"], "ids": [p["id"] for p in run], "text": text, "metadata": best["metadata"],
+            "score": best["score"], "embedding": embedding}
+
+
+def mmr(query, embeddings, k, lambda_mult=0.7):
+    """
+    Maximal marginal relevance: repeatedly pick the passage maximizing
+    lambda * sim(query, p) - (1 - lambda) * max sim(p, already picked).
+
+    Returns:
+        List[int]: Indices into `embeddings`, in pick order.
+    """
+    if len(embeddings) == 0:
+        return []
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    relevance = vectors @ np.asarray(query, dtype=np.float32)
+    similarity = vectors @ vectors.T
+    picked = [int(np.argmax(relevance))]
+    redundancy = similarity[picked[0]].copy()
+    while len(picked) < min(k, len(vectors)):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[picked] = -np.inf
+        best = int(np.argmax(scores))
+        picked.append(best)
+        redundancy = np.maximum(redundancy, similarity[best])
+    return picked
+
+
+class ContextBuilder:
+    """
+    Turns retrieved chunks into the prompt context.
+
+    The `candidate_factor * top_k` retrieved chunks are first merged:
+    neighbouring chunks of the same complaint become one passage, so their
+    overlap is sent once and MMR doesn't discard them as redundant with each
+    other. Merged passages are re-scored against the query with their mean
+    embedding, MMR picks `top_k` relevant but mutually different passages,
+    and these are packed in pick order until `token_budget` tokens (measured
+    with the LLM's tokenizer from `tokenizer_name`, else estimated from
+    length) are used.
+    """
+
+    def __init__(self, token_budget=1200, mmr_lambda=0.7, candidate_factor=3,
+                 tokenizer_name=None, max_overlap=200, separator="\n\n"):
+        self.token_budget = token_budget
+        self.mmr_lambda = mmr_lambda
+        self.candidate_factor = candidate_factor
+        self.max_overlap = max_overlap
+        self.separator = separator
+        self.token_counter = TokenCounter(tokenizer_name)
+
+    def build(self, query_embedding, candidates, top_k=5):
+        """
+        Args:
+            query_embedding: Normalized query vector.
+            candidates (List[dict]): Retrieved chunks, best first, with "id", "text",
+                "metadata", "score" and normalized "embedding".
+            top_k (int): Maximum number of passages in the context.
+
+        Returns:
+            dict: "context" (str), "sources" (List[str]), "tokens" used,
+                  "baseline_tokens" (plain join of the top_k chunks) and "tokens_saved".
+        """
+        baseline = self.separator.join(c["text"] for c in candidates[:top_k])
+        query_vector = np.asarray(query_embedding, dtype=np.float32)
+        passages = merge_adjacent(candidates, self.max_overlap)
+        for passage in passages:
+            if len(passage["ids"]) > 1:
+                passage["score"] = float(passage["embedding"] @ query_vector)
+        order = mmr(query_vector, [p["embedding"] for p in passages], top_k, self.mmr_lambda)
+        picked = [passages[i] for i in order]
+
+        counts = self.token_counter.count_many([baseline] + [p["text"] for p in picked])
+        baseline_tokens, passage_tokens = counts[0], counts[1:]
+        separator_tokens = self.token_counter.count(self.separator) if picked else 0
+
+        sources, used = [], 0
+        for passage, tokens in zip(picked, passage_tokens):
+            cost = tokens + (separator_tokens if sources else 0)
+            if used + cost > self.token_budget:
+                if sources:
+                    continue
+                # Always keep the best passage, trimmed to the budget
+                passage = {**passage, "text": self.token_counter.truncate(passage["text"], self.token_budget)}
+                cost = min(tokens, self.token_budget)
+            sources.append(passage["text"])
+            used += cost
+        return {"context": self.separator.join(sources), "sources": sources, "tokens": used,
+                "baseline_tokens": baseline_tokens, "tokens_saved": baseline_tokens - used}
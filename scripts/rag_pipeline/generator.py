@@ -1,40 +1,135 @@
 import os
-from huggingface_hub import InferenceClient
-from langchain.prompts import PromptTemplate
+import asyncio
 
-hf_token = os.getenv("HUGGINGFACEHUB_API_TOKEN")
-if not hf_token:
-    raise ValueError("HUGGINGFACEHUB_API_TOKEN not set!")
-
-print("Token loaded")
-
-client = InferenceClient(token=hf_token)
+from scripts.rag_pipeline.startup import LazyResource
 
 # Use a public chat-capable model
 chat_model = "mistralai/Mistral-7B-Instruct-v0.2"
 
-prompt_template = PromptTemplate(
-    input_variables=["context", "question"],
-    template=(
-        "Context:\n{context}\n\n"
-        "User: {question}\n"
-        "Assistant:"
+
+def get_hf_token():
+    hf_token = os.getenv("HUGGINGFACEHUB_API_TOKEN")
+    if not hf_token:
+        raise ValueError("HUGGINGFACEHUB_API_TOKEN not set!")
+    return hf_token
+
+
+def get_llm_base_url():
+    # Optional OpenAI-compatible endpoint (e.g. scripts/benchmarks/mock_llm_server.py)
+    return os.getenv("LLM_BASE_URL") or None
+
+
+def _create_client():
+    from huggingface_hub import InferenceClient
+    return InferenceClient(token=get_hf_token(), base_url=get_llm_base_url())
+
+
+def _create_prompt_template():
+    from langchain.prompts import PromptTemplate
+    return PromptTemplate(
+        input_variables=["context", "question"],
+        template=(
+            "Context:\n{context}\n\n"
+            "User: {question}\n"
+            "Assistant:"
+        )
     )
-)
+
+
+# Created on first use, so importing this module is cheap and has no side effects
+client = LazyResource("LLM client", _create_client)
+prompt_template = LazyResource("prompt template", _create_prompt_template)
+
+
+def build_prompt(context: str, question: str) -> str:
+    return prompt_template.get().format(context=context, question=question)
+
 
 def generate_answer(context: str, question: str) -> str:
-    prompt = prompt_template.format(context=context, question=question)
-    resp = client.chat.completions.create(
+    prompt = build_prompt(context, question)
+    resp = client.get().chat.completions.create(
         model=chat_model,
         messages=[{"role": "user", "content": prompt}],
         max_tokens=150
     )
     return resp.choices[0].message["content"]
 
+def stream_answer(context: str, question: str, max_tokens: int = 150):
+    """Yield answer tokens as the LLM produces them."""
+    prompt = build_prompt(context, question)
+    stream = client.get().chat.completions.create(
+        model=chat_model,
+        messages=[{"role": "user", "content": prompt}],
+        max_tokens=max_tokens,
+        stream=True
+    )
+    for chunk in stream:
+        token = chunk.choices[0].delta.content if chunk.choices else None
+        if token:
+            yield token
+
+
+class AsyncAnswerGenerator:
+    """
+    Non-blocking counterpart of `generate_answer`.
+
+    One AsyncInferenceClient (and so one pooled HTTP connection pool) is
+    shared by all requests; every call has a timeout, and at most
+    `max_concurrency` completions are in flight at once. Create and use it
+    from a single event loop.
+    """
+
+    def __init__(self, base_url=None, token=None, timeout=None, max_concurrency=None, model=chat_model):
+        self.model = model
+        self.timeout = timeout or float(os.getenv("LLM_TIMEOUT", "60"))
+        from huggingface_hub import AsyncInferenceClient
+
+        self.client = AsyncInferenceClient(
+            token=token or get_hf_token(),
+            base_url=base_url or get_llm_base_url(),
+            timeout=self.timeout
+        )
+        self.semaphore = asyncio.Semaphore(max_concurrency or int(os.getenv("LLM_MAX_CONCURRENCY", "16")))
+
+    async def generate(self, context: str, question: str, max_tokens: int = 150) -> str:
+        prompt = build_prompt(context, question)
+        async with self.semaphore:
+            resp = await asyncio.wait_for(
+                self.client.chat.completions.create(
+                    model=self.model,
+                    messages=[{"role": "user", "content": prompt}],
+                    max_tokens=max_tokens
+                ),
+                timeout=self.timeout
+            )
+        return resp.choices[0].message["content"]
+
+    async def stream(self, context: str, question: str, max_tokens: int = 150):
+        """Async iterator over answer tokens; holds a concurrency slot until the stream ends."""
+        prompt = build_prompt(context, question)
+        async with self.semaphore:
+            stream = await asyncio.wait_for(
+                self.client.chat.completions.create(
+                    model=self.model,
+                    messages=[{"role": "user", "content": prompt}],
+                    max_tokens=max_tokens,
+                    stream=True
+                ),
+                timeout=self.timeout
+            )
+            async for chunk in stream:
+                token = chunk.choices[0].delta.content if chunk.choices else None
+                if token:
+                    yield token
+
+    async def aclose(self):
+        await self.client.close()
+
+
 if __name__ == "__main__":
     ctx = (
         "The Consumer Financial Protection Bureau (CFPB) collects complaint data "
         "related to financial products and services in the United States."
     )
     q = "What is the role of the CFPB?"
-    print("Answer:", generate_answer(ctx, q))
\ No newline at end of file
+    print("Answer:", generate_answer(ctx, q))
@@ -1,40 +1,396 @@
-from scripts.rag_pipeline.retriever import ComplaintRetriever
-from scripts.rag_pipeline.generator import generate_answer
+import os
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from scripts.rag_pipeline.retriever import ComplaintRetriever, normalize_query
+from scripts.rag_pipeline import generator
+from scripts.rag_pipeline.generator import generate_answer, stream_answer, AsyncAnswerGenerator
+from scripts.rag_pipeline.answer_cache import SemanticAnswerCache
+from scripts.rag_pipeline.context import ContextBuilder
+from scripts.rag_pipeline.startup import report as startup_report
+from scripts.rag_pipeline.telemetry import telemetry
+from scripts.rag_pipeline.batching import MicroBatcher
 
 
 class ComplaintRAGPipeline:
     def __init__(
         self,
         embedding_model_name="sentence-transformers/all-MiniLM-L6-v2",
-        vector_store_path="vector_store/chromadb"
+        vector_store_path="vector_store/chromadb",
+        snapshot_path=None,
+        shard_dir=None,
+        backend=None,
+        lexical_index_path=None,
+        retrieval_mode="dense",
+        two_stage=False,
+        embedding_backend=None,
+        retriever=None,
+        retrieval_workers=8,
+        answer_cache=None,
+        context_builder=None,
+        assemble_context=True
     ):
-        # Initialize the retriever with embedding model and vector DB path
-        self.retriever = ComplaintRetriever(
-            embedding_model_name=embedding_model_name,
-            vector_store_path=vector_store_path
-        )
+        if retriever is not None:
+            self.retriever = retriever
+        else:
+            # Optional BM25 index enables hybrid (lexical + dense) retrieval
+            lexical_index = None
+            if lexical_index_path:
+                from scripts.embedding_pipeline.bm25_index import BM25Index
+                lexical_index = BM25Index(lexical_index_path)
+
+            # Initialize the retriever with embedding model and vector DB path (or an explicit index backend)
+            self.retriever = ComplaintRetriever(
+                embedding_model_name=embedding_model_name,
+                vector_store_path=vector_store_path,
+                snapshot_path=snapshot_path,
+                shard_dir=shard_dir,
+                backend=backend,
+                lexical_index=lexical_index,
+                mode=retrieval_mode,
+                two_stage=two_stage,
+                embedding_backend=embedding_backend
+            )
+
+        # Async path: retrieval runs on this pool, generation on a pooled async client
+        self._retrieval_executor = ThreadPoolExecutor(max_workers=retrieval_workers, thread_name_prefix="retrieval")
+        self._async_generator = None
+        self._inflight = {}
+
+        # Time to first token (seconds from request start) of recent streaming requests,
+        # and time to the whole answer of recent non-streaming ones
+        self.ttft_history = deque(maxlen=1000)
+        self.answer_history = deque(maxlen=1000)
+
+        # Optional SemanticAnswerCache: near-duplicate questions skip retrieval and the LLM
+        self.answer_cache = answer_cache
+
+        # Context assembly: merge overlapping chunks, MMR, token-budgeted packing
+        if context_builder is None and assemble_context and hasattr(self.retriever, "retrieve_candidates_many"):
+            # CONTEXT_TOKENIZER: local copy of the LLM's tokenizer (token counts are estimated without it)
+            context_builder = ContextBuilder(tokenizer_name=os.getenv("CONTEXT_TOKENIZER"))
+        self.context_builder = context_builder
+        self.context_history = deque(maxlen=1000)
+
+        # Micro-batching of query encoding and search across concurrent requests (see enable_micro_batching)
+        self.embedding_batcher = None
+        self.retrieval_batcher = None
+
+        # Models, index and LLM client load lazily; `ready` is set once warm_up has run
+        self.ready = threading.Event()
+        self.warmup_error = None
+
+    def warm_up(self, background=False):
+        """
+        Load the embedding model, the vector index and the LLM client, and run
+        a dummy query, so the first real request does not pay for it.
+
+        With background=True this runs on a daemon thread (returned) and the
+        caller can serve immediately; `ready` is set when it succeeds.
+        """
+        if background:
+            thread = threading.Thread(target=self.warm_up, name="warm-up", daemon=True)
+            thread.start()
+            return thread
+        try:
+            with startup_report.timed("pipeline warm-up", kind="warm-up"):
+                if hasattr(self.retriever, "warm_up"):
+                    self.retriever.warm_up()
+                generator.prompt_template.get()
+                generator.client.get()
+                if self.context_builder is not None:
+                    self.context_builder.token_counter.count("warm up")
+            self.ready.set()
+        except Exception as e:
+            # Requests still work (and will retry the failed component lazily)
+            self.warmup_error = e
+            print(f"Warm-up failed: {e}")
+        return None
+
+    def enable_micro_batching(self, max_batch_size=32, max_wait_ms=5.0):
+        """
+        Serve query encoding and retrieval of concurrent requests in batches:
+        one encode call and one multi-query search per batch (see MicroBatcher).
+        Generation still runs per request.
+        """
+        self.embedding_batcher = MicroBatcher(self.retriever.embed_queries, max_batch_size, max_wait_ms,
+                                              name="embedding")
+        self.retrieval_batcher = MicroBatcher(self._retrieve_batch, max_batch_size, max_wait_ms,
+                                              name="retrieval")
+
+    def batching_stats(self):
+        if self.retrieval_batcher is None:
+            return None
+        return {"embedding": self.embedding_batcher.stats(), "retrieval": self.retrieval_batcher.stats()}
+
+    def _cache_lookup(self, question, product, top_k):
+        """Returns (query embedding, cached (answer, sources) or None); (None, None) without a cache."""
+        if self.answer_cache is None:
+            return None, None
+        if self.embedding_batcher is not None:
+            embedding = self.embedding_batcher(question)
+        else:
+            embedding = self.retriever.embed_query(question)
+        with telemetry.span("answer_cache_lookup"):
+            return embedding, self.answer_cache.lookup(embedding, product=product, top_k=top_k)
+
+    def _retrieve_context(self, question, product, top_k):
+        """
+        Retrieve chunks and build the prompt context.
+
+        Returns:
+            Tuple[str, List[str]]: The context and the source passages it contains.
+        """
+        with telemetry.span("retrieve"):
+            if self.retrieval_batcher is not None:
+                # Includes the wait for the batch; its stages are timed on the dispatcher thread
+                retrieved = self.retrieval_batcher((question, product, top_k))
+            else:
+                retrieved = self._retrieve_batch([(question, product, top_k)])[0]
+        if self.context_builder is None:
+            return "\n\n".join(retrieved), retrieved
+        query_embedding, candidates = retrieved
+        with telemetry.span("build_context"):
+            built = self.context_builder.build(query_embedding, candidates, top_k=top_k)
+        self.context_history.append((built["tokens"], built["tokens_saved"]))
+        return built["context"], built["sources"]
+
+    def retrieve_sources(self, question: str, product: str = "All", top_k: int = 5):
+        """Source passages an answer would be built from, without calling the LLM."""
+        return self._retrieve_context(question, product, top_k)[1]
+
+    def _retrieve_batch(self, requests):
+        """
+        Retrieval for a batch of (question, product, top_k): one search per
+        distinct (product, top_k). Returns, per request, the chunks or,
+        with a context builder, (query embedding, candidates).
+        """
+        groups = {}
+        for i, (question, product, top_k) in enumerate(requests):
+            groups.setdefault((product, top_k), []).append(i)
+        results = [None] * len(requests)
+        for (product, top_k), positions in groups.items():
+            filter_dict = {} if product == "All" else {"product": product}
+            questions = [requests[i][0] for i in positions]
+            if self.context_builder is None:
+                retrieved = self.retriever.retrieve_many(questions, top_k=top_k, filters=filter_dict)
+            else:
+                retrieved = self.retriever.retrieve_candidates_many(
+                    questions, n_candidates=top_k * self.context_builder.candidate_factor, filters=filter_dict
+                )
+            for i, result in zip(positions, retrieved):
+                results[i] = result
+        return results
+
+    def _cache_store(self, embedding, product, top_k, answer, sources, start):
+        if embedding is not None and answer:
+            self.answer_cache.store(embedding, product, top_k, answer, sources,
+                                    seconds=time.perf_counter() - start)
 
     def ask(self, question, top_k=5):
         # Basic ask method (no filtering)
-        retrieved_chunks = self.retriever.retrieve(query_text=question, top_k=top_k)
-        context = "\n\n".join(retrieved_chunks)
+        context, _ = self._retrieve_context(question, "All", top_k)
         answer = generate_answer(context=context, question=question)
         return answer
 
-    def ask_with_sources(self, question: str, product: str = "All", top_k: int = 5):
+    def ask_with_sources(self, question: str, product: str = "All", top_k: int = 5, return_trace: bool = False):
         """
         Enhanced method: supports product filtering and returns both answer + source chunks
-        """
-        filter_dict = {} if product == "All" else {"product": product}
-        retrieved_chunks = self.retriever.retrieve(query_text=question, top_k=top_k, filters=filter_dict)
 
-        context = "\n\n".join(retrieved_chunks)
-        answer = generate_answer(context=context, question=question)
+        With `return_trace=True` a third item is returned: the request's
+        per-stage timings (see telemetry.Trace.as_dict), or None while
+        telemetry is disabled.
+        """
+        with telemetry.trace("ask_with_sources") as trace:
+            answer, retrieved_chunks = self._ask_with_sources(question, product, top_k)
+        if return_trace:
+            return answer, retrieved_chunks, trace.as_dict() if trace is not None else None
         return answer, retrieved_chunks  # Returning both
 
+    def _ask_with_sources(self, question, product, top_k):
+        start = time.perf_counter()
+        embedding, cached = self._cache_lookup(question, product, top_k)
+        if cached is not None:
+            self._record_answer(start, cached=True)
+            return cached
+
+        context, retrieved_chunks = self._retrieve_context(question, product, top_k)
+        with telemetry.span("generate"):
+            answer = generate_answer(context=context, question=question)
+        self._record_answer(start, cached=False)
+        self._cache_store(embedding, product, top_k, answer, retrieved_chunks, start)
+        return answer, retrieved_chunks
+
+    def ask_streaming(self, question: str, product: str = "All", top_k: int = 5):
+        """
+        Retrieve sources right away and stream the answer.
+
+        Returns:
+            Tuple[List[str], Iterator[str]]: source chunks and an iterator of answer tokens.
+        """
+        start = time.perf_counter()
+        embedding, cached = self._cache_lookup(question, product, top_k)
+        if cached is not None:
+            answer, retrieved_chunks = cached
+            return retrieved_chunks, self._record_ttft(iter([answer]), start)
+
+        context, retrieved_chunks = self._retrieve_context(question, product, top_k)
+        on_done = partial(self._cache_store, embedding, product, top_k, sources=retrieved_chunks, start=start)
+        return retrieved_chunks, self._record_ttft(stream_answer(context=context, question=question), start, on_done)
+
+    def _record_first_token(self, start):
+        ttft = time.perf_counter() - start
+        self.ttft_history.append(ttft)
+        telemetry.observe("rag_time_to_first_token_seconds", ttft)
+
+    def _record_answer(self, start, cached):
+        # Non-streaming answers arrive all at once; kept apart from the streaming TTFT
+        seconds = time.perf_counter() - start
+        self.answer_history.append(seconds)
+        telemetry.observe("rag_answer_seconds", seconds, cached=str(cached).lower())
+
+    def _record_ttft(self, tokens, start, on_done=None):
+        parts = []
+        for token in tokens:
+            if not parts:
+                self._record_first_token(start)
+            parts.append(token)
+            yield token
+        if on_done is not None:
+            on_done(answer="".join(parts))
+
+    @staticmethod
+    def _summary(history):
+        values = sorted(history)
+        if not values:
+            return {"count": 0}
+        pick = lambda q: round(values[min(len(values) - 1, int(q * (len(values) - 1)))] * 1000, 1)
+        return {"count": len(values), "p50_ms": pick(0.5), "p95_ms": pick(0.95)}
+
+    def ttft_summary(self):
+        """p50/p95 time to first token (ms) over recent streaming requests."""
+        return self._summary(self.ttft_history)
+
+    def metrics(self):
+        """
+        Time-to-first-token (streaming) and answer latency (non-streaming)
+        summaries, prompt tokens saved by context assembly, answer cache hit rate.
+        """
+        metrics = {"ttft": self.ttft_summary(), "answer_latency": self._summary(self.answer_history)}
+        if self.context_history:
+            tokens, saved = zip(*self.context_history)
+            metrics["context"] = {"requests": len(tokens), "mean_tokens": round(sum(tokens) / len(tokens), 1),
+                                  "mean_tokens_saved": round(sum(saved) / len(saved), 1),
+                                  "last_tokens_saved": saved[-1]}
+        if self.answer_cache is not None:
+            metrics["answer_cache"] = self.answer_cache.stats()
+        return metrics
+
+    @property
+    def async_generator(self):
+        # Created on first use so it binds to the running event loop
+        if self._async_generator is None:
+            self._async_generator = AsyncAnswerGenerator()
+        return self._async_generator
+
+    async def aask(self, question, top_k=5):
+        answer, _ = await self.aask_with_sources(question, product="All", top_k=top_k)
+        return answer
+
+    async def aask_with_sources(self, question: str, product: str = "All", top_k: int = 5,
+                                return_trace: bool = False):
+        """
+        Async ask_with_sources. Concurrent requests for the same normalized
+        (question, product, top_k) share one retrieval and one LLM call
+        (and, with `return_trace=True`, its trace).
+        """
+        key = (normalize_query(question), product, top_k)
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._aask_with_sources(question, product, top_k))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shield: one caller giving up must not cancel the shared request
+        answer, retrieved_chunks, trace = await asyncio.shield(task)
+        if return_trace:
+            return answer, list(retrieved_chunks), trace
+        return answer, list(retrieved_chunks)
+
+    async def _aretrieve_context(self, question, product, top_k):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._retrieval_executor, telemetry.bind(self._retrieve_context, question, product, top_k)
+        )
+
+    async def _acache_lookup(self, question, product, top_k):
+        if self.answer_cache is None:
+            return None, None
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._retrieval_executor, telemetry.bind(self._cache_lookup, question, product, top_k)
+        )
+
+    async def _acache_store(self, embedding, product, top_k, answer, sources, start):
+        if self.answer_cache is None:
+            return
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._retrieval_executor,
+                                   partial(self._cache_store, embedding, product, top_k, answer, sources, start))
+
+    async def _aask_with_sources(self, question, product, top_k):
+        """Returns (answer, sources, trace dict or None)."""
+        with telemetry.trace("aask_with_sources") as trace:
+            start = time.perf_counter()
+            embedding, cached = await self._acache_lookup(question, product, top_k)
+            if cached is not None:
+                self._record_answer(start, cached=True)
+                answer, retrieved_chunks = cached
+            else:
+                context, retrieved_chunks = await self._aretrieve_context(question, product, top_k)
+                with telemetry.span("generate"):
+                    answer = await self.async_generator.generate(context=context, question=question)
+                self._record_answer(start, cached=False)
+                await self._acache_store(embedding, product, top_k, answer, retrieved_chunks, start)
+        return answer, retrieved_chunks, trace.as_dict() if trace is not None else None
+
+    async def aask_streaming(self, question: str, product: str = "All", top_k: int = 5):
+        """
+        Async ask_streaming: returns the source chunks and an async iterator of answer tokens.
+        """
+        start = time.perf_counter()
+        embedding, cached = await self._acache_lookup(question, product, top_k)
+        if cached is not None:
+            answer, retrieved_chunks = cached
+            return retrieved_chunks, self._arecord_ttft(_aiter([answer]), start)
+
+        context, retrieved_chunks = await self._aretrieve_context(question, product, top_k)
+        on_done = partial(self._cache_store, embedding, product, top_k, sources=retrieved_chunks, start=start)
+        tokens = self.async_generator.stream(context=context, question=question)
+        return retrieved_chunks, self._arecord_ttft(tokens, start, on_done)
+
+    async def _arecord_ttft(self, tokens, start, on_done=None):
+        parts = []
+        async for token in tokens:
+            if not parts:
+                self._record_first_token(start)
+            parts.append(token)
+            yield token
+        if on_done is not None:
+            await asyncio.get_running_loop().run_in_executor(self._retrieval_executor,
+                                                             partial(on_done, answer="".join(parts)))
+
+
+async def _aiter(items):
+    for item in items:
+        yield item
+
 
 if __name__ == "__main__":
     pipeline = ComplaintRAGPipeline()
+    pipeline.answer_cache = SemanticAnswerCache(index_dir=pipeline.retriever.index_dir)
 
     user_question = "Why do customers complain about Buy Now Pay Later?"
     product = "Buy Now, Pay Later (BNPL)"
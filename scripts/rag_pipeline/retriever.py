@@ -1,33 +1,280 @@
 import os
-import pandas as pd
-from sentence_transformers import SentenceTransformer
-from chromadb import PersistentClient
-from chromadb.utils.embedding_functions import SentenceTransformerEmbeddingFunction
+from collections import OrderedDict
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from scripts.embedding_pipeline.index_backends import ChromaBackend, metadata_matches
+from scripts.rag_pipeline.startup import LazyResource
+from scripts.rag_pipeline.telemetry import telemetry
+
+RRF_K = 60
+
+
+def normalize_query(query_text: str) -> str:
+    """Lowercased, whitespace-collapsed query used as the embedding cache key."""
+    return " ".join(query_text.lower().split())
+
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """Fuse ranked id lists: score(id) = sum over lists of 1 / (k + rank)."""
+    scores = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+class QueryEmbeddingCache:
+    """Small thread-safe LRU cache of query embeddings keyed by normalized text."""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
 
 
 class ComplaintRetriever:
-    def __init__(self, embedding_model_name="sentence-transformers/all-MiniLM-L6-v2", vector_store_path="vector_store/chromadb"):
-        # Load sentence embedding model
-        self.embedding_model = SentenceTransformer(embedding_model_name)
+    def __init__(self, embedding_model_name="sentence-transformers/all-MiniLM-L6-v2", vector_store_path="vector_store/chromadb", query_cache_size=1024, backend=None, lexical_index=None, mode="dense", hybrid_candidates=4, two_stage=False, embedding_model=None, embedding_backend=None, snapshot_path=None, shard_dir=None):
+        # The embedding model and the vector index are loaded on first use (or by warm_up),
+        # unless an already loaded model is given
+        self.embedding_model_name = embedding_model_name
+        # "sentence-transformers" (PyTorch) or "onnx" (ONNX_MODEL_DIR export on onnxruntime)
+        self.embedding_backend = embedding_backend or os.getenv("EMBEDDING_BACKEND", "sentence-transformers")
+        self._embedding_model = LazyResource(
+            "embedding model",
+            (lambda: embedding_model) if embedding_model is not None else self._load_embedding_model
+        )
 
-        # Connect to ChromaDB persistent store
-        self.client = PersistentClient(path=vector_store_path)
-        self.collection = self.client.get_collection("complaints_collection")
+        # Vector index: an explicit backend, else local shard worker processes (shard_dir or
+        # INDEX_SHARDS), else a read-only memory-mapped snapshot (snapshot_path or INDEX_SNAPSHOT,
+        # shared by every worker process), else the ChromaDB store
+        self.shard_dir = shard_dir or os.getenv("INDEX_SHARDS")
+        self.snapshot_path = snapshot_path or os.getenv("INDEX_SNAPSHOT")
+        # Directory whose index_version.json tracks the active index (for the answer cache)
+        self.index_dir = self.shard_dir or self.snapshot_path or vector_store_path
+        if backend is not None:
+            load_backend = lambda: backend
+        elif self.shard_dir:
+            load_backend = self._load_shards
+        elif self.snapshot_path:
+            load_backend = self._load_snapshot
+        else:
+            load_backend = lambda: ChromaBackend(persist_directory=vector_store_path, create=False)
+        self._backend = LazyResource("vector index", load_backend)
+
+        # Optional BM25 index for "hybrid" mode (lexical + dense, fused with RRF)
+        if mode == "hybrid" and lexical_index is None:
+            raise ValueError("Hybrid retrieval needs a lexical_index (BM25Index).")
+        self.lexical_index = lexical_index
+        self.mode = mode
+        self.hybrid_candidates = hybrid_candidates
+        # Coarse-to-fine dense search (NumpyIndex with coarse codes only)
+        self.two_stage = two_stage
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="lexical") if lexical_index is not None else None
+
+        # Queries are always encoded here, never by the collection's embedding function
+        self.query_cache = QueryEmbeddingCache(maxsize=query_cache_size)
+
+    def _load_embedding_model(self):
+        if self.embedding_backend == "onnx":
+            from scripts.embedding_pipeline.embedding import load_embedding_model
+            from scripts.embedding_pipeline.onnx_embedding import DEFAULT_ONNX_DIR
+            return load_embedding_model(model_path=os.getenv("ONNX_MODEL_DIR", DEFAULT_ONNX_DIR), backend="onnx")
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(self.embedding_model_name)
+
+    def _load_snapshot(self):
+        from scripts.embedding_pipeline.snapshot import SnapshotIndex
+        return SnapshotIndex(self.snapshot_path, expected_model=self.embedding_model_name)
+
+    def _load_shards(self):
+        from scripts.rag_pipeline.sharding import ShardedIndex
+        return ShardedIndex.launch(self.shard_dir, expected_model=self.embedding_model_name,
+                                   timeout=float(os.getenv("SHARD_TIMEOUT_SECONDS", "2.0")))
+
+    @property
+    def embedding_model(self):
+        return self._embedding_model.get()
+
+    @property
+    def backend(self):
+        return self._backend.get()
+
+    @property
+    def collection(self):
+        return getattr(self.backend, "collection", None)
+
+    def warm_up(self):
+        """Load the model and index now and run one dummy query through both."""
+        vector = self.embedding_model.encode(["warm up"], normalize_embeddings=True)
+        self.backend.query([vector[0].tolist()], top_k=1)
 
     def embed_query(self, query_text: str):
-        return self.embedding_model.encode(query_text, normalize_embeddings=True).tolist()
+        return self.embed_queries([query_text])[0]
+
+    def embed_queries(self, queries):
+        """
+        Encode queries with the loaded model, reusing cached vectors.
 
-    def retrieve(self, query_text: str, top_k: int = 5, filters: dict = None):
+        All cache misses are encoded together in one batched call.
+        """
+        keys = [normalize_query(q) for q in queries]
+        vectors = [self.query_cache.get(k) for k in keys]
+        missing = list(dict.fromkeys(k for k, v in zip(keys, vectors) if v is None))
+        if missing:
+            with telemetry.span("encode_query"):
+                encoded = self.embedding_model.encode(missing, normalize_embeddings=True)
+            fresh = {key: vector.tolist() for key, vector in zip(missing, encoded)}
+            for key, vector in fresh.items():
+                self.query_cache.put(key, vector)
+            vectors = [fresh[k] if v is None else v for k, v in zip(keys, vectors)]
+        return vectors
+
+    def retrieve(self, query_text: str, top_k: int = 5, filters: dict = None, mode: str = None):
         """
         Retrieve top_k most relevant chunks for the query.
         If filters are provided (e.g., {'product': 'Buy Now, Pay Later (BNPL)'}), use them.
         """
-        filters = filters or {}
+        return self.retrieve_many([query_text], top_k=top_k, filters=filters, mode=mode)[0]
 
-        results = self.collection.query(
-            query_texts=[query_text],
-            n_results=top_k,
-            where=filters  # filters by product or other metadata
-        )
+    def retrieve_many(self, queries, top_k: int = 5, filters: dict = None, mode: str = None):
+        """
+        Retrieve top_k chunks for each query with one batched encode and one
+        multi-query search. Returns one list of chunks per query.
+        """
+        if not queries:
+            return []
+        if self._hybrid(mode):
+            return self._retrieve_hybrid(queries, top_k, filters)
+        # Product filters are served from per-product partitions by the backend
+        results = self._dense_query(self.embed_queries(queries), top_k, filters)
+
+        return results["documents"]  # One list of top_k matching chunks per query
+
+    def _hybrid(self, mode):
+        """Whether a call with `mode` (None = the retriever's mode) runs hybrid retrieval."""
+        if (mode or self.mode) != "hybrid":
+            return False
+        if self.lexical_index is None:
+            raise ValueError("Hybrid retrieval needs a lexical_index (BM25Index).")
+        return True
+
+    def _dense_query(self, query_embeddings, top_k, filters, include_embeddings=False):
+        options = {"two_stage": True} if self.two_stage else {}
+        with telemetry.span("vector_search"):
+            results = self.backend.query(query_embeddings, top_k=top_k, filters=filters,
+                                         include_embeddings=include_embeddings, **options)
+        return self._check_partial(results, "query")
+
+    def _get(self, ids, include_embeddings=False):
+        return self._check_partial(self.backend.get(ids, include_embeddings=include_embeddings), "get")
+
+    @staticmethod
+    def _check_partial(results, op):
+        """Count and trace results a ShardedIndex built without some shards (timed out or down)."""
+        failed = results.get("failed_shards")
+        if failed:
+            telemetry.count("rag_partial_results_total", op=op)
+            telemetry.note(f"failed_shards.{op}", list(failed))
+        return results
+
+    def _lexical_search(self, query_text, n_candidates, filters):
+        with telemetry.span("bm25_search"):
+            return self.lexical_index.search(query_text, n_candidates, filters)
+
+    def retrieve_candidates(self, query_text: str, n_candidates: int = 15, filters: dict = None, mode: str = None):
+        """
+        Retrieve chunks with everything context assembly needs.
+
+        Returns:
+            Tuple[List[float], List[dict]]: The query embedding and candidates
+            (best first), each with "id", "text", "metadata", "score" (cosine
+            similarity) and "embedding".
+        """
+        return self.retrieve_candidates_many([query_text], n_candidates=n_candidates, filters=filters, mode=mode)[0]
+
+    def retrieve_candidates_many(self, queries, n_candidates: int = 15, filters: dict = None, mode: str = None):
+        """
+        retrieve_candidates for several queries with one batched encode and
+        one multi-query search. Returns one (embedding, candidates) per query.
+        """
+        if not queries:
+            return []
+        hybrid = self._hybrid(mode)
+        query_embeddings = self.embed_queries(queries)
+        if hybrid:
+            lexical_futures = [
+                self._executor.submit(telemetry.bind(self._lexical_search, q, n_candidates, filters)) for q in queries
+            ]
+            dense = self._dense_query(query_embeddings, n_candidates, filters)
+            results = {key: [] for key in ("ids", "documents", "metadatas", "embeddings")}
+            for i, future in enumerate(lexical_futures):
+                lexical_ids = [chunk_id for chunk_id, _ in future.result()]
+                fused = reciprocal_rank_fusion([dense["ids"][i], lexical_ids])[:n_candidates]
+                stored = self._get(fused, include_embeddings=True)
+                keep = [j for j, metadata in enumerate(stored["metadatas"]) if metadata_matches(metadata, filters)]
+                for key in results:
+                    results[key].append([stored[key][j] for j in keep])
+        else:
+            results = self._dense_query(query_embeddings, n_candidates, filters, include_embeddings=True)
+
+        per_query = []
+        for i, query_embedding in enumerate(query_embeddings):
+            query_vector = np.asarray(query_embedding, dtype=np.float32)
+            candidates = []
+            for chunk_id, text, metadata, embedding in zip(results["ids"][i], results["documents"][i],
+                                                           results["metadatas"][i], results["embeddings"][i]):
+                embedding = np.asarray(embedding, dtype=np.float32)
+                candidates.append({"id": chunk_id, "text": text, "metadata": metadata or {},
+                                   "score": float(embedding @ query_vector), "embedding": embedding})
+            per_query.append((query_embedding, candidates))
+        return per_query
+
+    def _retrieve_hybrid(self, queries, top_k, filters):
+        """
+        Lexical (BM25) and dense search run concurrently and are fused with
+        reciprocal rank fusion. Both legs fetch `hybrid_candidates * top_k`
+        candidates; lexical-only hits are loaded from the backend and checked
+        against the full filters (the BM25 index only applies the product filter).
+        """
+        n_candidates = top_k * self.hybrid_candidates
+        lexical_futures = [self._executor.submit(telemetry.bind(self._lexical_search, q, n_candidates, filters))
+                           for q in queries]
+        dense = self._dense_query(self.embed_queries(queries), n_candidates, filters)
 
-        return results["documents"][0]  # List of top_k matching chunks
\ No newline at end of file
+        all_chunks = []
+        for i, future in enumerate(lexical_futures):
+            lexical_ids = [chunk_id for chunk_id, _ in future.result()]
+            documents = dict(zip(dense["ids"][i], dense["documents"][i]))
+            fused = reciprocal_rank_fusion([dense["ids"][i], lexical_ids])[:2 * top_k]
+            missing = [chunk_id for chunk_id in fused if chunk_id not in documents]
+            if missing:
+                stored = self._get(missing)
+                for chunk_id, document, metadata in zip(stored["ids"], stored["documents"], stored["metadatas"]):
+                    if metadata_matches(metadata, filters):
+                        documents[chunk_id] = document
+            all_chunks.append([documents[chunk_id] for chunk_id in fused if chunk_id in documents][:top_k])
+        return all_chunks
@@ -0,0 +1,456 @@
+import os
+import json
+import time
+import heapq
+import queue
+import socket
+import shutil
+import struct
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, wait
+from multiprocessing.connection import Connection, Listener, answer_challenge, deliver_challenge
+import numpy as np
+
+from scripts.embedding_pipeline.index_backends import VectorIndexBackend, bump_index_version
+from scripts.embedding_pipeline.snapshot import SnapshotIndex, id_hash, iter_store_pages, write_snapshot
+from scripts.rag_pipeline.telemetry import telemetry
+
+SHARDS_MANIFEST = "shards.json"
+SCHEMES = ("hash", "product")
+DEFAULT_SHARD_DIR = "vector_store/shards"
+
+
+def shard_for_id(chunk_id, metadata, n_shards):
+    """Hash shard of a chunk: by complaint, so every chunk of a complaint lands on the same shard."""
+    complaint_id = (metadata or {}).get("complaint_id") or str(chunk_id).split(":", 1)[0]
+    return id_hash(complaint_id) % n_shards
+
+
+def assign_products(counts, n_shards):
+    """Greedy balance: largest product first, onto the shard holding the fewest chunks so far."""
+    loads = [0] * n_shards
+    shard_of = {}
+    for product, count in sorted(counts.items(), key=lambda item: (-item[1], item[0])):
+        shard = loads.index(min(loads))
+        shard_of[product] = shard
+        loads[shard] += count
+    return shard_of
+
+
+class _Spill:
+    """Chunks of one shard (or product) spilled to disk by build_shards: raw float32 vectors and one JSON line each."""
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self._vectors = open(path + ".f32", "wb")
+        self._rows = open(path + ".jsonl", "w", encoding="utf-8")
+
+    def append(self, ids, embeddings, documents, metadatas):
+        np.ascontiguousarray(embeddings, dtype=np.float32).tofile(self._vectors)
+        for row in zip(ids, documents, metadatas):
+            self._rows.write(json.dumps(row) + "\n")
+        self.count += len(ids)
+
+    def close(self):
+        self._vectors.close()
+        self._rows.close()
+
+    def pages(self, dim, page_size):
+        """(ids, embeddings, documents, metadatas) pages in the order they were appended."""
+        vectors = np.memmap(self.path + ".f32", dtype=np.float32, mode="r", shape=(self.count, dim))
+        with open(self.path + ".jsonl", "r", encoding="utf-8") as f:
+            for first in range(0, self.count, page_size):
+                rows = [json.loads(next(f)) for _ in range(min(page_size, self.count - first))]
+                yield ([r[0] for r in rows], np.asarray(vectors[first:first + len(rows)]),
+                       [r[1] for r in rows], [r[2] for r in rows])
+        del vectors
+
+
+def build_shards(source, output_dir=DEFAULT_SHARD_DIR, n_shards=4, scheme="hash", model_name=None,
+                 quantization="float32", partition_key="product", page_size=5000):
+    """
+    Split a vector store into `n_shards` snapshots (see snapshot.export_snapshot).
+
+    With scheme="hash" chunks are spread by complaint id, so shards are
+    even and every query goes to all of them. With scheme="product" each
+    product lives on one shard (products are balanced by chunk count), so
+    product-filtered queries only touch that shard.
+
+    The store is read once and each chunk is spilled to disk under its
+    shard, so only one shard's ids, text and metadata are in memory at a
+    time while its snapshot is written.
+
+    Writes `output_dir`/shard_<i>/ and `output_dir`/shards.json.
+
+    Returns:
+        dict: The shard manifest.
+    """
+    if scheme not in SCHEMES:
+        raise ValueError(f"scheme must be one of {SCHEMES}")
+    backend = getattr(source, "backend", source)
+    source_dir = getattr(source, "persist_directory", None) or getattr(backend, "persist_directory", None)
+
+    # One pass over the store, spilling each chunk to disk under its hash shard
+    # (or product); only one page is held in memory at a time
+    spill_dir = os.path.join(output_dir, ".spill")
+    shutil.rmtree(spill_dir, ignore_errors=True)
+    os.makedirs(spill_dir)
+    spills, dim = {}, 0
+    try:
+        for ids, embeddings, documents, metadatas in iter_store_pages(backend, page_size):
+            dim = embeddings.shape[1]
+            if scheme == "product":
+                keys = [m.get(partition_key) for m in metadatas]
+            else:
+                keys = [shard_for_id(chunk_id, m, n_shards) for chunk_id, m in zip(ids, metadatas)]
+            for key in dict.fromkeys(keys):
+                rows = [r for r, k in enumerate(keys) if k == key]
+                if key not in spills:
+                    spills[key] = _Spill(os.path.join(spill_dir, str(len(spills))))
+                spills[key].append([ids[r] for r in rows], embeddings[rows], [documents[r] for r in rows],
+                                   [metadatas[r] for r in rows])
+        for spill in spills.values():
+            spill.close()
+
+        if scheme == "product":
+            n_shards = min(n_shards, len(spills))
+            shard_of_product = assign_products({key: spill.count for key, spill in spills.items()}, n_shards)
+            members = [[spills[key] for key in spills if shard_of_product[key] == i] for i in range(n_shards)]
+        else:
+            members = [[spills[i]] if i in spills else [] for i in range(n_shards)]
+
+        os.makedirs(output_dir, exist_ok=True)
+        entries = []
+        for i, shard_spills in enumerate(members):
+            count = sum(spill.count for spill in shard_spills)
+            if not count:
+                continue
+            name = f"shard_{i:03d}"
+            pages = (page for spill in shard_spills for page in spill.pages(dim, page_size))
+            manifest = write_snapshot(pages, count, os.path.join(output_dir, name), model_name=model_name,
+                                      quantization=quantization, partition_key=partition_key, source_dir=source_dir)
+            entries.append({"path": name, "count": manifest["count"], "products": sorted(manifest["partitions"])})
+    finally:
+        for spill in spills.values():
+            spill.close()
+        shutil.rmtree(spill_dir, ignore_errors=True)
+    for stale in set(os.listdir(output_dir)) - {e["path"] for e in entries}:
+        if stale.startswith("shard_"):
+            shutil.rmtree(os.path.join(output_dir, stale), ignore_errors=True)
+
+    manifest = {"scheme": scheme, "partition_key": partition_key, "model_name": model_name,
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "shards": entries}
+    with open(os.path.join(output_dir, SHARDS_MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    bump_index_version(output_dir)
+    print(f"{sum(e['count'] for e in entries):,} chunks split into {len(entries)} {scheme} shards in {output_dir}")
+    return manifest
+
+
+def read_shards_manifest(shard_dir):
+    path = os.path.join(shard_dir, SHARDS_MANIFEST)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No shards in {shard_dir}; run build_shards first.")
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def process_memory():
+    """Resident and proportional set size (MB) of this process; PSS counts shared pages once per sharer."""
+    try:
+        with open("/proc/self/smaps_rollup", "r", encoding="utf-8") as f:
+            fields = dict(line.split(":", 1) for line in f.read().splitlines()[1:])
+        kb = lambda key: int(fields[key].split()[0]) if key in fields else 0
+        return {"rss_mb": round(kb("Rss") / 1024, 1), "pss_mb": round(kb("Pss") / 1024, 1),
+                "anonymous_mb": round(kb("Anonymous") / 1024, 1)}
+    except OSError:
+        import resource
+        return {"rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)}
+
+
+def _set_receive_timeout(sock, seconds):
+    """SO_RCVTIMEO on a blocking socket (0 = wait forever), so raw reads of its fd fail with EAGAIN when it expires."""
+    if os.name == "nt":
+        value = struct.pack("I", int(seconds * 1000))
+    else:
+        value = struct.pack("ll", int(seconds), int(seconds % 1 * 1_000_000))
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVTIMEO, value)
+
+
+def serve_shard(path, address=("127.0.0.1", 0), authkey=None, ready=None):
+    """
+    Shard worker: open one snapshot read-only and answer requests on `address`.
+
+    Requests are tuples ("query", embeddings, top_k, filters, include_embeddings),
+    ("get", ids, include_embeddings) or ("stats",); each gets ("ok", result)
+    or ("error", message). Every connection is served by its own thread.
+    If `ready` (a Connection) is given, the bound address is sent on it.
+    """
+    index = SnapshotIndex(path)
+    listener = Listener(address, authkey=authkey)
+    if ready is not None:
+        ready.send(listener.address)
+        ready.close()
+
+    def handle(connection):
+        with connection:
+            while True:
+                try:
+                    request = connection.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    op = request[0]
+                    if op == "query":
+                        _, embeddings, top_k, filters, include_embeddings = request
+                        result = index.query(embeddings, top_k=top_k, filters=filters,
+                                             include_embeddings=include_embeddings)
+                    elif op == "get":
+                        result = index.get(request[1], include_embeddings=request[2])
+                    elif op == "stats":
+                        result = {"path": path, "pid": os.getpid(), "count": index.count(), **process_memory()}
+                    else:
+                        raise ValueError(f"unknown request {op!r}")
+                    connection.send(("ok", result))
+                except Exception as e:
+                    connection.send(("error", f"{type(e).__name__}: {e}"))
+
+    while True:
+        try:
+            connection = listener.accept()
+        except (OSError, EOFError, multiprocessing.AuthenticationError):
+            continue
+        threading.Thread(target=handle, args=(connection,), daemon=True).start()
+
+
+class LocalShardCluster:
+    """Shard worker processes on this host, one per shard of a build_shards directory."""
+
+    def __init__(self, shard_dir=DEFAULT_SHARD_DIR, host="127.0.0.1", start_timeout=60.0):
+        self.manifest = read_shards_manifest(shard_dir)
+        self.authkey = os.urandom(16)
+        context = multiprocessing.get_context("spawn")
+        self.processes, self.addresses = [], []
+        pipes = []
+        for entry in self.manifest["shards"]:
+            receiver, sender = context.Pipe(duplex=False)
+            process = context.Process(target=serve_shard, name=f"shard-{entry['path']}", daemon=True,
+                                      args=(os.path.join(shard_dir, entry["path"]), (host, 0), self.authkey, sender))
+            process.start()
+            sender.close()
+            self.processes.append(process)
+            pipes.append(receiver)
+        for entry, receiver in zip(self.manifest["shards"], pipes):
+            if not receiver.poll(start_timeout):
+                self.close()
+                raise TimeoutError(f"Shard {entry['path']} did not start within {start_timeout}s")
+            self.addresses.append(receiver.recv())
+
+    def close(self):
+        for process in self.processes:
+            if process.is_alive():
+                process.terminate()
+        for process in self.processes:
+            process.join(5)
+
+
+class ShardedIndex(VectorIndexBackend):
+    """
+    Read-only index spread over shard worker processes.
+
+    `query` scatters the query vectors to every relevant shard in parallel
+    (only the owning shard for a product filter under the "product"
+    scheme), then merges the per-shard top-k lists with a heap. A shard
+    that errors or does not answer within `timeout` seconds is left out and
+    listed under "failed_shards" in the result (`get` does the same); the
+    query fails only when fewer than `min_shards` shards answered.
+
+    Each shard keeps a small pool of connections, so concurrent queries do
+    not queue behind each other on one socket.
+    """
+
+    def __init__(self, addresses, authkey=None, scheme="hash", shard_products=None, partition_key="product",
+                 timeout=2.0, min_shards=1, connections_per_shard=4, cluster=None):
+        if scheme not in SCHEMES:
+            raise ValueError(f"scheme must be one of {SCHEMES}")
+        self.addresses = [tuple(a) if isinstance(a, (list, tuple)) else a for a in addresses]
+        self.authkey = authkey
+        self.scheme = scheme
+        self.shard_products = [set(p) for p in shard_products] if shard_products else None
+        self.partition_key = partition_key
+        self.timeout = timeout
+        self.min_shards = min_shards
+        self.cluster = cluster
+        self._idle = [queue.LifoQueue() for _ in self.addresses]
+        self._executor = ThreadPoolExecutor(max_workers=max(1, len(self.addresses) * connections_per_shard),
+                                            thread_name_prefix="shard")
+
+    @classmethod
+    def launch(cls, shard_dir=DEFAULT_SHARD_DIR, expected_model=None, **kwargs):
+        """Start one local worker process per shard of `shard_dir` and connect to them."""
+        manifest = read_shards_manifest(shard_dir)
+        if expected_model and manifest.get("model_name") and manifest["model_name"] != expected_model:
+            raise ValueError(f"Shards in {shard_dir} were built with {manifest['model_name']}, not {expected_model}.")
+        cluster = LocalShardCluster(shard_dir)
+        return cls(cluster.addresses, authkey=cluster.authkey, scheme=manifest["scheme"],
+                   shard_products=[entry["products"] for entry in manifest["shards"]],
+                   partition_key=manifest["partition_key"], cluster=cluster, **kwargs)
+
+    # ----- transport -----
+
+    def _connect(self, shard, timeout):
+        """
+        Client(address, authkey) with the connect and the auth handshake each
+        bounded by `timeout`: a stopped shard's kernel still accepts the
+        connection, so an unbounded handshake would wait forever.
+        """
+        address = self.addresses[shard]
+        if isinstance(address, tuple):
+            sock = socket.create_connection(address, timeout=timeout)
+        else:
+            sock = socket.socket(socket.AF_UNIX)
+            sock.settimeout(timeout)
+            sock.connect(address)
+        # Connection reads the raw fd, so bound the handshake with a kernel receive timeout instead
+        sock.settimeout(None)
+        _set_receive_timeout(sock, timeout)
+        try:
+            connection = Connection(sock.dup().detach())
+            try:
+                if self.authkey is not None:
+                    answer_challenge(connection, self.authkey)
+                    deliver_challenge(connection, self.authkey)
+            except BaseException:
+                connection.close()
+                raise
+            _set_receive_timeout(sock, 0)
+        finally:
+            sock.close()
+        return connection
+
+    def _call(self, shard, request, timeout):
+        start = time.perf_counter()
+        try:
+            connection = self._idle[shard].get_nowait()
+        except queue.Empty:
+            connection = self._connect(shard, timeout)
+        try:
+            connection.send(request)
+            if not connection.poll(timeout):
+                raise TimeoutError(f"no answer within {timeout}s")
+            status, result = connection.recv()
+        except BaseException:
+            # The answer may still arrive later: never reuse this connection
+            connection.close()
+            raise
+        self._idle[shard].put(connection)
+        telemetry.observe("rag_shard_seconds", time.perf_counter() - start, shard=str(shard), op=request[0])
+        if status != "ok":
+            raise RuntimeError(result)
+        return result
+
+    def _scatter(self, shards, request):
+        """Send `request` to `shards` in parallel. Returns ({shard: result}, {shard: error})."""
+        futures = {shard: self._executor.submit(telemetry.bind(self._call, shard, request, self.timeout))
+                   for shard in shards}
+        # _call bounds each step by `timeout`, but a call can also wait for a free
+        # pool thread or run several steps: the deadline is enforced here
+        wait(futures.values(), timeout=self.timeout)
+        results, failed = {}, {}
+        for shard, future in futures.items():
+            try:
+                if not future.done():
+                    future.cancel()
+                    raise TimeoutError(f"no answer within {self.timeout}s")
+                results[shard] = future.result()
+            except Exception as e:
+                failed[shard] = f"{type(e).__name__}: {e}"
+                telemetry.count("rag_shard_failures_total", shard=str(shard), error=type(e).__name__)
+        if shards and len(results) < min(self.min_shards, len(shards)):
+            raise RuntimeError(f"Only {len(results)} of {len(shards)} shards answered: {failed}")
+        return results, failed
+
+    def _shards_for(self, filters):
+        product = (filters or {}).get(self.partition_key)
+        if self.scheme == "product" and isinstance(product, str) and self.shard_products is not None:
+            return [i for i, products in enumerate(self.shard_products) if product in products]
+        return list(range(len(self.addresses)))
+
+    # ----- reads -----
+
+    def query(self, query_embeddings, top_k=5, filters=None, include_embeddings=False, two_stage=False):
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        queries = queries.reshape(-1, queries.shape[-1])
+        results, failed = self._scatter(self._shards_for(filters),
+                                        ("query", queries, top_k, filters, include_embeddings))
+        keys = ["ids", "documents", "metadatas", "distances"] + (["embeddings"] if include_embeddings else [])
+        merged = {key: [] for key in keys}
+        for i in range(len(queries)):
+            # Each shard's list is already sorted by distance: k-way merge and keep the best top_k
+            streams = [[(distance, shard, j) for j, distance in enumerate(result["distances"][i])]
+                       for shard, result in results.items()]
+            best = heapq.nsmallest(top_k, heapq.merge(*streams))
+            for key in keys:
+                merged[key].append([results[shard][key][i][j] for _, shard, j in best])
+        merged["failed_shards"] = sorted(failed)
+        return merged
+
+    def get(self, ids, include_embeddings=False):
+        results, failed = self._scatter(list(range(len(self.addresses))), ("get", list(ids), include_embeddings))
+        found = {}
+        for result in results.values():
+            for n, chunk_id in enumerate(result["ids"]):
+                found[chunk_id] = (result, n)
+        keys = ["ids", "documents", "metadatas"] + (["embeddings"] if include_embeddings else [])
+        merged = {key: [] for key in keys}
+        for chunk_id in ids:
+            if chunk_id in found:
+                result, n = found[chunk_id]
+                for key in keys:
+                    merged[key].append(result[key][n])
+        # Ids held by a failed shard are missing from the result
+        merged["failed_shards"] = sorted(failed)
+        return merged
+
+    def stats(self):
+        """Per-shard chunk count, pid and memory (shards that do not answer are left out)."""
+        results, _ = self._scatter(list(range(len(self.addresses))), ("stats",))
+        return [dict(results[shard], shard=shard) for shard in sorted(results)]
+
+    def count(self):
+        return sum(shard["count"] for shard in self.stats())
+
+    # ----- writes -----
+
+    def _read_only(self, *args, **kwargs):
+        raise NotImplementedError("ShardedIndex is read-only; rebuild the shards with build_shards.")
+
+    add = upsert = update_metadata = delete = _read_only
+
+    def close(self):
+        """Close connections and stop local shard workers started by `launch`."""
+        self._executor.shutdown(wait=False)
+        for idle in self._idle:
+            while not idle.empty():
+                idle.get_nowait().close()
+        if self.cluster is not None:
+            self.cluster.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Split a vector store into shards for sharded retrieval.")
+    parser.add_argument("--store", default="vector_store/chromadb", help="Chroma persist directory")
+    parser.add_argument("--output-dir", default=DEFAULT_SHARD_DIR)
+    parser.add_argument("--shards", type=int, default=4)
+    parser.add_argument("--scheme", default="hash", choices=SCHEMES)
+    parser.add_argument("--model-name", default="sentence-transformers/all-MiniLM-L6-v2")
+    args = parser.parse_args()
+
+    from scripts.embedding_pipeline.vector_store import VectorStoreChroma
+
+    store = VectorStoreChroma(persist_directory=args.store, embedding_function=None)
+    build_shards(store, args.output_dir, n_shards=args.shards, scheme=args.scheme, model_name=args.model_name)
@@ -0,0 +1,74 @@
+import time
+import threading
+from contextlib import contextmanager
+
+
+class StartupReport:
+    """Wall-clock cost of each import and initialization step, in the order they ran."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.steps = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def timed(self, component, kind="init"):
+        start = time.perf_counter()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            with self._lock:
+                self.steps.append({
+                    "component": component,
+                    "kind": kind,
+                    "seconds": round(time.perf_counter() - start, 4),
+                    "thread": threading.current_thread().name,
+                    "ok": ok,
+                })
+
+    def as_dict(self):
+        with self._lock:
+            steps = list(self.steps)
+        return {"since_start_seconds": round(time.perf_counter() - self.started, 3), "steps": steps}
+
+    def format(self):
+        report = self.as_dict()
+        lines = [f"Startup report ({report['since_start_seconds']:.2f}s since process start):"]
+        for step in report["steps"]:
+            status = "" if step["ok"] else "  FAILED"
+            lines.append(f"  {step['kind']:<7} {step['component']:<28} {step['seconds'] * 1000:9.1f} ms  [{step['thread']}]{status}")
+        return "\n".join(lines)
+
+
+# Process-wide report shared by the app, pipeline, retriever and generator
+report = StartupReport()
+
+
+class LazyResource:
+    """
+    Value created by `factory` on first `get()`, exactly once even when
+    several threads ask at the same time. Creation time lands in the startup
+    report under `name`.
+    """
+
+    def __init__(self, name, factory):
+        self.name = name
+        self._factory = factory
+        self._value = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    def get(self):
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    with report.timed(self.name):
+                        self._value = self._factory()
+                    self._loaded = True
+        return self._value
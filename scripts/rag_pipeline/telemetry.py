@@ -0,0 +1,334 @@
+import os
+import sys
+import time
+import threading
+import functools
+import contextvars
+from collections import Counter, deque
+from contextlib import contextmanager
+
+# Latency histogram buckets (seconds), Prometheus-style upper bounds
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Histograms that do not measure seconds
+METRIC_BUCKETS = {
+    "rag_batch_size": (1, 2, 4, 8, 16, 32, 64, 128, 256),
+}
+
+HELP = {
+    "rag_stage_seconds": "Time spent in each stage of a RAG request.",
+    "rag_request_seconds": "End-to-end time of traced RAG requests.",
+    "rag_requests_total": "Traced RAG requests by method and status.",
+    "rag_time_to_first_token_seconds": "Time from request start to the first streamed answer token.",
+    "rag_answer_seconds": "Time from request start to the complete answer of non-streaming requests.",
+    "rag_ui_request_seconds": "Time spent in a UI handler, streaming included.",
+    "rag_ui_requests_total": "UI handler calls by handler and status.",
+    "rag_batch_size": "Items per micro-batch.",
+    "rag_batch_wait_seconds": "Time items spend queued before their micro-batch runs.",
+    "rag_batcher_queue_depth": "Items waiting in a micro-batcher queue.",
+    "rag_api_request_seconds": "Time spent serving HTTP API requests.",
+    "rag_api_requests_total": "HTTP API requests by route and status.",
+    "rag_shard_seconds": "Round trip of one request to one index shard.",
+    "rag_shard_failures_total": "Shard requests that failed or timed out, by shard and error.",
+    "rag_partial_results_total": "Retrievals answered without every index shard, by operation.",
+}
+
+
+class _Noop:
+    """Shared do-nothing context manager returned while telemetry is disabled."""
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _Noop()
+
+# Trace of the request running in the current thread / task
+_current_trace = contextvars.ContextVar("rag_trace", default=None)
+
+
+class Trace:
+    """Spans recorded for one request."""
+
+    def __init__(self, name):
+        self.name = name
+        self.start = time.perf_counter()
+        self.total = None
+        self.spans = []
+        self.notes = {}
+        self.depth = 0
+        self.profile = None
+
+    def as_dict(self):
+        total = self.total if self.total is not None else time.perf_counter() - self.start
+        result = {"name": self.name, "total_ms": round(total * 1000, 3), "spans": list(self.spans)}
+        if self.notes:
+            result["notes"] = dict(self.notes)
+        if self.profile is not None:
+            result["profile"] = self.profile
+        return result
+
+
+class SamplingProfiler:
+    """
+    Samples the Python stack of one thread every `interval` seconds and
+    counts identical stacks (collapsed "file:function;..." form, root first).
+    """
+
+    def __init__(self, thread_id, interval=0.005, max_depth=40):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._stop.is_set():
+            return
+        self._thread = threading.Thread(target=self._run, name="rag-profiler", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def stop(self, top=20):
+        """Stop (or never start) sampling; returns the `top` stacks as [{"stack", "samples"}]."""
+        self._stop.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join()
+        return [{"stack": stack, "samples": n} for stack, n in self.samples.most_common(top)]
+
+
+class Telemetry:
+    """
+    Spans, counters and latency histograms for the request path.
+
+    Disabled by default (set RAG_TELEMETRY=1 or call `enable()`); while
+    disabled `span()` and `trace()` return a shared no-op context manager
+    and `count()` / `observe()` return immediately, so instrumented code
+    pays one attribute check per call.
+
+    With `slow_request_seconds` set, a traced request still running after
+    that long gets its thread sampled until it ends; the hottest stacks are
+    attached to its trace and kept in `slow_profiles`.
+    """
+
+    def __init__(self, enabled=None, slow_request_seconds=None, profile_interval=0.005, buckets=DEFAULT_BUCKETS):
+        if enabled is None:
+            enabled = os.getenv("RAG_TELEMETRY", "").lower() in ("1", "true", "yes")
+        if slow_request_seconds is None and os.getenv("RAG_PROFILE_SLOW_SECONDS"):
+            slow_request_seconds = float(os.getenv("RAG_PROFILE_SLOW_SECONDS"))
+        self.enabled = enabled
+        self.slow_request_seconds = slow_request_seconds
+        self.profile_interval = profile_interval
+        self.buckets = tuple(buckets)
+        self.slow_profiles = deque(maxlen=20)
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._gauges = {}
+
+    def enable(self, slow_request_seconds=None):
+        self.enabled = True
+        if slow_request_seconds is not None:
+            self.slow_request_seconds = slow_request_seconds
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self.slow_profiles.clear()
+
+    # ----- metrics -----
+
+    def count(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                buckets = METRIC_BUCKETS.get(name, self.buckets)
+                histogram = self._histograms[key] = [[0] * len(buckets), 0.0, 0, buckets]
+            for i, bound in enumerate(histogram[3]):
+                if seconds <= bound:
+                    histogram[0][i] += 1
+                    break
+            histogram[1] += seconds
+            histogram[2] += 1
+
+    def gauge(self, name, fn, **labels):
+        """Register `fn()` as the current value of a gauge, read at export time."""
+        with self._lock:
+            self._gauges[(name, tuple(sorted(labels.items())))] = fn
+
+    # ----- spans and traces -----
+
+    def span(self, name):
+        """Time a stage: recorded in rag_stage_seconds and in the current trace, if any."""
+        if not self.enabled:
+            return _NOOP
+        return self._span(name)
+
+    @contextmanager
+    def _span(self, name):
+        trace = _current_trace.get()
+        start = time.perf_counter()
+        if trace is not None:
+            trace.depth += 1
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            self.observe("rag_stage_seconds", duration, stage=name)
+            if trace is not None:
+                trace.depth -= 1
+                trace.spans.append({"name": name, "start_ms": round((start - trace.start) * 1000, 3),
+                                    "duration_ms": round(duration * 1000, 3), "depth": trace.depth})
+
+    def note(self, key, value):
+        """Attach `value` under `key` to the current trace, if any (e.g. shards missing from a result)."""
+        trace = _current_trace.get() if self.enabled else None
+        if trace is not None:
+            trace.notes[key] = value
+
+    def trace(self, name):
+        """
+        Trace one request. Yields the Trace (None while disabled); spans
+        opened in the same context, including executor calls wrapped with
+        `bind`, are attached to it.
+        """
+        if not self.enabled:
+            return _NOOP
+        return self._trace(name)
+
+    @contextmanager
+    def _trace(self, name):
+        trace = Trace(name)
+        token = _current_trace.set(trace)
+        profiler, timer = None, None
+        if self.slow_request_seconds is not None:
+            profiler = SamplingProfiler(threading.get_ident(), self.profile_interval)
+            timer = threading.Timer(self.slow_request_seconds, profiler.start)
+            timer.daemon = True
+            timer.start()
+        status = "error"
+        try:
+            yield trace
+            status = "ok"
+        finally:
+            _current_trace.reset(token)
+            trace.total = time.perf_counter() - trace.start
+            if timer is not None:
+                timer.cancel()
+                profile = profiler.stop()
+                if profile:
+                    trace.profile = profile
+                    self.slow_profiles.append(trace.as_dict())
+            self.observe("rag_request_seconds", trace.total, method=name)
+            self.count("rag_requests_total", method=name, status=status)
+
+    def bind(self, fn, *args, **kwargs):
+        """`fn` bound to the current context, for run_in_executor / thread pools."""
+        if not self.enabled:
+            return functools.partial(fn, *args, **kwargs)
+        context = contextvars.copy_context()
+        return lambda: context.run(fn, *args, **kwargs)
+
+    # ----- export -----
+
+    def render_prometheus(self):
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: (list(h[0]), h[1], h[2], h[3]) for key, h in self._histograms.items()}
+            gauges = dict(self._gauges)
+
+        def fmt(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{str(v)}"' for k, v in pairs) + "}"
+
+        lines = []
+        for metric in sorted({name for name, _ in counters}):
+            lines.append(f"# HELP {metric} {HELP.get(metric, metric)}")
+            lines.append(f"# TYPE {metric} counter")
+            for (name, labels), value in sorted(counters.items()):
+                if name == metric:
+                    lines.append(f"{metric}{fmt(labels)} {value}")
+        for metric in sorted({name for name, _ in gauges}):
+            lines.append(f"# HELP {metric} {HELP.get(metric, metric)}")
+            lines.append(f"# TYPE {metric} gauge")
+            for (name, labels), fn in sorted(gauges.items(), key=lambda item: item[0]):
+                if name == metric:
+                    lines.append(f"{metric}{fmt(labels)} {fn()}")
+        for metric in sorted({name for name, _ in histograms}):
+            lines.append(f"# HELP {metric} {HELP.get(metric, metric)}")
+            lines.append(f"# TYPE {metric} histogram")
+            for (name, labels), (counts, total, n, buckets) in sorted(histograms.items()):
+                if name != metric:
+                    continue
+                cumulative = 0
+                for bound, c in zip(buckets, counts):
+                    cumulative += c
+                    lines.append(f"{metric}_bucket{fmt(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{metric}_bucket{fmt(labels, [('le', '+Inf')])} {n}")
+                lines.append(f"{metric}_sum{fmt(labels)} {total}")
+                lines.append(f"{metric}_count{fmt(labels)} {n}")
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide instance used by the retriever, pipeline and app
+telemetry = Telemetry()
+
+
+def start_metrics_server(port=9100, host="0.0.0.0", registry=None):
+    """Serve `registry.render_prometheus()` at /metrics from a background thread."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    registry = registry or telemetry
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_response(404)
+                self.end_headers()
+                return
+            body = registry.render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server